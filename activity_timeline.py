@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Time-bucketed activity counters for the calculations log
+Every row is folded into per-minute, per-hour and per-day buckets holding
+[num_vehicles, estimated_electricity_demand, calculations] by vehicle type.
+Buckets are keyed by the ISO timestamp truncated to the resolution
+("2025-03-01T09:41", "2025-03-01T09", "2025-03-01"), so folding a row needs
+no date parsing. Minute and hour buckets are kept for a fixed span of time
+behind the newest bucket; older activity survives downsampled in the
+coarser buckets, so a chart of any range reads a bounded number of buckets
+rather than the log.
+"""
+
+from datetime import date, datetime, timedelta
+
+# Length of the ISO timestamp prefix that names a bucket
+RESOLUTIONS = {'minute': 16, 'hour': 13, 'day': 10}
+_LEVELS = tuple(RESOLUTIONS.items())
+RESOLUTION_STEPS = {'minute': timedelta(minutes=1), 'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+# How far behind the newest bucket each resolution is kept (None keeps every bucket)
+RETENTION = {'minute': timedelta(hours=48), 'hour': timedelta(days=92), 'day': None}
+
+# Ranges up to these spans are charted at the finer resolution
+MINUTE_SPAN = timedelta(hours=6)
+HOUR_SPAN = timedelta(days=14)
+
+
+def bucket_key(timestamp, resolution):
+    """Bucket name for a datetime, date or ISO timestamp string at a resolution"""
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    elif isinstance(timestamp, date):
+        timestamp = timestamp.isoformat()
+    # Accept "YYYY-MM-DD HH:MM" as well as the "T" separator
+    if len(timestamp) > 10 and timestamp[10] == ' ':
+        timestamp = f"{timestamp[:10]}T{timestamp[11:]}"
+    return timestamp[:RESOLUTIONS[resolution]]
+
+
+def bucket_start(key):
+    """Start time of a bucket named by bucket_key"""
+    return datetime.fromisoformat(key) if len(key) != 13 else datetime.fromisoformat(f"{key}:00")
+
+
+class ActivityTimeline:
+    """Calculation volume per minute, hour and day, by vehicle type"""
+
+    def __init__(self, retention=RETENTION):
+        self.retention = dict(retention)
+        # resolution -> {bucket: {vehicle_type: [num_vehicles, demand, calculations]}}
+        self.buckets = {resolution: {} for resolution in RESOLUTIONS}
+        # resolution -> bucket before which everything has been pruned (None when nothing has)
+        self.pruned_before = dict.fromkeys(RESOLUTIONS)
+        self._next_prune = dict.fromkeys(RESOLUTIONS)
+
+    def add(self, timestamp, vehicle_type, num_vehicles, demand, calculations=1):
+        """Fold one row (or a pre-aggregated group of rows) into its bucket at every resolution"""
+        # Log timestamps are already ISO strings with a "T"; only other forms need normalizing
+        if not (isinstance(timestamp, str) and timestamp[10:11] == 'T'):
+            timestamp = bucket_key(timestamp, 'minute')
+            if len(timestamp) < RESOLUTIONS['day']:
+                return False
+            if len(timestamp) < RESOLUTIONS['hour']:
+                timestamp = f"{timestamp[:10]}T00:00"  # A bare date counts from midnight
+        buckets = self.buckets
+        for resolution, width in _LEVELS:
+            level = buckets[resolution]
+            key = timestamp[:width]
+            bucket = level.get(key)
+            if bucket is None:
+                pruned_before = self.pruned_before[resolution]
+                if pruned_before is not None and key < pruned_before:
+                    continue  # Late rows for pruned periods only count at coarser resolutions
+                bucket = level[key] = {}
+                self._prune(resolution, key)
+            stats = bucket.get(vehicle_type)
+            if stats is None:
+                bucket[vehicle_type] = [num_vehicles, demand, calculations]
+            else:
+                stats[0] += num_vehicles
+                stats[1] += demand
+                stats[2] += calculations
+        return True
+
+    def _prune(self, resolution, key):
+        retention = self.retention[resolution]
+        due = self._next_prune[resolution]
+        # Let a quarter of the retention pass between prunes so the scan is amortized over many new buckets
+        if retention is None or (due is not None and key < due):
+            return
+        newest = bucket_start(key)
+        cutoff = bucket_key(newest - retention, resolution)
+        level = self.buckets[resolution]
+        for stale in [held for held in level if held < cutoff]:
+            del level[stale]
+        self.pruned_before[resolution] = max(cutoff, self.pruned_before[resolution] or cutoff)
+        self._next_prune[resolution] = bucket_key(newest + retention / 4, resolution)
+
+    def coverage(self, resolution):
+        """(first, last) bucket held at a resolution, or None when empty"""
+        level = self.buckets[resolution]
+        if not level:
+            return None
+        return min(level), max(level)
+
+    def resolution_for(self, start=None, end=None):
+        """Finest resolution that charts start..end in a reasonable number of buckets and still covers start
+
+        An open end runs to the end of the newest bucket held.
+        """
+        coverage = self.coverage('day')
+        if coverage is None:
+            return 'day'
+        first = bucket_start(coverage[0]) if start is None else _as_datetime(start)
+        last = self._latest() if end is None else _as_datetime(end, True)
+        for resolution, span in (('minute', MINUTE_SPAN), ('hour', HOUR_SPAN)):
+            pruned_before = self.pruned_before[resolution]
+            if last - first <= span and (pruned_before is None or bucket_key(first, resolution) >= pruned_before):
+                return resolution
+        return 'day'
+
+    def _latest(self):
+        """End of the newest bucket, at the finest resolution holding any"""
+        for resolution, level in self.buckets.items():
+            if level:
+                return bucket_start(max(level)) + RESOLUTION_STEPS[resolution]
+        return None
+
+    def series(self, resolution, start=None, end=None, vehicle_type=None):
+        """Rows of (bucket, num_vehicles, demand, calculations) from start to end inclusive, in time order
+
+        start and end are datetimes, dates or ISO strings; a date end includes
+        the whole day. Empty buckets are omitted.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+        start_key = None if start is None else bucket_key(start, resolution)
+        # Compare on the end key's own length so "2025-03-01" includes every bucket that day
+        end_key = None if end is None else bucket_key(end, resolution)
+
+        rows = []
+        for key, bucket in self.buckets[resolution].items():
+            if start_key is not None and key < start_key:
+                continue
+            if end_key is not None and key[:len(end_key)] > end_key:
+                continue
+            if vehicle_type is not None:
+                stats = bucket.get(vehicle_type)
+                if stats is not None:
+                    rows.append((key, *stats))
+            else:
+                rows.append((key, sum(s[0] for s in bucket.values()), sum(s[1] for s in bucket.values()),
+                             sum(s[2] for s in bucket.values())))
+        rows.sort()
+        return rows
+
+    def to_json(self):
+        return {'buckets': self.buckets, 'pruned_before': self.pruned_before}
+
+    @classmethod
+    def from_json(cls, data, retention=RETENTION):
+        timeline = cls(retention)
+        timeline.buckets.update(data['buckets'])
+        timeline.pruned_before.update(data['pruned_before'])
+        return timeline
+
+
+def _as_datetime(value, end=False):
+    """Datetime for a range bound; a date end means the end of that day"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+        if end:
+            value += RESOLUTION_STEPS['day']
+    return value
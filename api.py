@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+HGV/Van Electric vs Diesel Calculator - JSON API
+Headless access to the same results as the Streamlit page.
+
+Run with several worker processes, e.g.:
+    gunicorn --workers 4 --bind 0.0.0.0:8000 api:app
+
+Endpoints:
+    GET  /health
+    GET  /vehicles
+    POST /calculate        one scenario
+    POST /calculate/batch  {"scenarios": [...]} up to MAX_BATCH_SCENARIOS
+    GET  /metrics          Prometheus text metrics for this worker process
+
+With METRICS_PROFILING=1, adding ?profile=1 to a request logs its cProfile
+report.
+"""
+
+import logging
+import time
+
+import numpy as np
+from flask import Flask, Response, g, jsonify, request
+
+from calculator_batch import calculate_scenarios_batch
+from calculator_core import (
+    COST_FIELDS,
+    ScenarioError,
+    cached_scenario,
+    calculate_electricity_demand,
+    format_result,
+    get_catalogue,
+    parse_scenario,
+    save_calculation_data,
+)
+from metrics import PROFILING_ENABLED, get_metrics, observe, profile_report, start_profile
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SCENARIOS = 10000
+
+app = Flask(__name__)
+
+
+def record_scenario(scenario, catalogue):
+    """Log the scenario for harvesting, as the page does when a postcode is given"""
+    if scenario['postcode']:
+        save_calculation_data(scenario['vehicle_type'], scenario['num_vehicles'], scenario['postcode'],
+                              scenario['purchase_year'], scenario['annual_mileage'], catalogue)
+
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.profile = start_profile() if PROFILING_ENABLED and 'profile' in request.args else None
+
+
+@app.after_request
+def finish_request_timing(response):
+    elapsed = time.perf_counter() - g.request_started
+    # 404s and 405s match no endpoint; time them together rather than as a stage named None
+    observe(f'api.{request.endpoint or "unmatched"}', elapsed)
+    response.headers['Server-Timing'] = f'app;dur={elapsed * 1000:.2f}'
+    if g.profile is not None:
+        g.profile.disable()
+        logger.info("Profile of %s %s:\n%s", request.method, request.path, profile_report(g.profile))
+    return response
+
+
+@app.errorhandler(ScenarioError)
+def scenario_error(error):
+    return jsonify({'error': str(error)}), 400
+
+
+@app.get('/health')
+def health():
+    return jsonify({'status': 'ok', 'catalogue_version': get_catalogue().version})
+
+
+@app.get('/vehicles')
+def vehicles():
+    return jsonify({
+        key: {'name': vehicle['name'], 'default_mileage': vehicle['default_mileage']}
+        for key, vehicle in get_catalogue().vehicle_data.items()
+    })
+
+
+@app.get('/metrics')
+def metrics():
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.post('/calculate')
+def calculate():
+    # One catalogue version for the whole request, even if the file is reloaded meanwhile
+    catalogue = get_catalogue()
+    scenario = parse_scenario(request.get_json(silent=True), catalogue)
+    results = cached_scenario(scenario['vehicle_type'], scenario['purchase_year'], scenario['annual_mileage'],
+                              scenario['operating_period'], scenario['num_vehicles'], catalogue)
+    demand = calculate_electricity_demand(scenario['vehicle_type'], scenario['annual_mileage'],
+                                          scenario['num_vehicles'], catalogue)
+    record_scenario(scenario, catalogue)
+    return jsonify(format_result(results['electric'], results['diesel'], results['savings'],
+                                 results['co2_saved'], demand))
+
+
+@app.post('/calculate/batch')
+def calculate_batch():
+    body = request.get_json(silent=True)
+    scenarios = body.get('scenarios') if isinstance(body, dict) else None
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ScenarioError("body must be an object with a non-empty 'scenarios' list")
+    if len(scenarios) > MAX_BATCH_SCENARIOS:
+        raise ScenarioError(f"at most {MAX_BATCH_SCENARIOS} scenarios per request")
+
+    catalogue = get_catalogue()
+    parsed = []
+    for index, data in enumerate(scenarios):
+        try:
+            parsed.append(parse_scenario(data, catalogue))
+        except ScenarioError as e:
+            raise ScenarioError(f"scenarios[{index}]: {e}") from None
+
+    results = calculate_scenarios_batch(
+        [s['vehicle_type'] for s in parsed],
+        np.array([s['purchase_year'] for s in parsed]),
+        np.array([s['annual_mileage'] for s in parsed]),
+        np.array([s['operating_period'] for s in parsed]),
+        np.array([s['num_vehicles'] for s in parsed]),
+        catalogue)
+    columns = {name: values.tolist() for name, values in results.items()}
+
+    output = []
+    for i, scenario in enumerate(parsed):
+        electric = {f: columns[f'electric_{f}'][i] for f in COST_FIELDS}
+        diesel = {f: columns[f'diesel_{f}'][i] for f in COST_FIELDS}
+        output.append(format_result(electric, diesel, columns['savings'][i], columns['co2_saved'][i],
+                                    columns['electricity_demand'][i]))
+        record_scenario(scenario, catalogue)
+    return jsonify({'results': output})
+
+
+if __name__ == "__main__":
+    app.run(debug=False)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Parallel batch runner for calculator scenarios
+Reads scenarios from a CSV or NDJSON file (or standard input), evaluates them
+in chunks across a process pool and streams one JSON result per line. Only a
+bounded number of chunks is read ahead, so a run of any size holds a few
+chunks in memory. Results come out in input order by default, or as chunks
+finish with --unordered. Throughput and per-stage timings are reported on
+standard error at the end.
+
+Records carry the API's scenario fields (vehicle_type, purchase_year,
+annual_mileage, operating_period, num_vehicles; all but vehicle_type
+optional) and an optional id that is echoed back. Vehicle types may be keys
+or display names. An invalid record produces {"row": n, "error": "..."} and
+the run carries on.
+
+Usage:
+    python batch_runner.py scenarios.csv [-o results.ndjson] [--workers 8] [--chunk-rows 10000] [--unordered]
+    python batch_runner.py - --format ndjson < scenarios.ndjson
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from calculator_batch import calculate_scenarios_batch
+from calculator_core import COST_FIELDS, ScenarioError, format_result, get_catalogue, parse_scenario
+
+DEFAULT_CHUNK_ROWS = 10000
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+FORMATS = ('csv', 'ndjson')
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+NUMERIC_FIELDS = ('purchase_year', 'annual_mileage', 'operating_period', 'num_vehicles')
+WORKER_STAGES = ('parse', 'compute', 'encode')
+STAGES = ('read',) + WORKER_STAGES + ('write',)
+
+
+class BatchStats:
+    """Row counts and per-stage timings for a batch run
+
+    read and write are wall time in the main process; parse, compute and
+    encode are summed across workers, so with several workers they can add
+    up to more than the elapsed time.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self.rows = 0
+        self.invalid_rows = 0
+        self.chunks = 0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.elapsed = 0.0
+
+    def add(self, rows, invalid_rows, timings):
+        self.rows += rows
+        self.invalid_rows += invalid_rows
+        self.chunks += 1
+        for stage, seconds in timings.items():
+            self.stages[stage] += seconds
+
+    @property
+    def throughput(self):
+        """Scenarios per second of elapsed time"""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        lines = [f"Evaluated {self.rows:,} scenarios ({self.invalid_rows:,} invalid) in {self.chunks:,} chunks "
+                 f"in {self.elapsed:.2f} s: {self.throughput:,.0f} scenarios/s with {self.workers} "
+                 f"worker{'s' if self.workers != 1 else ''}"]
+        for stage in STAGES:
+            where = "summed across workers" if stage in WORKER_STAGES and self.workers > 1 else ""
+            lines.append(f"  {stage:<8} {self.stages[stage]:8.2f} s  {where}".rstrip())
+        return '\n'.join(lines)
+
+
+def read_chunks(source, input_format, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield (first_row, records) from a text file; records are CSV row dicts or undecoded NDJSON lines"""
+    if input_format not in FORMATS:
+        raise ValueError(f"input_format must be one of {', '.join(FORMATS)}")
+    # Rows are numbered from 1, counting data rows only
+    records = csv.DictReader(source) if input_format == 'csv' else (line for line in source if line.strip())
+    first_row = 1
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            yield first_row, chunk
+            first_row += len(chunk)
+            chunk = []
+    if chunk:
+        yield first_row, chunk
+
+
+def _decode(record):
+    """Turn a CSV row dict or an NDJSON line into a scenario dict"""
+    if isinstance(record, str):
+        try:
+            return json.loads(record)
+        except ValueError as e:
+            raise ScenarioError(f"invalid JSON: {e}") from None
+
+    # Blank CSV cells take the calculator defaults; numbers arrive as text
+    data = {key: value.strip() for key, value in record.items()
+            if key is not None and isinstance(value, str) and value.strip()}
+    for name in NUMERIC_FIELDS:
+        if name in data:
+            try:
+                data[name] = float(data[name])
+            except ValueError:
+                pass  # Left as text so validation reports it
+    return data
+
+
+_worker_catalogue = None
+
+
+def _init_worker(catalogue):
+    global _worker_catalogue
+    _worker_catalogue = catalogue
+
+
+def evaluate_chunk(records, first_row, catalogue=None):
+    """Evaluate one chunk of raw records, returning (NDJSON text, invalid count, {stage: seconds})"""
+    catalogue = catalogue or _worker_catalogue or get_catalogue()
+    timings = {}
+
+    started = time.perf_counter()
+    ids = [None] * len(records)
+    errors = {}
+    parsed = []
+    for offset, record in enumerate(records):
+        try:
+            data = _decode(record)
+            if isinstance(data, dict):
+                ids[offset] = data.get('id')
+                if isinstance(data.get('vehicle_type'), str):
+                    vehicle_type = data['vehicle_type'].strip()
+                    data['vehicle_type'] = catalogue.vehicle_lookup.get(vehicle_type, vehicle_type)
+            parsed.append((offset, parse_scenario(data, catalogue)))
+        except ScenarioError as e:
+            errors[offset] = str(e)
+    timings['parse'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columns = {}
+    if parsed:
+        scenarios = [scenario for _, scenario in parsed]
+        results = calculate_scenarios_batch(
+            [s['vehicle_type'] for s in scenarios],
+            np.array([s['purchase_year'] for s in scenarios]),
+            np.array([s['annual_mileage'] for s in scenarios]),
+            np.array([s['operating_period'] for s in scenarios]),
+            np.array([s['num_vehicles'] for s in scenarios]),
+            catalogue)
+        columns = {name: values.tolist() for name, values in results.items()}
+    timings['compute'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    output = [None] * len(records)
+    for i, (offset, _) in enumerate(parsed):
+        electric = {f: columns[f'electric_{f}'][i] for f in COST_FIELDS}
+        diesel = {f: columns[f'diesel_{f}'][i] for f in COST_FIELDS}
+        output[offset] = format_result(electric, diesel, columns['savings'][i], columns['co2_saved'][i],
+                                       columns['electricity_demand'][i])
+    for offset, message in errors.items():
+        output[offset] = {'error': message}
+
+    lines = []
+    for offset, result in enumerate(output):
+        head = {'row': first_row + offset}
+        if ids[offset] is not None:
+            head['id'] = ids[offset]
+        lines.append(json.dumps({**head, **result}, separators=(',', ':')))
+    text = '\n'.join(lines) + '\n'
+    timings['encode'] = time.perf_counter() - started
+    return text, len(errors), timings
+
+
+def _timed(chunks, stats):
+    """Iterate chunks, charging the time spent reading them to the read stage"""
+    iterator = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            stats.stages['read'] += time.perf_counter() - started
+        yield item
+
+
+def run_batch(source, output, input_format='csv', workers=None, chunk_rows=DEFAULT_CHUNK_ROWS, ordered=True):
+    """Evaluate every scenario in a text file, writing NDJSON results to output
+
+    workers defaults to the CPU count; 1 evaluates in this process. Every
+    chunk uses the catalogue version current when the run starts. Returns
+    a BatchStats.
+    """
+    catalogue = get_catalogue()
+    workers = workers or os.cpu_count() or 1
+    stats = BatchStats(workers)
+    started = time.perf_counter()
+    chunks = _timed(read_chunks(source, input_format, chunk_rows), stats)
+
+    def write(records, result):
+        text, invalid_rows, timings = result
+        write_started = time.perf_counter()
+        output.write(text)
+        stats.stages['write'] += time.perf_counter() - write_started
+        stats.add(len(records), invalid_rows, timings)
+
+    if workers == 1:
+        for first_row, records in chunks:
+            write(records, evaluate_chunk(records, first_row, catalogue))
+    else:
+        limit = workers * CHUNKS_IN_FLIGHT_PER_WORKER
+        pending = {}  # future -> (sequence, records)
+        finished = {}  # sequence -> (records, result), held until earlier chunks are written
+        next_sequence = 0
+
+        def collect():
+            nonlocal next_sequence
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sequence, records = pending.pop(future)
+                if ordered:
+                    finished[sequence] = records, future.result()
+                else:
+                    write(records, future.result())
+            while next_sequence in finished:
+                write(*finished.pop(next_sequence))
+                next_sequence += 1
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(catalogue,)) as pool:
+            for sequence, (first_row, records) in enumerate(chunks):
+                pending[pool.submit(evaluate_chunk, records, first_row)] = sequence, records
+                # Bound read-ahead, counting chunks that wait behind a slower one
+                while len(pending) + len(finished) >= limit:
+                    collect()
+            while pending:
+                collect()
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate calculator scenarios from a CSV or NDJSON file")
+    parser.add_argument('input', help="Scenario file, or - for standard input")
+    parser.add_argument('-o', '--output', help="NDJSON output file (default: standard output)")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="Input format (default: ndjson for .ndjson/.jsonl files, otherwise csv)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count; 1 runs in-process)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Scenarios per chunk")
+    parser.add_argument('--unordered', action='store_true',
+                        help="Write chunks as they finish rather than in input order")
+    args = parser.parse_args(argv)
+    if args.chunk_rows < 1 or (args.workers is not None and args.workers < 1):
+        parser.error("--chunk-rows and --workers must be at least 1")
+
+    input_format = args.format or ('ndjson' if args.input.lower().endswith(NDJSON_EXTENSIONS) else 'csv')
+    if args.input == '-':
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    else:
+        source = open(args.input, newline='', encoding='utf-8')
+    with source:
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as output:
+                stats = run_batch(source, output, input_format, args.workers, args.chunk_rows, not args.unordered)
+        else:
+            stats = run_batch(source, sys.stdout, input_format, args.workers, args.chunk_rows, not args.unordered)
+    print(stats.report(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the calculator
+Times the cost engine (scalar, batch, cost table and result cache), the
+calculation log writer under concurrent submitters, the admin dashboard
+aggregations over synthetic logs of increasing size, and cold import time of
+the main modules. Results are written as JSON and can be compared with an
+earlier run; a result that is worse than its baseline by more than the
+tolerance is reported as a regression and makes the run exit with status 1.
+
+The synthetic logs are generated from a fixed seed, so runs on the same
+machine measure the same data. Pass --data-dir to keep them between runs;
+the 10M-row log is several hundred MB.
+
+Usage:
+    python benchmarks.py run [-o results.json] [--baseline baseline.json] [--tolerance 0.15]
+                             [--only engine,log,analytics,import] [--sizes 10000,1000000,10000000]
+                             [--data-dir bench-data]
+    python benchmarks.py generate 1000000 data/calculations.csv [--seed 0]
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import calculation_store
+from activity_timeline import bucket_start
+from calculation_export import CalculationExport, summary_export
+from calculation_log import CALCULATIONS_BACKEND, CALCULATIONS_FILE, FIELDNAMES, get_calculation_writer
+from calculation_rollup import ROLLUP_FILE, CalculationRollup
+from calculator_batch import calculate_scenarios_batch, get_cost_table
+from calculator_core import (
+    MAX_MILEAGE,
+    MIN_MILEAGE,
+    OPERATING_PERIODS,
+    PURCHASE_YEARS,
+    cached_scenario,
+    calculate_electricity_demand,
+    calculate_scenario,
+    get_catalogue,
+    save_calculation_data,
+)
+
+RESULTS_FORMAT = 1
+GROUPS = ('engine', 'log', 'analytics', 'import')
+ANALYTICS_SIZES = (10000, 1000000, 10000000)
+DEFAULT_TOLERANCE = 0.15
+DEFAULT_SEED = 0
+
+ENGINE_SCENARIOS = 100000
+SCALAR_SCENARIOS = 10000
+WRITER_THREADS = (1, 4, 8)
+RECORDS_PER_WRITER = 5000
+INCREMENTAL_ROWS = 1000
+IMPORT_MODULES = ('calculator_core', 'calculator_batch', 'calculator_app', 'api')
+IMPORT_REPEAT = 5
+GENERATE_CHUNK_ROWS = 100000
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+POSTCODE_AREAS = ('SW', 'SE', 'N', 'E', 'W', 'M', 'B', 'LS', 'L', 'G', 'EH', 'CF', 'BS', 'NE', 'S', 'NG')
+UNIT_LETTERS = np.array(list('ABDEFGHJLNPQRSTUWXYZ'))
+
+
+class BenchmarkResults:
+    """Collected results plus enough about the machine and tree to compare runs"""
+
+    def __init__(self):
+        self.results = []
+        self.meta = {
+            'format': RESULTS_FORMAT,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'backend': CALCULATIONS_BACKEND,
+            'catalogue_version': get_catalogue().version,
+            'commit': _git_commit(),
+        }
+
+    def add(self, name, value, unit, better='lower', **params):
+        """Record one measurement; better is 'lower' for times and 'higher' for rates"""
+        self.results.append({'name': name, 'value': value, 'unit': unit, 'better': better, 'params': params})
+        print(f"  {name:<48} {_format_value(value, unit)}", file=sys.stderr)
+
+    def to_json(self):
+        return {**self.meta, 'results': self.results}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _format_value(value, unit):
+    if unit.startswith('s'):
+        for scale, suffix in ((1, 's'), (1e-3, 'ms'), (1e-6, 'µs'), (1e-9, 'ns')):
+            if value >= scale:
+                return f"{value / scale:10.3f} {suffix}{unit[1:]}"
+        return f"{value / 1e-9:10.3f} ns{unit[1:]}"
+    return f"{value:12,.0f} {unit}"
+
+
+def timed(func, number=1, repeat=5):
+    """Return (median, best) seconds per call of func over repeat runs of number calls"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - started) / number)
+    return statistics.median(times), min(times)
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+
+
+def random_scenarios(count, seed=DEFAULT_SEED):
+    """Arrays of (vehicle_types, purchase_years, annual_mileages, operating_periods, num_vehicles)"""
+    rng = np.random.default_rng(seed)
+    keys = np.array(list(get_catalogue().profiles))
+    return (rng.choice(keys, count), rng.choice(PURCHASE_YEARS, count),
+            rng.integers(MIN_MILEAGE, MAX_MILEAGE, count).astype(float), rng.choice(OPERATING_PERIODS, count),
+            rng.integers(1, 21, count))
+
+
+def generate_calculations(path, rows, seed=DEFAULT_SEED, start=datetime(2025, 1, 1), days=365):
+    """Write a synthetic calculations log of rows rows to path, in timestamp order
+
+    Postcodes cluster in a few areas and districts the way real traffic does,
+    and the electricity demand is computed with the calculator itself.
+    """
+    rng = np.random.default_rng(seed)
+    catalogue = get_catalogue()
+    keys = np.array(list(catalogue.profiles))
+    default_mileage = np.array([catalogue.vehicle_data[key]['default_mileage'] for key in keys])
+    area_weights = 1 / np.arange(1, len(POSTCODE_AREAS) + 1)
+    area_weights /= area_weights.sum()
+    step = days * 86400 / max(rows, 1)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(FIELDNAMES)
+        for first in range(0, rows, GENERATE_CHUNK_ROWS):
+            count = min(GENERATE_CHUNK_ROWS, rows - first)
+            vehicle_rows = rng.integers(0, len(keys), count)
+            vehicle_types = keys[vehicle_rows]
+            num_vehicles = np.minimum(rng.geometric(0.3, count), 100)
+            purchase_years = rng.choice(PURCHASE_YEARS, count)
+            mileages = np.clip(np.round(default_mileage[vehicle_rows] * rng.normal(1, 0.25, count), -3),
+                               MIN_MILEAGE, MAX_MILEAGE).astype(np.int64)
+            demand = calculate_scenarios_batch(vehicle_types, purchase_years, mileages, 5, num_vehicles,
+                                               catalogue)['electricity_demand']
+
+            areas = rng.choice(len(POSTCODE_AREAS), count, p=area_weights)
+            districts = np.minimum(rng.geometric(0.15, count), 30)
+            sectors = rng.integers(0, 10, count)
+            units = UNIT_LETTERS[rng.integers(0, len(UNIT_LETTERS), (count, 2))]
+            postcodes = [f"{POSTCODE_AREAS[a]}{d} {s}{u[0]}{u[1]}"
+                         for a, d, s, u in zip(areas.tolist(), districts.tolist(), sectors.tolist(), units.tolist())]
+            timestamps = [(start + timedelta(seconds=(first + i) * step)).isoformat() for i in range(count)]
+
+            writer.writerows(zip(timestamps, vehicle_types.tolist(), num_vehicles.tolist(), postcodes,
+                                 purchase_years.tolist(), mileages.tolist(), demand.tolist()))
+    os.replace(tmp_path, path)
+
+
+def _calculations_dir(data_dir, rows, seed):
+    """Working directory holding data/calculations.csv with rows synthetic rows, generated once"""
+    directory = os.path.join(data_dir, f'calculations_{rows}_{seed}')
+    log_path = os.path.join(directory, CALCULATIONS_FILE)
+    if not os.path.exists(log_path):
+        print(f"  generating {rows:,}-row log...", file=sys.stderr)
+        generate_calculations(log_path, rows, seed)
+    return directory
+
+
+def bench_engine(results, seed=DEFAULT_SEED):
+    """Scalar vs batch cost functions, the cost table, the result cache and electricity demand"""
+    catalogue = get_catalogue()
+    types, years, mileages, periods, counts = random_scenarios(ENGINE_SCENARIOS, seed)
+    scalar_args = list(zip(types.tolist(), years.tolist(), mileages.tolist(), periods.tolist(),
+                           counts.tolist()))[:SCALAR_SCENARIOS]
+
+    def scalar():
+        for args in scalar_args:
+            calculate_scenario(*args, catalogue=catalogue)
+
+    median, best = timed(scalar)
+    results.add('engine.scenario.scalar', median / len(scalar_args), 's/scenario',
+                best=best / len(scalar_args), scenarios=len(scalar_args))
+
+    median, best = timed(lambda: calculate_scenarios_batch(types, years, mileages, periods, counts, catalogue))
+    results.add('engine.scenario.batch', median / ENGINE_SCENARIOS, 's/scenario',
+                best=best / ENGINE_SCENARIOS, scenarios=ENGINE_SCENARIOS)
+
+    table = get_cost_table(catalogue)
+
+    def table_queries():
+        for args in scalar_args:
+            table.query(*args)
+
+    median, best = timed(table_queries)
+    results.add('engine.scenario.cost_table', median / len(scalar_args), 's/scenario',
+                best=best / len(scalar_args), scenarios=len(scalar_args))
+
+    hot_args = scalar_args[:100]
+    for args in hot_args:
+        cached_scenario(*args, catalogue=catalogue)
+
+    def cache_hits():
+        for args in hot_args:
+            cached_scenario(*args, catalogue=catalogue)
+
+    median, best = timed(cache_hits, number=100)
+    results.add('engine.scenario.cache_hit', median / len(hot_args), 's/scenario',
+                best=best / len(hot_args), scenarios=len(hot_args))
+
+    demand_args = [(t, m, n) for t, _, m, _, n in scalar_args]
+
+    def demand():
+        for args in demand_args:
+            calculate_electricity_demand(*args, catalogue)
+
+    median, best = timed(demand)
+    results.add('engine.electricity_demand.scalar', median / len(demand_args), 's/call',
+                best=best / len(demand_args), calls=len(demand_args))
+
+
+def bench_log_writer(results, data_dir):
+    """save_calculation_data from several threads at once, through the process-wide log writer"""
+    directory = os.path.join(data_dir, 'log_writer')
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    types, years, mileages, _, counts = random_scenarios(RECORDS_PER_WRITER)
+    records = list(zip(types.tolist(), counts.tolist(), years.tolist(), mileages.astype(int).tolist()))
+
+    with working_directory(directory):
+        writer = get_calculation_writer()
+        for threads in WRITER_THREADS:
+            before = writer.stats()
+            barrier = threading.Barrier(threads + 1)
+            call_times = []
+
+            def submit():
+                barrier.wait()
+                started = time.perf_counter()
+                for vehicle_type, num_vehicles, purchase_year, annual_mileage in records:
+                    save_calculation_data(vehicle_type, num_vehicles, 'SW1A 1AA', purchase_year, annual_mileage)
+                call_times.append((time.perf_counter() - started) / len(records))
+
+            workers = [threading.Thread(target=submit) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            writer.flush()
+            elapsed = time.perf_counter() - started
+
+            after = writer.stats()
+            written = after['written'] - before['written']
+            dropped = after['dropped'] - before['dropped']
+            results.add(f'log.save_calculation_data.threads_{threads}.call', statistics.median(call_times),
+                        's/call', threads=threads, records=threads * len(records))
+            results.add(f'log.save_calculation_data.threads_{threads}.throughput', written / elapsed,
+                        'rows/s', better='higher', threads=threads, written=written, dropped=dropped,
+                        backend=CALCULATIONS_BACKEND)
+
+
+class _CountingSink(io.RawIOBase):
+    """Binary sink that only counts bytes, so exports are timed without disk writes"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.bytes += len(data)
+        return len(data)
+
+
+def bench_analytics(results, data_dir, sizes=ANALYTICS_SIZES, seed=DEFAULT_SEED):
+    """The admin dashboard's aggregations and exports over synthetic logs of each size"""
+    for rows in sizes:
+        repeat = 3 if rows <= 100000 else 1
+        with working_directory(_calculations_dir(data_dir, rows, seed)):
+            def cold_build():
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(ROLLUP_FILE)
+                rollup = CalculationRollup()
+                rollup.refresh()
+                return rollup
+
+            median, best = timed(cold_build, repeat=repeat)
+            results.add(f'analytics.rows_{rows}.rollup.cold_build', median, 's', best=best, rows=rows)
+            rollup = cold_build()
+
+            median, best = timed(CalculationRollup, repeat=repeat)
+            results.add(f'analytics.rows_{rows}.rollup.restore', median, 's', best=best, rows=rows)
+
+            # Append a small batch, fold it in, then put the log back as it was
+            size = os.path.getsize(CALCULATIONS_FILE)
+            extra = os.path.join(os.path.dirname(CALCULATIONS_FILE), 'extra.csv')
+            generate_calculations(extra, INCREMENTAL_ROWS, seed + 1)
+            with open(extra, encoding='utf-8') as file:
+                appended = file.read().split('\n', 1)[1]
+            os.remove(extra)
+            with open(CALCULATIONS_FILE, 'a', encoding='utf-8') as file:
+                file.write(appended)
+            median, best = timed(rollup.refresh, repeat=1)
+            os.truncate(CALCULATIONS_FILE, size)
+            results.add(f'analytics.rows_{rows}.rollup.incremental', median, 's', rows=INCREMENTAL_ROWS)
+            rollup = cold_build()
+
+            queries = {
+                'vehicle_summary': rollup.vehicle_summary,
+                'year_summary': rollup.year_summary,
+                'postcode_district': lambda: rollup.postcode_level_summary('district'),
+                'postcode_sector_top20': lambda: rollup.postcode_level_summary('sector', top=20),
+                'summary_export': lambda: summary_export(rollup),
+                'activity_by_day': lambda: rollup.activity_series('day'),
+                'activity_last_day_by_minute': lambda: rollup.activity_series(
+                    'minute', bucket_start(rollup.timeline.coverage('minute')[1]) - timedelta(days=1)),
+            }
+            for name, query in queries.items():
+                median, best = timed(query, repeat=repeat)
+                results.add(f'analytics.rows_{rows}.query.{name}', median, 's', best=best, rows=rows)
+
+            if calculation_store.pa is not None:
+                shutil.rmtree(calculation_store.STORE_ROOT, ignore_errors=True)
+                store = calculation_store.PartitionedCalculationStore()
+                median, _ = timed(lambda: calculation_store.migrate_csv(CALCULATIONS_FILE, store), repeat=1)
+                results.add(f'analytics.rows_{rows}.store.migrate', median, 's', rows=rows)
+                median, best = timed(store.summary, repeat=repeat)
+                results.add(f'analytics.rows_{rows}.store.summary', median, 's', best=best, rows=rows)
+
+            def export():
+                # Streams from whichever backend is configured
+                sink = _CountingSink()
+                CalculationExport(compression='gzip').write_to(sink)
+                return sink.bytes
+
+            median, best = timed(export, repeat=1)
+            results.add(f'analytics.rows_{rows}.export.gzip', median, 's', rows=rows, backend=CALCULATIONS_BACKEND)
+            shutil.rmtree(calculation_store.STORE_ROOT, ignore_errors=True)
+
+
+def bench_imports(results, data_dir, repeat=IMPORT_REPEAT):
+    """Cold import time of the main modules, each in a fresh interpreter"""
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')]))}
+    for module in IMPORT_MODULES:
+        code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+        times = []
+        for _ in range(repeat):
+            process = subprocess.run([sys.executable, '-c', code], cwd=data_dir, env=env, capture_output=True,
+                                     text=True)
+            if process.returncode:
+                print(f"  import {module} failed; skipped", file=sys.stderr)
+                break
+            times.append(float(process.stdout.split()[-1]))
+        else:
+            results.add(f'import.{module}', statistics.median(times), 's', best=min(times), repeat=repeat)
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Rows of (name, baseline, current, change, status) for results present in both runs"""
+    previous = {result['name']: result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        before = previous.get(result['name'])
+        if before is None or before['unit'] != result['unit'] or not before['value']:
+            continue
+        change = result['value'] / before['value'] - 1
+        worse = change if result['better'] == 'lower' else -change
+        status = 'REGRESSION' if worse > tolerance else 'improved' if worse < -tolerance else 'ok'
+        rows.append((result['name'], before['value'], result['value'], change, status))
+    return rows
+
+
+def run(args):
+    groups = args.only.split(',') if args.only else GROUPS
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmark groups: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else ANALYTICS_SIZES
+
+    results = BenchmarkResults()
+    with contextlib.ExitStack() as stack:
+        data_dir = args.data_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix='calculator-bench-'))
+        os.makedirs(data_dir, exist_ok=True)
+        data_dir = os.path.abspath(data_dir)
+        for group in GROUPS:
+            if group not in groups:
+                continue
+            print(f"{group}:", file=sys.stderr)
+            if group == 'engine':
+                bench_engine(results, args.seed)
+            elif group == 'log':
+                bench_log_writer(results, data_dir)
+            elif group == 'analytics':
+                bench_analytics(results, data_dir, sizes, args.seed)
+            else:
+                bench_imports(results, data_dir)
+
+    document = results.to_json()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(document, file, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            rows = compare(document, json.load(file), args.tolerance)
+        print(f"\nAgainst {args.baseline} (tolerance {args.tolerance:.0%}):", file=sys.stderr)
+        for name, before, after, change, status in rows:
+            print(f"  {name:<48} {change:+8.1%}  {status}", file=sys.stderr)
+        regressions = [row for row in rows if row[4] == 'REGRESSION']
+        if regressions:
+            print(f"{len(regressions)} regression(s)", file=sys.stderr)
+            return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calculator benchmark suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the benchmarks")
+    run_parser.add_argument('-o', '--output', help="Write results JSON here (default: standard output)")
+    run_parser.add_argument('--baseline', help="Earlier results JSON to compare against")
+    run_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                            help="Relative slowdown reported as a regression (default: %(default)s)")
+    run_parser.add_argument('--only', help=f"Comma-separated groups to run ({', '.join(GROUPS)})")
+    run_parser.add_argument('--sizes', help="Comma-separated log sizes for the analytics group "
+                                            f"(default: {','.join(map(str, ANALYTICS_SIZES))})")
+    run_parser.add_argument('--data-dir', help="Keep generated logs here between runs (default: a temporary directory)")
+    run_parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+
+    generate_parser = commands.add_parser('generate', help="Write a synthetic calculations log")
+    generate_parser.add_argument('rows', type=int)
+    generate_parser.add_argument('output', nargs='?', default=CALCULATIONS_FILE)
+    generate_parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        generate_calculations(args.output, args.rows, args.seed)
+        print(f"Wrote {args.rows:,} rows to {args.output}", file=sys.stderr)
+        return 0
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Streaming export of the calculations log
+Rows are read from the configured backend a chunk at a time, filtered by
+date, postcode and vehicle type, written as CSV and optionally
+gzip-compressed on the fly, so an export of any size only ever holds one
+chunk in memory. The summary export is built from the dashboard aggregates
+instead of the raw rows.
+
+Usage:
+    python calculation_export.py [-o calculations.csv.gz] [--gzip] [--start 2025-01-01] [--end 2025-03-31]
+                                 [--postcode SW1 --postcode M1 ...] [--vehicle-type van_small ...]
+"""
+
+import argparse
+import csv
+import io
+import sys
+import zlib
+from datetime import datetime
+
+from calculation_log import CALCULATIONS_BACKEND, CALCULATIONS_FILE, FIELDNAMES
+from calculation_store import get_calculation_store, time_bounds
+from postcode_index import postcode_matcher
+
+EXPORT_CHUNK_ROWS = 50000
+COMPRESSIONS = ('gzip',)
+GZIP_LEVEL = 5
+SUMMARY_TOP_AREAS = 20
+
+
+def _csv_row_chunks(start, end, matches, vehicle_types, chunk_rows, log_path=CALCULATIONS_FILE):
+    """Yield lists of FIELDNAMES-ordered rows from the CSV log"""
+    start_time, end_time = time_bounds(start, end)
+    # ISO timestamps compare correctly as strings
+    low = start_time.isoformat() if start_time else None
+    high = end_time.isoformat() if end_time else None
+    try:
+        file = open(log_path, newline='', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with file:
+        # A half-written last row is left out; it will be in the next export
+        reader = csv.reader(line for line in file if line.endswith('\n'))
+        header = next(reader, None)
+        if header is None:
+            return
+        order = [header.index(name) for name in FIELDNAMES]
+        timestamp, postcode = header.index('timestamp'), header.index('postcode')
+        vehicle_type = header.index('vehicle_type')
+
+        chunk = []
+        for values in reader:
+            if not values:
+                continue
+            if (low and values[timestamp] < low) or (high and values[timestamp] > high):
+                continue
+            if matches is not None and not matches(values[postcode]):
+                continue
+            if vehicle_types is not None and values[vehicle_type] not in vehicle_types:
+                continue
+            chunk.append([values[i] for i in order])
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _store_row_chunks(start, end, matches, vehicle_types, chunk_rows):
+    """Yield lists of FIELDNAMES-ordered rows from the partitioned store"""
+    for batch in get_calculation_store().iter_batches(columns=FIELDNAMES, start=start, end=end,
+                                                       vehicle_types=vehicle_types, batch_size=chunk_rows):
+        columns = batch.to_pydict()
+        columns['timestamp'] = [value.isoformat() for value in columns['timestamp']]
+        rows = zip(*(columns[name] for name in FIELDNAMES))
+        if matches is not None:
+            postcode = FIELDNAMES.index('postcode')
+            rows = (row for row in rows if matches(row[postcode]))
+        chunk = list(rows)
+        if chunk:
+            yield chunk
+
+
+class CalculationExport:
+    """The calculations matching optional filters, as an iterable of CSV byte chunks
+
+    start/end bound the timestamp (inclusive, date, datetime or ISO string);
+    postcodes are full postcodes or prefixes such as 'SW1' or 'SW1A 1';
+    vehicle_types are vehicle keys as logged. rows counts the rows produced
+    so far.
+    """
+
+    def __init__(self, start=None, end=None, postcodes=None, compression=None, chunk_rows=EXPORT_CHUNK_ROWS,
+                 vehicle_types=None):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be None or one of {', '.join(COMPRESSIONS)}")
+        self.start = start
+        self.end = end
+        self.postcodes = list(postcodes) if postcodes else None
+        self.vehicle_types = set(vehicle_types) if vehicle_types else None
+        self.compression = compression
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+
+    @property
+    def file_extension(self):
+        return '.csv.gz' if self.compression == 'gzip' else '.csv'
+
+    def __iter__(self):
+        matches = postcode_matcher(self.postcodes) if self.postcodes else None
+        source = _store_row_chunks if CALCULATIONS_BACKEND == 'parquet' else _csv_row_chunks
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if self.compression else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+
+        def encode(rows):
+            writer.writerows(rows)
+            data = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(data) if compressor else data
+
+        self.rows = 0
+        yield encode([FIELDNAMES])
+        for rows in source(self.start, self.end, matches, self.vehicle_types, self.chunk_rows):
+            self.rows += len(rows)
+            data = encode(rows)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+
+    def write_to(self, output):
+        """Write the export to a binary file object; returns the number of rows written"""
+        for data in self:
+            output.write(data)
+        return self.rows
+
+
+def summary_export(aggregates, top_areas=SUMMARY_TOP_AREAS):
+    """JSON-ready summary built from dashboard aggregates (a RollupView), without reading the log"""
+    columns = ('num_vehicles', 'estimated_electricity_demand', 'calculations')
+
+    def records(key, rows):
+        return [dict(zip((key,) + columns, row)) for row in rows]
+
+    return {
+        'total_calculations': aggregates.calculations,
+        'total_vehicles': aggregates.vehicles,
+        'total_electricity_demand_kwh': aggregates.electricity_demand,
+        'unique_postcodes': aggregates.unique_postcodes,
+        'by_vehicle_type': records('vehicle_type', aggregates.vehicle_summary()),
+        'by_purchase_year': records('purchase_year', aggregates.year_summary()),
+        'top_areas': records('area', aggregates.postcode_level_summary('area', top=top_areas)),
+        'top_postcodes': [{'postcode': postcode, 'calculations': count}
+                          for postcode, count in aggregates.usage_summary(top=top_areas)['top_postcodes']],
+        'export_date': datetime.now().isoformat(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream the calculations log to CSV")
+    parser.add_argument('-o', '--output', help="Output file (default: standard output); .gz implies --gzip")
+    parser.add_argument('--gzip', action='store_true', help="gzip-compress the output")
+    parser.add_argument('--start', help="First date or timestamp to include (ISO format)")
+    parser.add_argument('--end', help="Last date or timestamp to include (ISO format)")
+    parser.add_argument('--postcode', action='append', help="Postcode or prefix to include; may be repeated")
+    parser.add_argument('--vehicle-type', action='append', help="Vehicle type to include; may be repeated")
+    args = parser.parse_args(argv)
+
+    compressed = args.gzip or bool(args.output and args.output.endswith('.gz'))
+    export = CalculationExport(args.start, args.end, args.postcode, 'gzip' if compressed else None,
+                               vehicle_types=args.vehicle_type)
+    if args.output:
+        with open(args.output, 'wb') as output:
+            rows = export.write_to(output)
+    else:
+        rows = export.write_to(sys.stdout.buffer)
+    print(f"Exported {rows:,} rows", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Background writer for the calculations log
+Rows are queued in memory and group-committed by a single writer thread per
+process. The default sink appends to data/calculations.csv under an exclusive
+file lock so several Streamlit processes can share the file without
+interleaving; set CALCULATIONS_BACKEND=parquet to write day-partitioned
+columnar files instead (see calculation_store).
+"""
+
+import atexit
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows - fall back to unlocked appends
+    fcntl = None
+
+from metrics import get_metrics, span
+
+logger = logging.getLogger(__name__)
+
+CALCULATIONS_FILE = 'data/calculations.csv'
+CALCULATIONS_BACKEND = os.environ.get('CALCULATIONS_BACKEND', 'csv')
+FIELDNAMES = ['timestamp', 'vehicle_type', 'num_vehicles', 'postcode',
+              'purchase_year', 'annual_mileage', 'estimated_electricity_demand']
+
+_STOP = object()
+
+
+class _FlushRequest:
+    """Marker asking the writer thread to commit everything queued before it"""
+
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+def lock_file(file, shared=False):
+    """Take an exclusive (or shared) cross-process lock on an open file"""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+def unlock_file(file):
+    """Release a lock taken with lock_file"""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class CsvCalculationSink:
+    """Appends batches of records to the CSV log under a cross-process lock"""
+
+    def __init__(self, file_path=CALCULATIONS_FILE):
+        self.file_path = file_path
+
+    def __str__(self):
+        return self.file_path
+
+    def append(self, rows):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+        writer.writerows(rows)
+
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.file_path, 'a', newline='', encoding='utf-8') as file:
+            lock_file(file)
+            try:
+                # Checked under the lock so only one process ever writes the header
+                if file.seek(0, os.SEEK_END) == 0:
+                    header = io.StringIO()
+                    csv.DictWriter(header, fieldnames=FIELDNAMES).writeheader()
+                    file.write(header.getvalue())
+                file.write(buffer.getvalue())
+                file.flush()
+            finally:
+                unlock_file(file)
+
+
+class CalculationLogWriter:
+    """Bounded, non-blocking, batched appender for calculation records"""
+
+    def __init__(self, sink=None, max_queue=10000, batch_size=500, flush_interval=1.0):
+        self.sink = sink if sink is not None else CsvCalculationSink()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = []  # Rows from failed (I/O) writes, retried on the next commit
+        self._thread = None
+        self._closed = False
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'written': 0, 'dropped': 0, 'rejected': 0,
+                       'failed_writes': 0, 'batches': 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        """Return a snapshot of the writer counters"""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot['queued'] = self._queue.qsize() + len(self._pending)
+        return snapshot
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='calculation-log-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, record):
+        """Queue a record for writing without blocking; returns False if it was dropped"""
+        if self._closed:
+            self._count('dropped')
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        return True
+
+    def flush(self, timeout=None):
+        """Block until every record submitted so far has been committed or failed"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Flush outstanding records and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error("Calculation log writer queue full at shutdown; unflushed rows will be lost")
+            return
+        self._thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is None or item is _STOP or isinstance(item, _FlushRequest):
+                self._commit(batch)
+                batch = []
+                deadline = None
+                if item is _STOP:
+                    return
+                if item is not None:
+                    item.done.set()
+                continue
+
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._commit(batch)
+                batch = []
+                deadline = None
+
+    def _commit(self, batch):
+        rows = self._pending + batch
+        if not rows:
+            return
+        try:
+            with span('log.append'):
+                # A sink may skip malformed rows and return how many it skipped
+                rejected = self.sink.append(rows) or 0
+        except OSError:
+            logger.exception("Failed to write %d calculation rows to %s", len(rows), self.sink)
+            self._count('failed_writes')
+            # Keep failed rows for a retry, but never hold more than the queue bound
+            overflow = len(rows) - self._queue.maxsize
+            if overflow > 0:
+                self._count('dropped', overflow)
+                rows = rows[overflow:]
+            self._pending = rows
+            return
+        except Exception:
+            # Not an I/O failure, so a retry would fail the same way; drop the batch rather than wedge the writer
+            logger.exception("Dropping %d calculation rows that %s could not store", len(rows), self.sink)
+            self._pending = []
+            self._count('rejected', len(rows))
+            return
+        self._pending = []
+        self._count('rejected', rejected)
+        self._count('written', len(rows) - rejected)
+        self._count('batches')
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_calculation_writer():
+    """Return the process-wide calculation log writer"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                if CALCULATIONS_BACKEND == 'parquet':
+                    from calculation_store import get_calculation_store
+                    _writer = CalculationLogWriter(sink=get_calculation_store())
+                else:
+                    _writer = CalculationLogWriter()
+                get_metrics().add_collector(lambda: _writer_metrics(_writer))
+    return _writer
+
+
+def _writer_metrics(writer):
+    stats = writer.stats()
+    return [
+        ('log_rows_submitted_total', 'counter', stats['submitted']),
+        ('log_rows_written_total', 'counter', stats['written']),
+        ('log_rows_dropped_total', 'counter', stats['dropped']),
+        ('log_rows_rejected_total', 'counter', stats['rejected']),
+        ('log_write_failures_total', 'counter', stats['failed_writes']),
+        ('log_batches_total', 'counter', stats['batches']),
+        ('log_rows_queued', 'gauge', stats['queued']),
+    ]
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Incremental rollup of the calculations log for the admin dashboard
+The rollup remembers the byte offset it last consumed in data/calculations.csv
+and folds only newly appended rows into running aggregates, which are
+persisted next to the log so a restarted worker resumes where it left off.
+Alongside the group-bys it keeps the minute/hour/day activity timeline and
+a mergeable usage sketch per day, so distinct postcodes and top-N over any
+range of days come from the sketches rather than the log.
+
+State is saved at most every SAVE_INTERVAL seconds or SAVE_ROWS rows, so
+frequent refreshes do not each rewrite it; rows folded since the last save
+are simply read from the log again after a restart. Day sketches live in
+their own files and only the days that changed are rewritten. Loads and
+saves take a lock next to the state, so processes sharing it never see one
+another's half-finished saves.
+"""
+
+import contextlib
+import csv
+import gc
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import quote, unquote
+
+from activity_timeline import ActivityTimeline, bucket_key
+from calculation_log import CALCULATIONS_FILE, lock_file, unlock_file
+from postcode_index import PostcodeDemandIndex
+from sketches import UsageSketch, exact_usage_summary
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FILE = 'data/calculations_rollup.json'
+ROLLUP_VERSION = 7
+RECENT_ROWS = 20
+SAVE_INTERVAL = 30.0
+SAVE_ROWS = 10000
+READ_BLOCK_BYTES = 1024 * 1024
+
+
+class RollupView:
+    """Read interface shared by the dashboard aggregate sources
+
+    Subclasses fill in the totals, the postcode / vehicle type / purchase year
+    group-bys of [num_vehicles, estimated_electricity_demand, calculations],
+    the postcode hierarchy index, the activity timeline and the recent rows.
+    """
+
+    fieldnames = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calculations = 0
+        self.vehicles = 0
+        self.electricity_demand = 0
+        self.postcodes = {}
+        self.vehicle_types = {}
+        self.purchase_years = {}
+        self.postcode_index = PostcodeDemandIndex()
+        self.timeline = ActivityTimeline()
+        self.recent = deque(maxlen=RECENT_ROWS)
+
+    @property
+    def unique_postcodes(self):
+        return len(self.postcodes)
+
+    def postcode_summary(self):
+        """Rows of (postcode, num_vehicles, demand, calculations) by demand, highest first"""
+        with self._lock:
+            rows = [(postcode, *values) for postcode, values in self.postcodes.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def postcode_level_summary(self, level, prefix=None, purchase_year=None, top=None):
+        """Rows of (code, num_vehicles, demand, calculations) at an area/district/sector/postcode level"""
+        with self._lock:
+            if top is not None:
+                return self.postcode_index.top(top, level, prefix, purchase_year)
+            rows = self.postcode_index.rollup(level, prefix, purchase_year)
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def vehicle_summary(self):
+        """Rows of (vehicle_type, num_vehicles, demand, calculations) by vehicle count, highest first"""
+        with self._lock:
+            rows = [(vehicle_type, *values) for vehicle_type, values in self.vehicle_types.items()]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
+
+    def year_summary(self):
+        """Rows of (purchase_year, num_vehicles, demand, calculations) in year order"""
+        with self._lock:
+            return [(year, *self.purchase_years[year]) for year in sorted(self.purchase_years)]
+
+    def activity_series(self, resolution, start=None, end=None, vehicle_type=None):
+        """Rows of (bucket, num_vehicles, demand, calculations) over time; see ActivityTimeline.series"""
+        with self._lock:
+            return self.timeline.series(resolution, start, end, vehicle_type)
+
+    def activity_resolution(self, start=None, end=None):
+        with self._lock:
+            return self.timeline.resolution_for(start, end)
+
+    def recent_rows(self):
+        with self._lock:
+            return list(self.recent)
+
+    def usage_summary(self, start=None, end=None, top=10, exact=False):
+        """Distinct postcodes and the top postcodes and vehicle types over whole days from start to end
+
+        Estimated from the mergeable sketches, with error bounds; exact reads
+        the rows instead and is as slow as the log is large.
+        """
+        if exact:
+            return self.exact_usage_summary(start, end, top)
+        return self.usage_sketch(start, end).summary(top)
+
+    def usage_sketch(self, start=None, end=None):
+        """UsageSketch merged over the days from start to end inclusive"""
+        raise NotImplementedError
+
+    def exact_usage_summary(self, start=None, end=None, top=10):
+        raise NotImplementedError
+
+
+class CalculationRollup(RollupView):
+    """Running totals and group-bys over the calculations log"""
+
+    def __init__(self, log_path=CALCULATIONS_FILE, state_path=ROLLUP_FILE):
+        super().__init__()
+        self.log_path = log_path
+        self.state_path = state_path
+        self.sketch_dir = f"{state_path}.sketches"
+        self._saved_at = None
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.offset = 0
+        self.inode = None
+        self.fieldnames = None
+        self.calculations = 0
+        self.vehicles = 0
+        self.electricity_demand = 0
+        self.skipped_rows = 0
+        # Group-bys hold [num_vehicles, estimated_electricity_demand, calculations]
+        self.postcodes = {}
+        self.vehicle_types = {}
+        self.purchase_years = {}
+        self.postcode_index = PostcodeDemandIndex()
+        self.timeline = ActivityTimeline()
+        self.day_sketches = {}
+        self.recent = deque(maxlen=RECENT_ROWS)
+        # Saves are numbered so sketch files written after the last complete save can be detected
+        self.generation = 0
+        self._unsaved_rows = 0
+        self._dirty_days = set()
+        self._stale_sketch_files = True
+
+    @contextlib.contextmanager
+    def _state_lock(self, shared):
+        """Cross-process lock on the state and its sketch files; loads share it, saves hold it exclusively"""
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.state_path}.lock", 'a') as file:
+            lock_file(file, shared=shared)
+            try:
+                yield
+            finally:
+                unlock_file(file)
+
+    def _load(self):
+        # Restoring builds a few hundred thousand containers, none of them cyclic; collecting
+        # garbage part way through would only rescan them
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with self._state_lock(shared=True):
+                self._load_state()
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Ignoring unreadable rollup state %s", self.state_path)
+            return
+        if state.get('version') != ROLLUP_VERSION:
+            return
+
+        self.offset = state['offset']
+        self.inode = state['inode']
+        self.fieldnames = state['fieldnames']
+        self.calculations = state['calculations']
+        self.vehicles = state['vehicles']
+        self.electricity_demand = state['electricity_demand']
+        self.skipped_rows = state['skipped_rows']
+        self.postcodes = _groups_from_json(state['postcodes'])
+        self.vehicle_types = _groups_from_json(state['vehicle_types'])
+        self.purchase_years = _groups_from_json(state['purchase_years'])
+        self.postcode_index = PostcodeDemandIndex.from_json(state['postcode_index'])
+        self.timeline = ActivityTimeline.from_json(state['timeline'])
+        self.recent.extend(state['recent'])
+        self.generation = state['generation']
+        try:
+            self.day_sketches = self._load_sketches()
+        except (OSError, ValueError):
+            # Sketches from an interrupted save (or unreadable ones) no longer match the totals; rebuild
+            logger.exception("Rebuilding the rollup; its day sketches do not match %s", self.state_path)
+            self._reset()
+            return
+        self._stale_sketch_files = False
+
+    def _load_sketches(self):
+        sketches = {}
+        for name in os.listdir(self.sketch_dir) if os.path.isdir(self.sketch_dir) else ():
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(self.sketch_dir, name), encoding='utf-8') as file:
+                generation, sketch = json.load(file)
+            if generation > self.generation:
+                raise ValueError(f"sketch {name} is newer than the rollup state")
+            sketches[unquote(name[:-len('.json')])] = UsageSketch.from_json(sketch)
+        return sketches
+
+    def _save(self):
+        with self._state_lock(shared=False):
+            self._save_state()
+
+    def _save_state(self):
+        self.generation += 1
+        os.makedirs(self.sketch_dir, exist_ok=True)
+        if self._stale_sketch_files:
+            # Starting over: drop the sketch files left by an earlier state, but nothing else in the directory
+            for name in os.listdir(self.sketch_dir):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.sketch_dir, name))
+            self._dirty_days = set(self.day_sketches)
+            self._stale_sketch_files = False
+        for day in sorted(self._dirty_days):
+            # Day keys come from the log's timestamps, so quote anything unexpected out of the path
+            _write_json(os.path.join(self.sketch_dir, f"{quote(day, safe='')}.json"),
+                        [self.generation, self.day_sketches[day].to_json()])
+        self._dirty_days.clear()
+
+        state = {
+            'version': ROLLUP_VERSION,
+            'generation': self.generation,
+            'offset': self.offset,
+            'inode': self.inode,
+            'fieldnames': self.fieldnames,
+            'calculations': self.calculations,
+            'vehicles': self.vehicles,
+            'electricity_demand': self.electricity_demand,
+            'skipped_rows': self.skipped_rows,
+            'postcodes': _groups_to_json(self.postcodes),
+            'vehicle_types': _groups_to_json(self.vehicle_types),
+            'purchase_years': _groups_to_json(self.purchase_years),
+            'postcode_index': self.postcode_index.to_json(),
+            'timeline': self.timeline.to_json(),
+            'recent': list(self.recent),
+        }
+        # The state goes last, so its generation covers every sketch file written before it
+        _write_json(self.state_path, state)
+        self._unsaved_rows = 0
+        self._saved_at = time.monotonic()
+
+    def refresh(self):
+        """Fold rows appended since the last refresh; returns the number of new rows"""
+        with self._lock:
+            try:
+                stat = os.stat(self.log_path)
+            except FileNotFoundError:
+                return 0
+
+            # Start over if the log was replaced or truncated
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                self._reset()
+                self.inode = stat.st_ino
+            if stat.st_size == self.offset:
+                return 0
+
+            offset = self.offset
+            added = 0
+            with open(self.log_path, 'rb') as file:
+                file.seek(offset)
+                remaining = stat.st_size - offset
+                partial = b''
+                # A block at a time, so catching up on a large log never holds it all in memory
+                while remaining > 0:
+                    block = file.read(min(READ_BLOCK_BYTES, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    data = partial + block
+                    # Only consume complete lines; a partially written row is picked up next time
+                    end = data.rfind(b'\n') + 1
+                    partial = data[end:]
+                    if end:
+                        added += self._fold_lines(data[:end])
+            if self.offset == offset:
+                return 0
+
+            self._unsaved_rows += added
+            if (self._saved_at is None or self._unsaved_rows >= SAVE_ROWS
+                    or time.monotonic() - self._saved_at >= SAVE_INTERVAL):
+                self._save()
+            return added
+
+    def _fold_lines(self, data):
+        """Fold a block of complete CSV lines and move the offset past them"""
+        self.offset += len(data)
+        reader = csv.reader(io.StringIO(data.decode('utf-8')))
+        if self.fieldnames is None:
+            self.fieldnames = next(reader, None)
+        return self._fold(reader)
+
+    def _fold(self, reader):
+        fields = self.fieldnames
+        added = 0
+        for values in reader:
+            if not values:
+                continue
+            row = dict(zip(fields, values))
+            try:
+                num_vehicles = int(row['num_vehicles'])
+                demand = int(row['estimated_electricity_demand'])
+                purchase_year = int(row['purchase_year'])
+            except (KeyError, ValueError):
+                self.skipped_rows += 1
+                continue
+
+            self.calculations += 1
+            self.vehicles += num_vehicles
+            self.electricity_demand += demand
+            for groups, key in ((self.postcodes, row.get('postcode')),
+                                (self.vehicle_types, row.get('vehicle_type')),
+                                (self.purchase_years, purchase_year)):
+                if not key:
+                    continue
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = [num_vehicles, demand, 1]
+                else:
+                    group[0] += num_vehicles
+                    group[1] += demand
+                    group[2] += 1
+            if row.get('postcode'):
+                self.postcode_index.add(row['postcode'], purchase_year, num_vehicles, demand)
+            if row.get('timestamp'):
+                self.timeline.add(row['timestamp'], row.get('vehicle_type') or '', num_vehicles, demand)
+                day = bucket_key(row['timestamp'], 'day')
+                sketch = self.day_sketches.get(day)
+                if sketch is None:
+                    sketch = self.day_sketches[day] = UsageSketch()
+                sketch.add(row.get('postcode'), row.get('vehicle_type'))
+                self._dirty_days.add(day)
+            row.update(num_vehicles=num_vehicles, estimated_electricity_demand=demand, purchase_year=purchase_year)
+            self.recent.append(row)
+            added += 1
+        return added
+
+    def usage_sketch(self, start=None, end=None):
+        first = None if start is None else bucket_key(start, 'day')
+        last = None if end is None else bucket_key(end, 'day')
+        with self._lock:
+            return UsageSketch.merged(sketch for day, sketch in self.day_sketches.items()
+                                      if (first is None or day >= first) and (last is None or day <= last))
+
+    def exact_usage_summary(self, start=None, end=None, top=10):
+        if start is None and end is None:
+            # The all-time group-bys are already exact
+            with self._lock:
+                return exact_usage_summary(
+                    self.calculations, {postcode: values[2] for postcode, values in self.postcodes.items()},
+                    {vehicle_type: values[2] for vehicle_type, values in self.vehicle_types.items()}, top)
+
+        first = None if start is None else bucket_key(start, 'day')
+        last = None if end is None else bucket_key(end, 'day')
+        rows = 0
+        postcodes = {}
+        vehicle_types = {}
+        try:
+            with open(self.log_path, newline='', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    day = bucket_key(row.get('timestamp') or '', 'day')
+                    if (first is not None and day < first) or (last is not None and day > last):
+                        continue
+                    rows += 1
+                    for counts, key in ((postcodes, row.get('postcode')), (vehicle_types, row.get('vehicle_type'))):
+                        if key:
+                            counts[key] = counts.get(key, 0) + 1
+        except FileNotFoundError:
+            pass
+        return exact_usage_summary(rows, postcodes, vehicle_types, top)
+
+
+def _groups_to_json(groups):
+    """A group-by as [keys, flattened stats], much quicker to parse than an object of lists"""
+    return [list(groups), [value for stats in groups.values() for value in stats]]
+
+
+def _groups_from_json(data):
+    keys, values = data
+    return {key: values[i * 3:i * 3 + 3] for i, key in enumerate(keys)}
+
+
+def _write_json(path, data):
+    # Write-then-rename so readers in other processes never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+_rollup = None
+_rollup_lock = threading.Lock()
+
+
+def get_calculation_rollup():
+    """Return the process-wide rollup, refreshed with any newly appended rows"""
+    global _rollup
+    with _rollup_lock:
+        if _rollup is None:
+            _rollup = CalculationRollup()
+    _rollup.refresh()
+    return _rollup
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+Day-partitioned columnar storage for the calculations log (optional backend)
+Rows are written as dictionary-encoded Parquet files under
+data/calculations/date=YYYY-MM-DD/, so readers only open the partitions and
+columns a query needs. Every part file has a usage sketch sidecar
+(part-....parquet.sketch.json); part files never change, so the sidecars are
+merged per query into distinct-postcode and top-N estimates for any range of
+days. A summary sidecar (part-....parquet.summary.json) holds the file's
+dashboard totals and group-bys; the store's summary folds them in as files
+appear, so the dashboard only reads the files added since it last looked.
+A partition that reaches COMPACT_FILE_THRESHOLD part files is compacted by
+the append that takes it there. A compacted file lists the files it replaces
+in a supersedes sidecar, written before it becomes visible, so a compaction
+interrupted before removing them never counts their rows twice. Requires
+pyarrow (pip install pyarrow).
+
+Usage:
+    python calculation_store.py migrate [--csv data/calculations.csv]
+    python calculation_store.py compact
+"""
+
+import argparse
+import contextlib
+import csv
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+
+from activity_timeline import ActivityTimeline
+from calculation_log import CALCULATIONS_FILE, FIELDNAMES, lock_file, unlock_file
+from calculation_rollup import RollupView, RECENT_ROWS
+from postcode_index import PostcodeDemandIndex
+from sketches import UsageSketch, exact_usage_summary
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+STORE_ROOT = 'data/calculations'
+PARTITION_PREFIX = 'date='
+DICTIONARY_COLUMNS = ['vehicle_type', 'postcode']
+COMPACT_TARGET_BYTES = 64 * 1024 * 1024
+COMPACT_FILE_THRESHOLD = 32
+MIGRATE_CHUNK_ROWS = 100000
+SCAN_BATCH_ROWS = 65536
+SKETCH_SUFFIX = '.sketch.json'
+SUMMARY_SUFFIX = '.summary.json'
+SUPERSEDES_SUFFIX = '.supersedes.json'
+SIDECAR_SUFFIXES = (SKETCH_SUFFIX, SUMMARY_SUFFIX, SUPERSEDES_SUFFIX)
+
+_INT_COLUMNS = ('num_vehicles', 'purchase_year', 'annual_mileage', 'estimated_electricity_demand')
+_SUMMARY_COLUMNS = ['timestamp', 'postcode', 'vehicle_type', 'purchase_year', 'num_vehicles',
+                    'estimated_electricity_demand']
+# Summary group-bys and their key columns; each key maps to [num_vehicles, estimated_electricity_demand, calculations]
+SUMMARY_GROUPS = {
+    'postcode': ('postcode',),
+    'vehicle_type': ('vehicle_type',),
+    'purchase_year': ('purchase_year',),
+    'postcode_year': ('postcode', 'purchase_year'),
+    'minute': ('minute', 'vehicle_type'),
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The parquet calculations backend requires pyarrow (pip install pyarrow)")
+
+
+def _schema():
+    return pa.schema([
+        ('timestamp', pa.timestamp('us')),
+        ('vehicle_type', pa.string()),
+        ('num_vehicles', pa.int32()),
+        ('postcode', pa.string()),
+        ('purchase_year', pa.int16()),
+        ('annual_mileage', pa.int32()),
+        ('estimated_electricity_demand', pa.int64()),
+    ])
+
+
+def _as_date(value):
+    """Accept a date, datetime or ISO string and return a date (or None)"""
+    if value is None or (isinstance(value, date) and not isinstance(value, datetime)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date()
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime(value.year, value.month, value.day)
+
+
+def time_bounds(start, end):
+    """Inclusive timestamp bounds; a bare end date covers that whole day"""
+    end_time = _as_datetime(end)
+    if end is not None and not isinstance(end, datetime) and (not isinstance(end, str) or len(end) == 10):
+        end_time = datetime.combine(_as_date(end), datetime.max.time())
+    return _as_datetime(start), end_time
+
+
+def _record(row):
+    """A log row with typed values; raises ValueError (or TypeError, KeyError) for a malformed row"""
+    record = dict(row)
+    record['timestamp'] = _as_datetime(record['timestamp'])
+    if record['timestamp'] is None:
+        raise ValueError("timestamp is missing")
+    if record['timestamp'].tzinfo is not None:
+        raise ValueError("timestamp has a time zone")
+    for column in _INT_COLUMNS:
+        record[column] = int(record[column])
+    return record
+
+
+def _table_summary(table):
+    """Totals and SUMMARY_GROUPS group-bys of a table with the _SUMMARY_COLUMNS"""
+    table = table.append_column('minute', pc.strftime(pc.floor_temporal(table['timestamp'], unit='minute'),
+                                                      format='%Y-%m-%dT%H:%M'))
+    summary = {'totals': [pc.sum(table['num_vehicles']).as_py() or 0,
+                          pc.sum(table['estimated_electricity_demand']).as_py() or 0, table.num_rows]}
+    for group, keys in SUMMARY_GROUPS.items():
+        grouped = table.group_by(list(keys)).aggregate([
+            ('num_vehicles', 'sum'),
+            ('estimated_electricity_demand', 'sum'),
+            ('num_vehicles', 'count'),
+        ]).to_pydict()
+        summary[group] = {
+            key: [vehicles, demand, count]
+            for key, vehicles, demand, count in zip(
+                zip(*(grouped[key] for key in keys)), grouped['num_vehicles_sum'],
+                grouped['estimated_electricity_demand_sum'], grouped['num_vehicles_count'])
+        }
+    return summary
+
+
+def _summary_to_json(summary):
+    return {'totals': summary['totals'],
+            **{group: [[*key, *stats] for key, stats in summary[group].items()] for group in SUMMARY_GROUPS}}
+
+
+def _summary_from_json(data):
+    return {'totals': data['totals'],
+            **{group: {tuple(row[:-3]): row[-3:] for row in data[group]} for group in SUMMARY_GROUPS}}
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+@functools.lru_cache(maxsize=4096)
+def _superseded_names(path):
+    """Names of the part files a compacted file replaced; the sidecar never changes once written"""
+    with open(f"{path}{SUPERSEDES_SUFFIX}", encoding='utf-8') as file:
+        return frozenset(json.load(file))
+
+
+class PartitionedCalculationStore:
+    """Append, compact and query day partitions of calculation records"""
+
+    def __init__(self, root=STORE_ROOT):
+        _require_pyarrow()
+        self.root = root
+        self.schema = _schema()
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+        self._sketches = {}  # part file path -> UsageSketch; part files are immutable
+        self._sketches_lock = threading.Lock()
+        self._summary = None
+        self._summary_lock = threading.Lock()
+
+    def __str__(self):
+        return self.root
+
+    @contextlib.contextmanager
+    def _store_lock(self, shared, name='.lock'):
+        """Readers share this lock; compaction holds it exclusively while swapping files"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, name), 'a') as file:
+            lock_file(file, shared=shared)
+            try:
+                yield
+            finally:
+                unlock_file(file)
+
+    def _new_file_name(self):
+        with self._sequence_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        return f"part-{time.time_ns()}-{os.getpid()}-{sequence}.parquet"
+
+    def _write_table(self, directory, table, supersedes=()):
+        """Write a table to a new part file, renaming into place so readers never see it half-written"""
+        os.makedirs(directory, exist_ok=True)
+        name = self._new_file_name()
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        pq.write_table(table, tmp_path, compression='zstd', use_dictionary=DICTIONARY_COLUMNS)
+        path = os.path.join(directory, name)
+        # The sidecars go first so every visible part file already has them
+        self._write_sketch(path, self._table_sketch(table))
+        _write_json(f"{path}{SUMMARY_SUFFIX}", _summary_to_json(_table_summary(table)))
+        if supersedes:
+            _write_json(f"{path}{SUPERSEDES_SUFFIX}", sorted(os.path.basename(held) for held in supersedes))
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def _table_sketch(table):
+        def counts(column):
+            return {entry['values']: entry['counts'] for entry in pc.value_counts(table[column]).to_pylist()}
+
+        return UsageSketch.from_counts(table.num_rows, counts('postcode'), counts('vehicle_type'))
+
+    def _write_sketch(self, path, sketch):
+        _write_json(f"{path}{SKETCH_SUFFIX}", sketch.to_json())
+        with self._sketches_lock:
+            self._sketches[path] = sketch
+
+    def _file_sketch(self, path):
+        """The usage sketch of one part file, from memory, its sidecar, or (for older files) the file itself"""
+        with self._sketches_lock:
+            sketch = self._sketches.get(path)
+        if sketch is not None:
+            return sketch
+        try:
+            with open(f"{path}{SKETCH_SUFFIX}", encoding='utf-8') as file:
+                sketch = UsageSketch.from_json(json.load(file))
+        except FileNotFoundError:
+            sketch = self._table_sketch(pq.read_table(path, columns=['postcode', 'vehicle_type']))
+            self._write_sketch(path, sketch)
+            return sketch
+        with self._sketches_lock:
+            self._sketches[path] = sketch
+        return sketch
+
+    @staticmethod
+    def _file_summary(path):
+        """The summary of one part file, from its sidecar or (for older files) the file itself"""
+        try:
+            with open(f"{path}{SUMMARY_SUFFIX}", encoding='utf-8') as file:
+                return _summary_from_json(json.load(file))
+        except FileNotFoundError:
+            summary = _table_summary(pq.read_table(path, columns=_SUMMARY_COLUMNS))
+            _write_json(f"{path}{SUMMARY_SUFFIX}", _summary_to_json(summary))
+            return summary
+
+    @staticmethod
+    def superseded_files(path):
+        """The part files a compacted file replaced (empty for a file written by append)"""
+        try:
+            names = _superseded_names(path)
+        except FileNotFoundError:
+            return frozenset()
+        directory = os.path.dirname(path)
+        return frozenset(os.path.join(directory, name) for name in names)
+
+    def partitions(self, start=None, end=None):
+        """Return (day, directory) pairs, pruned to the inclusive [start, end] date range"""
+        start, end = _as_date(start), _as_date(end)
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        result = []
+        for name in sorted(names):
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            day = date.fromisoformat(name[len(PARTITION_PREFIX):])
+            if (start is None or day >= start) and (end is None or day <= end):
+                result.append((day, os.path.join(self.root, name)))
+        return result
+
+    @staticmethod
+    def part_files(directory):
+        """Live part files of a partition, leaving out any that a compacted file has replaced"""
+        names = set(os.listdir(directory))
+        parts = {name for name in names if name.startswith('part-') and name.endswith('.parquet')}
+        replaced = set()
+        for name in parts:
+            if f"{name}{SUPERSEDES_SUFFIX}" in names:
+                replaced |= _superseded_names(os.path.join(directory, name))
+        return sorted(os.path.join(directory, name) for name in parts - replaced)
+
+    def _remove_superseded(self, directory):
+        """Delete part files (and their sidecars) that a compacted file has replaced"""
+        names = set(os.listdir(directory))
+        for name in names:
+            if name.endswith(f".parquet{SUPERSEDES_SUFFIX}") and name[:-len(SUPERSEDES_SUFFIX)] in names:
+                for replaced in _superseded_names(os.path.join(directory, name[:-len(SUPERSEDES_SUFFIX)])):
+                    path = os.path.join(directory, replaced)
+                    for suffix in ('',) + SIDECAR_SUFFIXES:
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(f"{path}{suffix}")
+
+    def _table(self, records):
+        """A table of typed records, logging and leaving out any the schema cannot hold"""
+        try:
+            return pa.Table.from_pylist(records, schema=self.schema), 0
+        except (TypeError, ValueError):
+            pass
+        valid = []
+        for record in records:
+            try:
+                pa.Table.from_pylist([record], schema=self.schema)
+            except (TypeError, ValueError) as e:
+                logger.warning("Skipping calculation row that does not fit the store schema (%s): %r", e, record)
+                continue
+            valid.append(record)
+        return pa.Table.from_pylist(valid, schema=self.schema), len(records) - len(valid)
+
+    def append(self, rows):
+        """Write a batch of records (as produced by save_calculation_data), one file per day
+
+        Malformed rows are logged and skipped so they cannot hold up the rest
+        of the batch. Returns the number of rows skipped.
+        """
+        by_day = {}
+        rejected = 0
+        for row in rows:
+            try:
+                record = _record(row)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning("Skipping malformed calculation row (%s): %r", e, row)
+                rejected += 1
+                continue
+            by_day.setdefault(record['timestamp'].date(), []).append(record)
+
+        for day, records in by_day.items():
+            records.sort(key=lambda record: record['timestamp'])
+            table, skipped = self._table(records)
+            rejected += skipped
+            if not table.num_rows:
+                continue
+            directory = os.path.join(self.root, f"{PARTITION_PREFIX}{day.isoformat()}")
+            self._write_table(directory, table)
+            # One file per flush per day adds up; merge them before readers have to open them all
+            if len(self.part_files(directory)) >= COMPACT_FILE_THRESHOLD:
+                self.compact(day, day)
+        return rejected
+
+    def compact(self, start=None, end=None, target_bytes=COMPACT_TARGET_BYTES):
+        """Merge small part files within each partition; returns the number of files removed"""
+        removed = 0
+        # Only one compactor at a time; readers are only blocked for the file swap
+        with self._store_lock(shared=False, name='.compact.lock'):
+            for _, directory in self.partitions(start, end):
+                small = [path for path in self.part_files(directory) if os.path.getsize(path) < target_bytes]
+                if len(small) >= 2:
+                    table = pa.concat_tables(pq.read_table(path, schema=self.schema) for path in small)
+                    # Readers skip the small files as soon as the merged file (and its supersedes sidecar) appears
+                    self._write_table(directory, table.sort_by('timestamp'), supersedes=small)
+                    removed += len(small) - 1
+                # Also finishes a compaction interrupted before it removed the files it replaced
+                with self._store_lock(shared=False):
+                    self._remove_superseded(directory)
+        return removed
+
+    @staticmethod
+    def _predicate(start, end, postcodes, vehicle_types):
+        start_time, end_time = time_bounds(start, end)
+        predicate = None
+        for condition in (
+            ds.field('timestamp') >= pa.scalar(start_time, pa.timestamp('us')) if start_time else None,
+            ds.field('timestamp') <= pa.scalar(end_time, pa.timestamp('us')) if end_time else None,
+            ds.field('postcode').isin([postcode.upper() for postcode in postcodes]) if postcodes else None,
+            ds.field('vehicle_type').isin(list(vehicle_types)) if vehicle_types else None,
+        ):
+            if condition is not None:
+                predicate = condition if predicate is None else predicate & condition
+        return predicate
+
+    def scan(self, columns=None, start=None, end=None, postcodes=None, vehicle_types=None):
+        """Read matching rows as a pyarrow Table
+
+        start/end bound the timestamp (inclusive, date or datetime); whole days
+        outside the range are skipped without being opened, and the remaining
+        predicates are pushed down to Parquet row-group statistics.
+        """
+        predicate = self._predicate(start, end, postcodes, vehicle_types)
+        with self._store_lock(shared=True):
+            files = [path for _, directory in self.partitions(start, end) for path in self.part_files(directory)]
+            if not files:
+                return self.schema.empty_table().select(columns or self.schema.names)
+            dataset = ds.dataset(files, schema=self.schema, format='parquet')
+            return dataset.to_table(columns=columns, filter=predicate)
+
+    def iter_batches(self, columns=None, start=None, end=None, postcodes=None, vehicle_types=None,
+                     batch_size=SCAN_BATCH_ROWS):
+        """Yield matching rows as pyarrow RecordBatches, oldest partition first
+
+        Filters are as for scan(). Only one batch is in memory at a time. The
+        shared lock is held until the generator finishes, so compaction waits
+        for a stream in progress instead of removing files from under it.
+        """
+        predicate = self._predicate(start, end, postcodes, vehicle_types)
+        with self._store_lock(shared=True):
+            for _, directory in self.partitions(start, end):
+                files = self.part_files(directory)
+                if files:
+                    dataset = ds.dataset(files, schema=self.schema, format='parquet')
+                    yield from dataset.to_batches(columns=columns, filter=predicate, batch_size=batch_size)
+
+    def read(self, columns=None, **filters):
+        """Read matching rows as a pandas DataFrame"""
+        return self.scan(columns=columns, **filters).to_pandas()
+
+    def recent_rows(self, limit=RECENT_ROWS):
+        """Return the latest rows as dicts, opening only the newest partitions"""
+        tables = []
+        rows = 0
+        with self._store_lock(shared=True):
+            for _, directory in reversed(self.partitions()):
+                files = self.part_files(directory)
+                if not files:
+                    continue
+                table = ds.dataset(files, schema=self.schema, format='parquet').to_table()
+                tables.append(table)
+                rows += table.num_rows
+                if rows >= limit:
+                    break
+        if not tables:
+            return []
+        table = pa.concat_tables(tables).sort_by('timestamp')
+        recent = table.slice(max(0, table.num_rows - limit)).to_pylist()
+        for row in recent:
+            row['timestamp'] = row['timestamp'].isoformat()
+        return recent
+
+    def usage_sketch(self, start=None, end=None):
+        """UsageSketch merged over the part files of the days from start to end inclusive"""
+        with self._store_lock(shared=True):
+            files = [path for _, directory in self.partitions(start, end) for path in self.part_files(directory)]
+            sketches = [self._file_sketch(path) for path in files]
+        if start is None and end is None:
+            # Every live file was just listed; forget files removed by compaction
+            live = set(files)
+            with self._sketches_lock:
+                self._sketches = {path: sketch for path, sketch in self._sketches.items() if path in live}
+        return UsageSketch.merged(sketches)
+
+    def exact_usage_summary(self, start=None, end=None, top=10):
+        """Exact usage summary over whole days, scanning the postcode and vehicle type columns"""
+        def counts(column):
+            return {entry['values']: entry['counts'] for entry in pc.value_counts(table[column]).to_pylist()
+                    if entry['values']}
+
+        table = self.scan(columns=['postcode', 'vehicle_type'], start=_as_date(start), end=_as_date(end))
+        return exact_usage_summary(table.num_rows, counts('postcode'), counts('vehicle_type'), top)
+
+    def summary(self):
+        """Dashboard aggregates computed from the store, brought up to date with any new part files"""
+        with self._summary_lock:
+            if self._summary is None:
+                self._summary = StoreSummary(self)
+                return self._summary
+        self._summary.refresh()
+        return self._summary
+
+
+class StoreSummary(RollupView):
+    """Dashboard aggregates folded from the store's part file summaries
+
+    A refresh folds in only the part files added since the last one. A
+    compacted file that replaces files already folded in is skipped; any
+    other removal starts the fold again from the summary sidecars.
+    """
+
+    fieldnames = FIELDNAMES
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self._files = frozenset()  # Part files folded in so far
+        self._refresh_lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Fold in the part files added since the last refresh; returns the number of files read"""
+        store = self.store
+        with self._refresh_lock:
+            with store._store_lock(shared=True):
+                files = frozenset(path for _, directory in store.partitions()
+                                  for path in store.part_files(directory))
+                if files == self._files:
+                    return 0
+                added = files - self._files
+                superseded = {path: store.superseded_files(path) for path in added}
+                compacted = {path for path in added if superseded[path] and superseded[path] <= self._files}
+                replaced = frozenset().union(*(superseded[path] for path in compacted))
+                rebuild = not (self._files - files) <= replaced
+                summaries = [store._file_summary(path) for path in sorted(files if rebuild else added - compacted)]
+                recent = store.recent_rows()
+            with self._lock:
+                if rebuild:
+                    self._clear()
+                for summary in summaries:
+                    self._fold(summary)
+                self.recent.clear()
+                self.recent.extend(recent)
+            self._files = files
+        return len(summaries)
+
+    def _clear(self):
+        self.calculations = 0
+        self.vehicles = 0
+        self.electricity_demand = 0
+        self.postcodes = {}
+        self.vehicle_types = {}
+        self.purchase_years = {}
+        self.postcode_index = PostcodeDemandIndex()
+        self.timeline = ActivityTimeline()
+
+    def _fold(self, summary):
+        """Add one part file's summary to the aggregates"""
+        vehicles, demand, calculations = summary['totals']
+        self.calculations += calculations
+        self.vehicles += vehicles
+        self.electricity_demand += demand
+        for group, groups in (('postcode', self.postcodes), ('vehicle_type', self.vehicle_types),
+                              ('purchase_year', self.purchase_years)):
+            for (key,), stats in summary[group].items():
+                if key:
+                    self._add(groups, key, stats)
+        for (postcode, year), (vehicles, demand, count) in summary['postcode_year'].items():
+            if postcode:
+                self.postcode_index.add(postcode, year, vehicles, demand, count)
+        # Minutes were grouped per file; the timeline folds each minute into the hour and day
+        for (minute, vehicle_type), (vehicles, demand, count) in sorted(summary['minute'].items(),
+                                                                        key=lambda item: item[0][0] or ''):
+            if minute is not None:
+                self.timeline.add(minute, vehicle_type or '', vehicles, demand, count)
+
+    def usage_sketch(self, start=None, end=None):
+        return self.store.usage_sketch(start, end)
+
+    def exact_usage_summary(self, start=None, end=None, top=10):
+        return self.store.exact_usage_summary(start, end, top)
+
+    @staticmethod
+    def _add(groups, key, stats):
+        held = groups.get(key)
+        if held is None:
+            groups[key] = list(stats)
+        else:
+            held[0] += stats[0]
+            held[1] += stats[1]
+            held[2] += stats[2]
+
+
+def migrate_csv(csv_path=CALCULATIONS_FILE, store=None, chunk_rows=MIGRATE_CHUNK_ROWS):
+    """Copy the CSV log into the partitioned store in bounded-memory chunks
+
+    Malformed rows (a missing or unparsable timestamp or number) are
+    skipped. Returns (rows copied, rows skipped).
+    """
+    store = store if store is not None else get_calculation_store()
+    copied = 0
+    skipped = 0
+    with open(csv_path, newline='', encoding='utf-8') as file:
+        chunk = []
+        for row in csv.DictReader(file):
+            try:
+                chunk.append(_record(row))
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            if len(chunk) >= chunk_rows:
+                store.append(chunk)
+                copied += len(chunk)
+                chunk = []
+        if chunk:
+            store.append(chunk)
+            copied += len(chunk)
+    store.compact()
+    return copied, skipped
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_calculation_store():
+    """Return the process-wide partitioned store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PartitionedCalculationStore()
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the partitioned calculations store")
+    parser.add_argument('--root', default=STORE_ROOT, help="store directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate = commands.add_parser('migrate', help="copy the CSV log into the store")
+    migrate.add_argument('--csv', default=CALCULATIONS_FILE, help="CSV log to migrate")
+    migrate.add_argument('--chunk-rows', type=int, default=MIGRATE_CHUNK_ROWS)
+    compact = commands.add_parser('compact', help="merge small part files")
+    compact.add_argument('--start', help="first day to compact (YYYY-MM-DD)")
+    compact.add_argument('--end', help="last day to compact (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    store = PartitionedCalculationStore(args.root)
+    if args.command == 'migrate':
+        copied, skipped = migrate_csv(args.csv, store, args.chunk_rows)
+        print(f"Migrated {copied:,} rows from {args.csv} to {store}; skipped {skipped:,} malformed rows")
+    else:
+        removed = store.compact(args.start, args.end)
+        print(f"Compaction removed {removed:,} files from {store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,36 @@
 """
 HGV/Van Electric vs Diesel Calculator - Streamlit Application (Updated)
 No deprecation warnings - Ready for production
+
+The page only renders; calculations come from calculator_core, so importing
+this module configures nothing until main() runs.
 """
 
 import streamlit as st
 import pandas as pd
-import csv
-import os
 import hashlib
-from datetime import datetime
+import json
+import gzip
+import io
+from datetime import datetime, timedelta
 
-# Configure Streamlit page for embedding
-st.set_page_config(
-    page_title="HGV/Van Electric vs Diesel Calculator",
-    page_icon="🚛",
-    layout="wide",
-    initial_sidebar_state="collapsed"  # Hide sidebar by default for embedding
+from activity_timeline import bucket_start
+from calculation_log import CALCULATIONS_BACKEND, get_calculation_writer
+from calculation_rollup import get_calculation_rollup
+from calculator_core import (
+    OPERATING_PERIODS,
+    PURCHASE_YEARS,
+    ScenarioError,
+    cached_scenario,
+    format_currency,
+    get_catalogue,
+    save_calculation_data,
 )
+from metrics import PROFILING_ENABLED, get_metrics, profile_report, profiled, span, start_metrics_server
+from scenario_cache import get_scenario_cache
 
 # Hide Streamlit elements for clean embedding
-hide_streamlit_style = """
+HIDE_STREAMLIT_STYLE = """
     <style>
     #MainMenu {visibility: hidden;}
     footer {visibility: hidden;}
@@ -29,162 +40,31 @@ hide_streamlit_style = """
     .stDecoration {display: none;}
     </style>
 """
-st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 
 # Admin password hash (change this to your desired password)
 # Current password is "admin123" - change the hash below for security
 ADMIN_PASSWORD_HASH = "240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9"  # admin123
 
-# Ensure data directory exists
-os.makedirs('data', exist_ok=True)
-
-# Vehicle data configuration
-VEHICLE_DATA = {
-    "van_small": {
-        "name": "Small Van (up to 2.5t)",
-        "electric_price": 35000,
-        "diesel_price": 25000,
-        "electric_efficiency": 3.5,  # kWh/mile
-        "diesel_efficiency": 35,  # mpg
-        "default_mileage": 15000,
-        "grant": 2500,
-        "test_frequency": "Annual MOT after 3 years",
-        "assumptions": [
-            "Electric vehicle price decreasing 8% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.35/kWh commercial rate (Ofgem, 2024)",
-            "Diesel cost: £1.45/litre average commercial rate (DfT, 2024)",
-            "Van grants available up to £2,500 (OZEV, 2024)",
-            "Insurance premium 15% higher for electric (SMMT, 2024)",
-            "Maintenance costs 40% lower for electric (Logistics UK, 2024)"
-        ]
-    },
-    "van_medium": {
-        "name": "Medium Van (2.5-3.5t)",
-        "electric_price": 45000,
-        "diesel_price": 30000,
-        "electric_efficiency": 4.2,
-        "diesel_efficiency": 32,
-        "default_mileage": 20000,
-        "grant": 2500,
-        "test_frequency": "Annual MOT after 3 years",
-        "assumptions": [
-            "Electric vehicle price decreasing 8% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.35/kWh commercial rate (Ofgem, 2024)",
-            "Diesel cost: £1.45/litre average commercial rate (DfT, 2024)",
-            "Van grants available up to £2,500 (OZEV, 2024)",
-            "Insurance premium 15% higher for electric (SMMT, 2024)",
-            "Maintenance costs 40% lower for electric (Logistics UK, 2024)"
-        ]
-    },
-    "van_large": {
-        "name": "Large Van (3.5-7.5t)",
-        "electric_price": 65000,
-        "diesel_price": 45000,
-        "electric_efficiency": 5.8,
-        "diesel_efficiency": 28,
-        "default_mileage": 25000,
-        "grant": 9000,
-        "test_frequency": "Annual MOT from first use",
-        "assumptions": [
-            "Electric vehicle price decreasing 10% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.32/kWh commercial rate (Ofgem, 2024)",
-            "Diesel cost: £1.45/litre average commercial rate (DfT, 2024)",
-            "Large van grants available up to £9,000 (OZEV, 2024)",
-            "Insurance premium 20% higher for electric (SMMT, 2024)",
-            "Maintenance costs 45% lower for electric (Logistics UK, 2024)"
-        ]
-    },
-    "hgv_rigid_small": {
-        "name": "Rigid HGV 7.5-12t",
-        "electric_price": 120000,
-        "diesel_price": 65000,
-        "electric_efficiency": 1.8,  # miles/kWh
-        "diesel_efficiency": 12,
-        "default_mileage": 35000,
-        "grant": 25000,
-        "test_frequency": "Annual MOT from first use, 6-weekly roadworthiness tests",
-        "assumptions": [
-            "Electric HGV price decreasing 12% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.28/kWh fleet rate (Ofgem, 2024)",
-            "Diesel cost: £1.42/litre commercial rate (DfT, 2024)",
-            "HGV grants available up to £25,000 (OZEV, 2024)",
-            "Insurance premium 25% higher for electric (RHA, 2024)",
-            "Maintenance costs 50% lower for electric (Logistics UK, 2024)"
-        ]
-    },
-    "hgv_rigid_medium": {
-        "name": "Rigid HGV 12-18t",
-        "electric_price": 180000,
-        "diesel_price": 85000,
-        "electric_efficiency": 1.6,
-        "diesel_efficiency": 10,
-        "default_mileage": 45000,
-        "grant": 40000,
-        "test_frequency": "Annual MOT from first use, 6-weekly roadworthiness tests",
-        "assumptions": [
-            "Electric HGV price decreasing 12% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.28/kWh fleet rate (Ofgem, 2024)",
-            "Diesel cost: £1.42/litre commercial rate (DfT, 2024)",
-            "HGV grants available up to £40,000 (OZEV, 2024)",
-            "Insurance premium 25% higher for electric (RHA, 2024)",
-            "Maintenance costs 50% lower for electric (Logistics UK, 2024)"
-        ]
-    },
-    "hgv_rigid_large": {
-        "name": "Rigid HGV 18-26t",
-        "electric_price": 220000,
-        "diesel_price": 105000,
-        "electric_efficiency": 1.4,
-        "diesel_efficiency": 9,
-        "default_mileage": 50000,
-        "grant": 40000,
-        "test_frequency": "Annual MOT from first use, 6-weekly roadworthiness tests",
-        "assumptions": [
-            "Electric HGV price decreasing 12% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.28/kWh fleet rate (Ofgem, 2024)",
-            "Diesel cost: £1.42/litre commercial rate (DfT, 2024)",
-            "HGV grants available up to £40,000 (OZEV, 2024)",
-            "Insurance premium 25% higher for electric (RHA, 2024)",
-            "Maintenance costs 50% lower for electric (Logistics UK, 2024)"
-        ]
-    },
-    "hgv_artic_small": {
-        "name": "Articulated HGV 26-32t",
-        "electric_price": 280000,
-        "diesel_price": 120000,
-        "electric_efficiency": 1.2,
-        "diesel_efficiency": 8.5,
-        "default_mileage": 80000,
-        "grant": 40000,
-        "test_frequency": "Annual MOT from first use, 6-weekly roadworthiness tests",
-        "assumptions": [
-            "Electric HGV price decreasing 15% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.25/kWh fleet rate with demand management (Ofgem, 2024)",
-            "Diesel cost: £1.40/litre bulk commercial rate (DfT, 2024)",
-            "HGV grants available up to £40,000 (OZEV, 2024)",
-            "Insurance premium 30% higher for electric (RHA, 2024)",
-            "Maintenance costs 55% lower for electric (Logistics UK, 2024)"
-        ]
-    },
-    "hgv_artic_large": {
-        "name": "Articulated HGV 32-44t",
-        "electric_price": 350000,
-        "diesel_price": 140000,
-        "electric_efficiency": 1.0,
-        "diesel_efficiency": 8,
-        "default_mileage": 100000,
-        "grant": 40000,
-        "test_frequency": "Annual MOT from first use, 6-weekly roadworthiness tests",
-        "assumptions": [
-            "Electric HGV price decreasing 15% annually (Carbon Trust, 2024)",
-            "Electricity cost: £0.25/kWh fleet rate with demand management (Ofgem, 2024)",
-            "Diesel cost: £1.40/litre bulk commercial rate (DfT, 2024)",
-            "HGV grants available up to £40,000 (OZEV, 2024)",
-            "Insurance premium 30% higher for electric (RHA, 2024)",
-            "Maintenance costs 55% lower for electric (Logistics UK, 2024)"
-        ]
-    }
+# Admin activity chart options: period -> look-back (None = everything), measure -> activity row column
+ACTIVITY_PERIODS = {
+    'Last hour': timedelta(hours=1),
+    'Last 24 hours': timedelta(days=1),
+    'Last 7 days': timedelta(days=7),
+    'Last 90 days': timedelta(days=90),
+    'All time': None,
 }
+ACTIVITY_MEASURES = {'Calculations': 3, 'Vehicles': 1, 'Electricity demand (kWh)': 2}
+
+
+def configure_page():
+    """Configure the Streamlit page for embedding; must be the first Streamlit call of each run"""
+    st.set_page_config(
+        page_title="HGV/Van Electric vs Diesel Calculator",
+        page_icon="🚛",
+        layout="wide",
+        initial_sidebar_state="collapsed"  # Hide sidebar by default for embedding
+    )
+    st.markdown(HIDE_STREAMLIT_STYLE, unsafe_allow_html=True)
 
 
 def hash_password(password):
@@ -199,115 +79,13 @@ def check_admin_access():
     return st.session_state.admin_authenticated
 
 
-def format_currency(amount):
-    """Format currency with UK formatting"""
-    return f"£{amount:,.0f}"
-
-
-def calculate_electric_costs(vehicle, purchase_price, annual_mileage, years):
-    """Calculate electric vehicle costs"""
-    total_mileage = annual_mileage * years
-    
-    # Energy rate based on vehicle type
-    energy_rate = 0.35  # Default for vans
-    if 'Large Van' in vehicle['name']:
-        energy_rate = 0.32
-    elif 'HGV' in vehicle['name']:
-        energy_rate = 0.25 if 'Articulated' in vehicle['name'] else 0.28
-    
-    # Calculate energy cost
-    if 'HGV' in vehicle['name']:
-        # HGV efficiency in miles/kWh
-        energy_cost = (total_mileage / vehicle['electric_efficiency']) * energy_rate
-    else:
-        # Van efficiency in kWh/mile
-        energy_cost = total_mileage * vehicle['electric_efficiency'] * energy_rate
-    
-    # Calculate other costs
-    maintenance_multiplier = 0.6 if 'van' in vehicle['name'].lower() else 0.5  # 40-50% lower
-    maintenance_cost = (0.08 if 'van' in vehicle['name'].lower() else 0.12) * total_mileage * maintenance_multiplier
-    
-    annual_insurance = 3500 if 'HGV' in vehicle['name'] else 1200
-    insurance_multiplier = 1.25 if 'HGV' in vehicle['name'] else 1.15  # 15-25% higher
-    insurance_cost = annual_insurance * years * insurance_multiplier
-    
-    net_purchase_price = purchase_price - vehicle['grant']
-    
-    return {
-        'purchase': net_purchase_price,
-        'energy': energy_cost,
-        'maintenance': maintenance_cost,
-        'insurance': insurance_cost,
-        'total': net_purchase_price + energy_cost + maintenance_cost + insurance_cost
-    }
-
-
-def calculate_diesel_costs(vehicle, purchase_price, annual_mileage, years):
-    """Calculate diesel vehicle costs"""
-    total_mileage = annual_mileage * years
-    diesel_price = 1.42 if 'HGV' in vehicle['name'] else 1.45  # £/litre
-    
-    # Fuel cost calculation
-    fuel_cost = (total_mileage / vehicle['diesel_efficiency']) * diesel_price * 4.546  # Convert to litres
-    
-    # Maintenance cost
-    maintenance_cost = (0.08 if 'van' in vehicle['name'].lower() else 0.12) * total_mileage
-    
-    # Insurance cost
-    annual_insurance = 3500 if 'HGV' in vehicle['name'] else 1200
-    insurance_cost = annual_insurance * years
-    
-    return {
-        'purchase': purchase_price,
-        'energy': fuel_cost,
-        'maintenance': maintenance_cost,
-        'insurance': insurance_cost,
-        'total': purchase_price + fuel_cost + maintenance_cost + insurance_cost
-    }
-
-
-def calculate_electricity_demand(vehicle_key, annual_mileage, num_vehicles):
-    """Calculate annual electricity demand in kWh"""
-    vehicle = VEHICLE_DATA[vehicle_key]
-    
-    if 'HGV' in vehicle['name']:
-        # HGV efficiency in miles/kWh, convert to kWh/mile
-        efficiency_kwh_per_mile = 1 / vehicle['electric_efficiency']
-    else:
-        # Van efficiency already in kWh/mile
-        efficiency_kwh_per_mile = vehicle['electric_efficiency']
-    
-    annual_kwh = annual_mileage * efficiency_kwh_per_mile * num_vehicles
-    return round(annual_kwh)
-
-
-def save_calculation_data(vehicle_type, num_vehicles, postcode, purchase_year, annual_mileage):
-    """Save calculation data to CSV for harvesting (silent - no user notification)"""
-    try:
-        calculation_record = {
-            'timestamp': datetime.now().isoformat(),
-            'vehicle_type': vehicle_type,
-            'num_vehicles': num_vehicles,
-            'postcode': postcode.upper(),
-            'purchase_year': purchase_year,
-            'annual_mileage': annual_mileage,
-            'estimated_electricity_demand': calculate_electricity_demand(vehicle_type, annual_mileage, num_vehicles)
-        }
-        
-        file_path = 'data/calculations.csv'
-        file_exists = os.path.isfile(file_path)
-        
-        with open(file_path, 'a', newline='', encoding='utf-8') as file:
-            fieldnames = ['timestamp', 'vehicle_type', 'num_vehicles', 'postcode', 
-                         'purchase_year', 'annual_mileage', 'estimated_electricity_demand']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            
-            if not file_exists:
-                writer.writeheader()
-            
-            writer.writerow(calculation_record)
-    except Exception:
-        pass  # Silent fail - don't show errors to users
+def get_dashboard_aggregates():
+    """Return dashboard aggregates from the configured calculations backend"""
+    with span('admin.aggregates'):
+        if CALCULATIONS_BACKEND == 'parquet':
+            from calculation_store import get_calculation_store
+            return get_calculation_store().summary()
+        return get_calculation_rollup()
 
 
 def admin_panel():
@@ -320,102 +98,227 @@ def admin_panel():
         st.rerun()
     
     try:
-        if os.path.exists('data/calculations.csv'):
-            df = pd.read_csv('data/calculations.csv')
+        rollup = get_dashboard_aggregates()
+        
+        if rollup.calculations:
+            st.subheader("📊 Usage Statistics")
             
-            if not df.empty:
-                st.subheader("📊 Usage Statistics")
-                
-                # Key metrics
+            # Key metrics
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Total Calculations", rollup.calculations)
+            with col2:
+                st.metric("Total Vehicles", rollup.vehicles)
+            with col3:
+                st.metric("Unique Postcodes", rollup.unique_postcodes)
+            with col4:
+                st.metric("Total Electricity Demand", f"{rollup.electricity_demand:,} kWh")
+            
+            writer_stats = get_calculation_writer().stats()
+            st.caption(f"Log writer (this process): {writer_stats['written']:,} written, "
+                       f"{writer_stats['queued']:,} queued, {writer_stats['dropped']:,} dropped, "
+                       f"{writer_stats['rejected']:,} rejected, {writer_stats['failed_writes']:,} failed writes")
+            catalogue = get_catalogue()
+            st.caption(f"Vehicle catalogue: version {catalogue.version} ({catalogue.fingerprint[:12]})")
+            cache_stats = get_scenario_cache().stats()
+            st.caption(f"Result cache (this process): {cache_stats['size']:,}/{cache_stats['maxsize']:,} entries, "
+                       f"{cache_stats['hits']:,} hits, {cache_stats['misses']:,} misses "
+                       f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['evictions']:,} evictions")
+            stage_summary = get_metrics().stage_summary()
+            if stage_summary:
+                st.caption("Stage latency (this process): " + ", ".join(
+                    f"{stage} {count:,}× {mean * 1000:.1f} ms mean" for stage, count, mean, _ in stage_summary))
+            
+            st.subheader("📈 Recent Activity")
+            st.dataframe(pd.DataFrame(rollup.recent_rows(), columns=rollup.fieldnames), use_container_width=True)
+            
+            # Volume over time comes from the pre-bucketed timeline, never the raw timestamps
+            st.subheader("🕒 Activity Over Time")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                period = st.selectbox("Period", list(ACTIVITY_PERIODS), index=1, key="activity_period")
+            with col2:
+                measure = st.selectbox("Measure", list(ACTIVITY_MEASURES), key="activity_measure")
+            with col3:
+                by_vehicle_type = st.checkbox("By vehicle type", key="activity_by_vehicle_type")
+            start = datetime.now() - ACTIVITY_PERIODS[period] if ACTIVITY_PERIODS[period] else None
+            resolution = rollup.activity_resolution(start)
+            column = ACTIVITY_MEASURES[measure]
+            series_names = list(rollup.vehicle_types) if by_vehicle_type else [None]
+            activity = pd.DataFrame({
+                name or measure: pd.Series({bucket_start(row[0]): row[column]
+                                            for row in rollup.activity_series(resolution, start, vehicle_type=name)},
+                                           dtype='int64')
+                for name in series_names
+            })
+            if activity.empty:
+                st.info("No calculations in this period")
+            else:
+                st.bar_chart(activity.sort_index().fillna(0))
+                st.caption(f"{measure} per {resolution}")
+            
+            summary_columns = ['num_vehicles', 'estimated_electricity_demand', 'calculations']
+            
+            # Distinct and top-N over a date range come from the mergeable per-day sketches
+            st.subheader("🔢 Reach by Date Range")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                reach_start = st.date_input("From", value=None, key="reach_start")
+            with col2:
+                reach_end = st.date_input("To", value=None, key="reach_end")
+            with col3:
+                reach_exact = st.checkbox("Exact (reads every row)", key="reach_exact")
+            usage = rollup.usage_summary(reach_start, reach_end, top=10, exact=reach_exact)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Calculations", f"{usage['rows']:,}")
+            with col2:
+                st.metric("Unique Postcodes", f"{usage['distinct_postcodes']:,}")
+                if not usage['exact']:
+                    st.caption(f"Estimate, standard error ±{usage['distinct_postcodes_error']:.1%}")
+            with col3:
+                st.dataframe(pd.DataFrame(usage['top_vehicle_types'], columns=['vehicle_type', 'calculations']),
+                             use_container_width=True, hide_index=True)
+            top_postcodes = pd.DataFrame(usage['top_postcodes'], columns=['postcode', 'calculations'])
+            st.dataframe(top_postcodes, use_container_width=True, hide_index=True)
+            if usage['top_postcodes_error']:
+                st.caption(f"Top postcode counts may be up to {usage['top_postcodes_error']:,} below the true count")
+            
+            # Demand analysis by postcode
+            if rollup.postcodes:
+                st.subheader("🗺️ Demand by Postcode")
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("Total Calculations", len(df))
+                    level = st.selectbox("Group by", ['postcode', 'sector', 'district', 'area'],
+                                         format_func=str.title, key="postcode_level")
                 with col2:
-                    st.metric("Total Vehicles", df['num_vehicles'].sum())
+                    prefix = st.text_input("Within (e.g. SW, SW1, SW1A 1)", key="postcode_prefix").strip()
                 with col3:
-                    st.metric("Unique Postcodes", df['postcode'].nunique())
+                    year = st.selectbox("Purchase year", ['All'] + PURCHASE_YEARS, key="postcode_year")
                 with col4:
-                    st.metric("Total Electricity Demand", f"{df['estimated_electricity_demand'].sum():,} kWh")
-                
-                st.subheader("📈 Recent Activity")
-                st.dataframe(df.tail(20), use_container_width=True)
-                
-                # Demand analysis by postcode
-                if 'postcode' in df.columns and not df['postcode'].isna().all():
-                    st.subheader("🗺️ Demand by Postcode")
-                    
-                    postcode_summary = df.groupby('postcode').agg({
-                        'num_vehicles': 'sum',
-                        'estimated_electricity_demand': 'sum',
-                        'timestamp': 'count'
-                    }).rename(columns={'timestamp': 'calculations'}).reset_index()
-                    
-                    postcode_summary = postcode_summary.sort_values('estimated_electricity_demand', ascending=False)
-                    st.dataframe(postcode_summary, use_container_width=True)
-                
-                # Vehicle type analysis
-                st.subheader("🚛 Vehicle Type Breakdown")
-                vehicle_summary = df.groupby('vehicle_type').agg({
-                    'num_vehicles': 'sum',
-                    'estimated_electricity_demand': 'sum',
-                    'timestamp': 'count'
-                }).rename(columns={'timestamp': 'calculations'}).reset_index()
-                
-                vehicle_summary = vehicle_summary.sort_values('num_vehicles', ascending=False)
-                st.dataframe(vehicle_summary, use_container_width=True)
-                
-                # Purchase year trends
-                if 'purchase_year' in df.columns:
-                    st.subheader("📅 Purchase Year Distribution")
-                    year_summary = df.groupby('purchase_year').agg({
-                        'num_vehicles': 'sum',
-                        'estimated_electricity_demand': 'sum'
-                    }).reset_index()
-                    
-                    st.bar_chart(year_summary.set_index('purchase_year')['num_vehicles'])
-                
-                # Download functionality
-                st.subheader("💾 Data Export")
-                
-                col1, col2 = st.columns(2)
+                    top = st.number_input("Top N (0 = all)", min_value=0, value=0, step=10, key="postcode_top")
+                postcode_summary = pd.DataFrame(
+                    rollup.postcode_level_summary(level, prefix or None, None if year == 'All' else year, top or None),
+                    columns=[level] + summary_columns)
+                st.dataframe(postcode_summary, use_container_width=True)
+            
+            # Vehicle type analysis
+            st.subheader("🚛 Vehicle Type Breakdown")
+            vehicle_summary = pd.DataFrame(rollup.vehicle_summary(), columns=['vehicle_type'] + summary_columns)
+            st.dataframe(vehicle_summary, use_container_width=True)
+            
+            # Purchase year trends
+            if rollup.purchase_years:
+                st.subheader("📅 Purchase Year Distribution")
+                year_summary = pd.DataFrame(rollup.year_summary(), columns=['purchase_year'] + summary_columns)
+                st.bar_chart(year_summary.set_index('purchase_year')['num_vehicles'])
+            
+            # Download functionality
+            st.subheader("💾 Data Export")
+            
+            col1, col2 = st.columns(2)
+            
+            from calculation_export import CalculationExport, summary_export
+            
+            with col1:
+                export_start = st.date_input("From", value=None, key="export_start")
+                export_end = st.date_input("To", value=None, key="export_end")
+                export_postcodes = st.text_input("Postcodes or prefixes (comma-separated, e.g. SW1, M1 1AE)",
+                                                 key="export_postcodes")
+                export_gzip = st.checkbox("Compress (gzip)", value=True, key="export_gzip")
                 
-                with col1:
-                    # Full data export
-                    csv = df.to_csv(index=False)
+                # The export streams from storage in batches, so the log is never loaded whole;
+                # st.download_button takes the finished file as bytes
+                if st.button("📦 Prepare Data Export", key="prepare_export"):
+                    export = CalculationExport(
+                        export_start, export_end,
+                        [code.strip() for code in export_postcodes.split(',') if code.strip()],
+                        'gzip' if export_gzip else None)
+                    export_file = io.BytesIO()
+                    with span('admin.export'):
+                        export.write_to(export_file)
+                    st.caption(f"{export.rows:,} rows ready")
                     st.download_button(
-                        label="📥 Download All Data (CSV)",
-                        data=csv,
-                        file_name=f'vehicle_calculations_{datetime.now().strftime("%Y%m%d")}.csv',
-                        mime='text/csv'
+                        label="📥 Download Data (CSV)",
+                        data=export_file.getvalue(),
+                        file_name=f'vehicle_calculations_{datetime.now().strftime("%Y%m%d")}{export.file_extension}',
+                        mime='application/gzip' if export_gzip else 'text/csv'
                     )
+            
+            with col2:
+                # Summary export comes from the aggregates, not the raw rows
+                summary_data = summary_export(rollup)
+                
+                st.download_button(
+                    label="📊 Download Summary (JSON)",
+                    data=json.dumps(summary_data, indent=2),
+                    file_name=f'summary_{datetime.now().strftime("%Y%m%d")}.json',
+                    mime='application/json'
+                )
                 
-                with col2:
-                    # Summary export
-                    summary_data = {
-                        'total_calculations': len(df),
-                        'total_vehicles': int(df['num_vehicles'].sum()),
-                        'total_electricity_demand_kwh': int(df['estimated_electricity_demand'].sum()),
-                        'unique_postcodes': int(df['postcode'].nunique()),
-                        'export_date': datetime.now().isoformat()
-                    }
-                    
-                    st.download_button(
-                        label="📊 Download Summary (JSON)",
-                        data=pd.Series(summary_data).to_json(indent=2),
-                        file_name=f'summary_{datetime.now().strftime("%Y%m%d")}.json',
-                        mime='application/json'
-                    )
-                    
-            else:
-                st.info("No calculation data available yet.")
         else:
             st.info("No calculation data available yet.")
-    except Exception as e:
+    except (OSError, ValueError) as e:
         st.error(f"Error loading data: {e}")
 
 
+def fleet_upload_section():
+    """Evaluate an uploaded fleet CSV in chunks, streaming progress and totals to the page"""
+    from fleet_upload import INPUT_COLUMNS, evaluate_fleet_file
+    
+    st.markdown("One row per vehicle with columns " + ", ".join(f"`{c}`" for c in INPUT_COLUMNS)
+                + ". Only `vehicle_type` is required; other columns default to the calculator's values.")
+    uploaded = st.file_uploader("Fleet file (CSV)", type=['csv'], key="fleet_file")
+    
+    if uploaded is not None and st.button("🚚 Evaluate Fleet", key="evaluate_fleet"):
+        progress_bar = st.progress(0.0, text="Evaluating fleet...")
+        running_totals = st.empty()
+        
+        def show_progress(summary, fraction):
+            progress_bar.progress(fraction or 0.0, text=f"{summary.rows:,} rows evaluated")
+            running_totals.caption(f"Running savings: {format_currency(summary.totals['savings'])} "
+                                   f"across {summary.totals['num_vehicles']:,.0f} vehicles")
+        
+        # Results are gzip-compressed as they are written rather than held as a frame;
+        # st.download_button takes the finished file as bytes
+        results_file = io.BytesIO()
+        try:
+            with gzip.GzipFile(fileobj=results_file, mode='wb', compresslevel=5) as compressed:
+                with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as output:
+                    summary = evaluate_fleet_file(uploaded, output, progress=show_progress)
+        except ScenarioError as e:
+            progress_bar.empty()
+            st.error(f"❌ Could not evaluate the fleet: {e}")
+            return
+        progress_bar.progress(1.0, text=f"{summary.rows:,} rows evaluated")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Vehicles", f"{summary.totals['num_vehicles']:,.0f}")
+        with col2:
+            st.metric("Electric Total", format_currency(summary.totals['electric_total']))
+        with col3:
+            st.metric("Diesel Total", format_currency(summary.totals['diesel_total']))
+        with col4:
+            st.metric("Savings", format_currency(summary.totals['savings']))
+        st.info(f"🌱 {summary.totals['co2_saved']:,.1f} tonnes CO₂ saved, "
+                f"{summary.totals['electricity_demand']:,.0f} kWh annual electricity demand")
+        if summary.invalid_rows:
+            st.warning(f"⚠️ {summary.invalid_rows:,} rows could not be evaluated; see the error column in the results")
+        st.dataframe(pd.DataFrame(summary.vehicle_type_rows()), use_container_width=True)
+        
+        st.download_button(
+            label="📥 Download Fleet Results (CSV, gzip)",
+            data=results_file.getvalue(),
+            file_name=f'fleet_results_{datetime.now().strftime("%Y%m%d")}.csv.gz',
+            mime='application/gzip'
+        )
+
+
 # Main Application
 def main():
+    configure_page()
+    
     # Check for admin access via URL parameter (hidden admin entry) - FIXED VERSION
     query_params = st.query_params
     if 'admin' in query_params and not check_admin_access():
@@ -439,6 +342,9 @@ def main():
         admin_panel()
         return
     
+    # One catalogue version for the whole run, even if the file is reloaded meanwhile
+    catalogue = get_catalogue()
+    
     # Regular user interface
     st.title("🚛 HGV/Van Electric versus Diesel Calculator")
     st.markdown("**Compare total cost of ownership and environmental impact for commercial vehicles**")
@@ -448,27 +354,19 @@ def main():
     
     with col1:
         # Vehicle type selection
-        vehicle_options = {
-            "Small Van (up to 2.5t GVW)": "van_small",
-            "Medium Van (2.5-3.5t GVW)": "van_medium", 
-            "Large Van (3.5-7.5t GVW)": "van_large",
-            "Rigid HGV 7.5-12t": "hgv_rigid_small",
-            "Rigid HGV 12-18t": "hgv_rigid_medium",
-            "Rigid HGV 18-26t": "hgv_rigid_large",
-            "Articulated HGV 26-32t": "hgv_artic_small",
-            "Articulated HGV 32-44t": "hgv_artic_large"
-        }
+        vehicle_options = {vehicle.get('label', vehicle['name']): key
+                           for key, vehicle in catalogue.vehicle_data.items()}
         
         selected_vehicle_name = st.selectbox("Vehicle Type", list(vehicle_options.keys()))
         vehicle_type = vehicle_options[selected_vehicle_name]
-        vehicle = VEHICLE_DATA[vehicle_type]
+        vehicle = catalogue.vehicle_data[vehicle_type]
         
         num_vehicles = st.number_input("Number of Vehicles", min_value=1, max_value=100, value=1)
         postcode = st.text_input("Postcode", placeholder="e.g. SW1A 1AA", max_chars=8)
         
     with col2:
         purchase_year = st.selectbox("Planned Purchase Year", 
-                                   options=list(range(2025, 2033)), 
+                                   options=PURCHASE_YEARS, 
                                    index=0)
         
         annual_mileage = st.number_input("Annual Mileage", 
@@ -478,33 +376,17 @@ def main():
                                        step=1000)
         
         operating_period = st.selectbox("Operating Period (Years)", 
-                                      options=[3, 5, 7, 10], 
+                                      options=OPERATING_PERIODS, 
                                       index=1)
     
     # Calculate button
     if st.button("🔄 Calculate Costs", type="primary"):
         if annual_mileage and vehicle_type:
-            # Price adjustments based on purchase year
-            years_from_now = purchase_year - 2025
-            
-            # Electric price reduction rates
-            electric_reduction = 0.08  # 8% base
-            if 'hgv_rigid' in vehicle_type:
-                electric_reduction = 0.12
-            elif 'hgv_artic' in vehicle_type:
-                electric_reduction = 0.15
-            
-            adjusted_electric_price = vehicle['electric_price'] * (1 - electric_reduction) ** years_from_now
-            adjusted_diesel_price = vehicle['diesel_price'] * (1.02 ** years_from_now)  # 2% increase
-            
-            # Calculate costs
-            electric_costs = calculate_electric_costs(vehicle, adjusted_electric_price, annual_mileage, operating_period)
-            diesel_costs = calculate_diesel_costs(vehicle, adjusted_diesel_price, annual_mileage, operating_period)
-            
-            # Scale for multiple vehicles
-            for cost_type in electric_costs:
-                electric_costs[cost_type] *= num_vehicles
-                diesel_costs[cost_type] *= num_vehicles
+            # Repeated scenarios come from the shared result cache
+            results = cached_scenario(vehicle_type, purchase_year, annual_mileage, operating_period, num_vehicles,
+                                      catalogue)
+            electric_costs = results['electric']
+            diesel_costs = results['diesel']
             
             # Display results
             st.header("💰 Cost Comparison Results")
@@ -528,7 +410,7 @@ def main():
                 st.metric("**Total Cost**", format_currency(diesel_costs['total']))
             
             # Savings calculation
-            savings = diesel_costs['total'] - electric_costs['total']
+            savings = results['savings']
             savings_percentage = (savings / diesel_costs['total'] * 100)
             
             if savings > 0:
@@ -537,28 +419,41 @@ def main():
                 st.warning(f"⚠️ Electric vehicles will cost {format_currency(abs(savings))} ({abs(savings_percentage):.1f}%) more over the operating period")
             
             # Environmental impact
-            co2_per_mile = 0.2 if 'van' in vehicle['name'].lower() else 0.5
-            total_mileage = annual_mileage * operating_period * num_vehicles
-            co2_saved = (total_mileage * co2_per_mile / 1000)  # Convert to tonnes
+            co2_saved = results['co2_saved']
             
             st.info(f"🌱 **Environmental Impact**: {co2_saved:.1f} tonnes CO₂ saved by choosing electric over diesel")
             
             # Vehicle testing info
-            st.info(f"🔧 **Vehicle Testing**: {vehicle['test_frequency']}")
+            if vehicle.get('test_frequency'):
+                st.info(f"🔧 **Vehicle Testing**: {vehicle['test_frequency']}")
             
             # Save data silently in background (users don't see this)
             if postcode:
-                save_calculation_data(vehicle_type, num_vehicles, postcode, purchase_year, annual_mileage)
+                save_calculation_data(vehicle_type, num_vehicles, postcode, purchase_year, annual_mileage, catalogue)
+    
+    # Bulk fleet evaluation
+    with st.expander("📂 Evaluate a Whole Fleet (CSV upload)"):
+        fleet_upload_section()
     
     # Assumptions section
     st.header("📋 Assumptions and Sources")
     if selected_vehicle_name:
-        vehicle = VEHICLE_DATA[vehicle_type]
-        for assumption in vehicle['assumptions']:
+        for assumption in vehicle.get('assumptions', []):
             st.write(f"• {assumption}")
     
     st.write("**Sources**: Road Haulage Association (RHA), Logistics UK, Carbon Trust, Science Based Targets initiative (SBTi), Department for Transport (DfT), Energy and Climate Intelligence Unit (ECIU), Society of Motor Manufacturers and Traders (SMMT)")
 
 
+def run_page():
+    """Run the page once, timed, and profiled when ?profile is set and profiling is enabled"""
+    start_metrics_server()
+    profile_requested = PROFILING_ENABLED and 'profile' in st.query_params
+    with profiled(profile_requested) as profile, span('page.run'):
+        main()
+    if profile is not None:
+        with st.expander("⏱️ Profile of this run"):
+            st.code(profile_report(profile))
+
+
 if __name__ == "__main__":
-    main()
+    run_page()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+HGV/Van Electric vs Diesel Calculator - vectorized cost engine
+NumPy versions of the calculator_core cost functions, evaluating arrays of
+scenarios in one pass with results that match the scalar functions
+bit-for-bit, and the precompiled cost table behind cached_scenario.
+"""
+
+import numpy as np
+
+from calculator_core import (
+    BASE_YEAR,
+    COST_FIELDS,
+    OPERATING_PERIODS,
+    PURCHASE_YEARS,
+    calculate_scenario,
+    get_catalogue,
+)
+from metrics import counter
+
+_batch_calculations = counter('calculations_total', mode='batch')
+
+
+def profile_indices(vehicle_keys, catalogue=None):
+    """Map an array of vehicle keys to rows of the catalogue's profile columns"""
+    profiles = (catalogue or get_catalogue()).profiles
+    keys = np.asarray(vehicle_keys)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    lookup = np.array([profiles[key].index for key in unique_keys.tolist()], dtype=np.intp)
+    return lookup[inverse.reshape(keys.shape)]
+
+
+def _batch_inputs(catalogue, vehicle_keys, purchase_prices, annual_mileages, years, rows=None):
+    """Broadcast batch inputs and gather per-row profile coefficients"""
+    # Resolve keys before broadcasting so a single vehicle type is looked up once
+    if rows is None:
+        rows = profile_indices(vehicle_keys, catalogue)
+    return np.broadcast_arrays(rows, np.asarray(purchase_prices), np.asarray(annual_mileages), np.asarray(years))
+
+
+def calculate_electric_costs_batch(vehicle_keys, purchase_prices, annual_mileages, years, catalogue=None,
+                                   rows=None):
+    """Vectorized calculate_electric_costs over arrays of scenarios, returning NumPy arrays
+
+    rows, if given, are the keys' profile_indices, so a caller that already
+    has them skips the lookup.
+    """
+    catalogue = catalogue or get_catalogue()
+    rows, purchase_prices, annual_mileages, years = _batch_inputs(
+        catalogue, vehicle_keys, purchase_prices, annual_mileages, years, rows)
+    col = catalogue.columns
+    total_mileage = annual_mileages * years
+
+    # Same operation order as the scalar function so results match bit-for-bit
+    energy_cost = total_mileage * col['kwh_per_mile'][rows] * col['energy_rate'][rows]
+    maintenance_cost = col['maintenance_rate'][rows] * total_mileage * col['maintenance_multiplier'][rows]
+    insurance_cost = col['annual_insurance'][rows] * years * col['insurance_multiplier'][rows]
+    net_purchase_price = purchase_prices - col['grant'][rows]
+
+    return {
+        'purchase': net_purchase_price,
+        'energy': energy_cost,
+        'maintenance': maintenance_cost,
+        'insurance': insurance_cost,
+        'total': net_purchase_price + energy_cost + maintenance_cost + insurance_cost
+    }
+
+
+def calculate_diesel_costs_batch(vehicle_keys, purchase_prices, annual_mileages, years, catalogue=None,
+                                 rows=None):
+    """Vectorized calculate_diesel_costs over arrays of scenarios, returning NumPy arrays; rows as above"""
+    catalogue = catalogue or get_catalogue()
+    rows, purchase_prices, annual_mileages, years = _batch_inputs(
+        catalogue, vehicle_keys, purchase_prices, annual_mileages, years, rows)
+    col = catalogue.columns
+    total_mileage = annual_mileages * years
+
+    fuel_cost = (total_mileage / col['diesel_efficiency'][rows]) * col['fuel_price'][rows] * 4.546  # Convert to litres
+    maintenance_cost = col['maintenance_rate'][rows] * total_mileage
+    insurance_cost = col['annual_insurance'][rows] * years
+
+    return {
+        'purchase': purchase_prices,
+        'energy': fuel_cost,
+        'maintenance': maintenance_cost,
+        'insurance': insurance_cost,
+        'total': purchase_prices + fuel_cost + maintenance_cost + insurance_cost
+    }
+
+
+def adjusted_purchase_prices_batch(vehicle_types, purchase_years, catalogue=None, rows=None):
+    """Vectorized adjusted_purchase_prices, returning (electric, diesel) arrays; rows as above"""
+    catalogue = catalogue or get_catalogue()
+    if rows is None:
+        rows = profile_indices(vehicle_types, catalogue)
+    col = catalogue.columns
+    years_from_now = np.asarray(purchase_years) - BASE_YEAR
+    electric_prices = col['electric_price'][rows] * (1 - col['price_decline'][rows]) ** years_from_now
+    diesel_prices = col['diesel_price'][rows] * ((1 + col['diesel_price_inflation'][rows]) ** years_from_now)
+    return electric_prices, diesel_prices
+
+
+def calculate_scenarios_batch(vehicle_types, purchase_years, annual_mileages, operating_periods, num_vehicles=1,
+                              catalogue=None):
+    """Vectorized calculate_scenario over arrays of scenarios
+
+    Returns NumPy arrays keyed 'electric_<cost>', 'diesel_<cost>', 'savings',
+    'co2_saved' and 'electricity_demand' (annual kWh, as calculate_electricity_demand).
+    """
+    catalogue = catalogue or get_catalogue()
+    vehicle_types, purchase_years, annual_mileages, operating_periods, num_vehicles = np.broadcast_arrays(
+        np.asarray(vehicle_types), np.asarray(purchase_years), np.asarray(annual_mileages),
+        np.asarray(operating_periods), np.asarray(num_vehicles))
+    _batch_calculations.inc(vehicle_types.size)
+    # Look the vehicle types up once and share the rows with every stage
+    rows = profile_indices(vehicle_types, catalogue)
+    electric_prices, diesel_prices = adjusted_purchase_prices_batch(vehicle_types, purchase_years, catalogue, rows)
+
+    electric = calculate_electric_costs_batch(vehicle_types, electric_prices, annual_mileages, operating_periods,
+                                              catalogue, rows)
+    diesel = calculate_diesel_costs_batch(vehicle_types, diesel_prices, annual_mileages, operating_periods,
+                                          catalogue, rows)
+
+    # Scale for multiple vehicles
+    results = {}
+    for cost_type in COST_FIELDS:
+        results[f'electric_{cost_type}'] = electric[cost_type] * num_vehicles
+        results[f'diesel_{cost_type}'] = diesel[cost_type] * num_vehicles
+
+    total_mileage = annual_mileages * operating_periods * num_vehicles
+    results['savings'] = results['diesel_total'] - results['electric_total']
+    results['co2_saved'] = total_mileage * catalogue.columns['co2_per_mile'][rows] / 1000  # Convert to tonnes
+    results['electricity_demand'] = np.round(
+        annual_mileages * catalogue.columns['kwh_per_mile'][rows] * num_vehicles).astype(np.int64)
+    return results
+
+
+class CostModelTable:
+    """Precompiled affine cost model for every vehicle, purchase year and operating period
+
+    For a fixed vehicle, purchase year and period every calculator output is
+    intercept + slope * annual_mileage per vehicle, so a query is a lookup
+    followed by a multiply-add and a scale by fleet size.
+    """
+
+    __slots__ = ('catalogue', 'intercept', 'slope', '_rows')
+
+    # Column layout of the last axis of intercept/slope
+    FIELDS = (tuple(f'electric_{f}' for f in COST_FIELDS)
+              + tuple(f'diesel_{f}' for f in COST_FIELDS)
+              + ('savings', 'co2_saved'))
+
+    def __init__(self, purchase_years=PURCHASE_YEARS, operating_periods=OPERATING_PERIODS, catalogue=None):
+        self.catalogue = catalogue = catalogue or get_catalogue()
+        keys, years, periods = np.meshgrid(
+            np.array(list(catalogue.profiles)), np.array(purchase_years), np.array(operating_periods),
+            indexing='ij')
+        rows = profile_indices(keys, catalogue)
+        col = catalogue.columns
+        electric_prices, diesel_prices = adjusted_purchase_prices_batch(keys, years, catalogue, rows)
+
+        # Evaluate the batch engine at zero and one mile to recover intercept and slope
+        # per cost component; totals and savings are then summed from the components
+        # so no large intercept is subtracted when deriving a slope
+        def evaluate(mileage):
+            electric = calculate_electric_costs_batch(keys, electric_prices, mileage, periods, catalogue, rows)
+            diesel = calculate_diesel_costs_batch(keys, diesel_prices, mileage, periods, catalogue, rows)
+            return [np.asarray(costs[f], dtype=float) for costs in (electric, diesel) for f in COST_FIELDS[:-1]]
+
+        def combine(components, co2):
+            electric, diesel = components[:4], components[4:]
+            electric_total = sum(electric)
+            diesel_total = sum(diesel)
+            fields = electric + [electric_total] + diesel + [diesel_total, diesel_total - electric_total, co2]
+            return np.stack(fields, axis=-1)
+
+        at_zero = evaluate(0)
+        at_one = evaluate(1)
+        self.intercept = combine(at_zero, np.zeros(keys.shape))
+        self.slope = combine([one - zero for one, zero in zip(at_one, at_zero)],
+                             periods * col['co2_per_mile'][rows] / 1000)
+
+        # Plain-float rows keyed by scenario so scalar queries skip NumPy overhead
+        intercepts = self.intercept.tolist()
+        slopes = self.slope.tolist()
+        self._rows = {}
+        for i, key in enumerate(catalogue.profiles):
+            for j, year in enumerate(purchase_years):
+                for k, period in enumerate(operating_periods):
+                    self._rows[key, year, period] = tuple(zip(intercepts[i][j][k], slopes[i][j][k]))
+
+    def query(self, vehicle_type, purchase_year, annual_mileage, operating_period, num_vehicles=1):
+        """Answer a calculator scenario from the table, matching calculate_scenario"""
+        row = self._rows.get((vehicle_type, purchase_year, operating_period))
+        if row is None:
+            # Off-grid scenarios fall back to the direct calculation
+            return calculate_scenario(vehicle_type, purchase_year, annual_mileage, operating_period, num_vehicles,
+                                      self.catalogue)
+        values = [(a + b * annual_mileage) * num_vehicles for a, b in row]
+        n = len(COST_FIELDS)
+        return {
+            'electric': dict(zip(COST_FIELDS, values[:n])),
+            'diesel': dict(zip(COST_FIELDS, values[n:2 * n])),
+            'savings': values[2 * n],
+            'co2_saved': values[2 * n + 1],
+        }
+
+
+def get_cost_table(catalogue=None):
+    """Return the cost table for the current catalogue, building it once per catalogue version"""
+    catalogue = catalogue or get_catalogue()
+    return catalogue.derived('cost_table', lambda: CostModelTable(catalogue=catalogue))
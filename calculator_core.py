@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+HGV/Van Electric vs Diesel Calculator - calculation core
+The cost formulas and scenario results shared by the Streamlit page, the
+JSON API and the batch tools. Importing this module has no side effects and
+needs only the standard library: the vehicle catalogue is read on first use,
+and the NumPy batch engine (calculator_batch) and the calculations log are
+imported only by the functions that need them.
+"""
+
+import logging
+import math
+from datetime import datetime
+
+from catalogue import VehicleProfile, get_catalogue
+from metrics import counter, span
+from scenario_cache import get_scenario_cache
+
+logger = logging.getLogger(__name__)
+
+# Purchase years and operating periods offered by the calculator
+BASE_YEAR = 2025
+PURCHASE_YEARS = list(range(BASE_YEAR, 2033))
+OPERATING_PERIODS = [3, 5, 7, 10]
+
+COST_FIELDS = ('purchase', 'energy', 'maintenance', 'insurance', 'total')
+
+# Mileage and fleet-size ranges accepted from the API and batch input files
+MIN_MILEAGE = 1000
+MAX_MILEAGE = 200000
+MAX_NUM_VEHICLES = 100000
+
+_single_calculations = counter('calculations_total', mode='single')
+
+
+def get_vehicle_profile(vehicle, catalogue=None):
+    """Return the compiled profile for a vehicle key, catalogue entry or profile"""
+    if isinstance(vehicle, VehicleProfile):
+        return vehicle
+    catalogue = catalogue or get_catalogue()
+    if isinstance(vehicle, str):
+        return catalogue.profiles[vehicle]
+    return catalogue.profiles_by_name[vehicle['name']]
+
+
+def format_currency(amount):
+    """Format currency with UK formatting"""
+    return f"£{amount:,.0f}"
+
+
+def calculate_electric_costs(vehicle, purchase_price, annual_mileage, years):
+    """Calculate electric vehicle costs"""
+    profile = get_vehicle_profile(vehicle)
+    total_mileage = annual_mileage * years
+
+    # Calculate energy cost
+    energy_cost = total_mileage * profile.kwh_per_mile * profile.energy_rate
+
+    # Calculate other costs
+    maintenance_cost = profile.maintenance_rate * total_mileage * profile.maintenance_multiplier
+    insurance_cost = profile.annual_insurance * years * profile.insurance_multiplier
+
+    net_purchase_price = purchase_price - profile.grant
+
+    return {
+        'purchase': net_purchase_price,
+        'energy': energy_cost,
+        'maintenance': maintenance_cost,
+        'insurance': insurance_cost,
+        'total': net_purchase_price + energy_cost + maintenance_cost + insurance_cost
+    }
+
+
+def calculate_diesel_costs(vehicle, purchase_price, annual_mileage, years):
+    """Calculate diesel vehicle costs"""
+    profile = get_vehicle_profile(vehicle)
+    total_mileage = annual_mileage * years
+
+    # Fuel cost calculation
+    fuel_cost = (total_mileage / profile.diesel_efficiency) * profile.fuel_price * 4.546  # Convert to litres
+
+    # Maintenance cost
+    maintenance_cost = profile.maintenance_rate * total_mileage
+
+    # Insurance cost
+    insurance_cost = profile.annual_insurance * years
+
+    return {
+        'purchase': purchase_price,
+        'energy': fuel_cost,
+        'maintenance': maintenance_cost,
+        'insurance': insurance_cost,
+        'total': purchase_price + fuel_cost + maintenance_cost + insurance_cost
+    }
+
+
+def calculate_electricity_demand(vehicle_key, annual_mileage, num_vehicles, catalogue=None):
+    """Calculate annual electricity demand in kWh"""
+    profile = get_vehicle_profile(vehicle_key, catalogue)
+
+    annual_kwh = annual_mileage * profile.kwh_per_mile * num_vehicles
+    return round(annual_kwh)
+
+
+def adjusted_purchase_prices(vehicle_type, purchase_year, catalogue=None):
+    """Return (electric, diesel) purchase prices adjusted for the purchase year"""
+    profile = get_vehicle_profile(vehicle_type, catalogue)
+    years_from_now = purchase_year - BASE_YEAR
+    electric_price = profile.electric_price * (1 - profile.price_decline) ** years_from_now
+    diesel_price = profile.diesel_price * ((1 + profile.diesel_price_inflation) ** years_from_now)
+    return electric_price, diesel_price
+
+
+def calculate_scenario(vehicle_type, purchase_year, annual_mileage, operating_period, num_vehicles=1,
+                       catalogue=None):
+    """Calculate fleet costs, savings and CO2 for one calculator scenario"""
+    profile = get_vehicle_profile(vehicle_type, catalogue)
+    electric_price, diesel_price = adjusted_purchase_prices(profile, purchase_year)
+
+    electric_costs = calculate_electric_costs(profile, electric_price, annual_mileage, operating_period)
+    diesel_costs = calculate_diesel_costs(profile, diesel_price, annual_mileage, operating_period)
+
+    # Scale for multiple vehicles
+    for cost_type in electric_costs:
+        electric_costs[cost_type] *= num_vehicles
+        diesel_costs[cost_type] *= num_vehicles
+
+    total_mileage = annual_mileage * operating_period * num_vehicles
+    return {
+        'electric': electric_costs,
+        'diesel': diesel_costs,
+        'savings': diesel_costs['total'] - electric_costs['total'],
+        'co2_saved': total_mileage * profile.co2_per_mile / 1000,  # Convert to tonnes
+    }
+
+
+class ScenarioError(ValueError):
+    """Raised for an invalid scenario in a request body or input file"""
+
+
+def parse_scenario(data, catalogue):
+    """Validate one scenario and fill in the calculator defaults"""
+    if not isinstance(data, dict):
+        raise ScenarioError("scenario must be a JSON object")
+
+    vehicle_data = catalogue.vehicle_data
+    vehicle_type = data.get('vehicle_type')
+    if not isinstance(vehicle_type, str) or vehicle_type not in vehicle_data:
+        raise ScenarioError(f"vehicle_type must be one of {', '.join(vehicle_data)}")
+
+    def integer(name, default):
+        value = data.get(name, default)
+        # NaN and infinity (which JSON and CSV parsing both admit) have no integer value
+        if (isinstance(value, bool) or not isinstance(value, (int, float))
+                or isinstance(value, float) and not (math.isfinite(value) and value.is_integer())):
+            raise ScenarioError(f"{name} must be an integer")
+        return int(value)
+
+    scenario = {
+        'vehicle_type': vehicle_type,
+        'purchase_year': integer('purchase_year', PURCHASE_YEARS[0]),
+        'annual_mileage': integer('annual_mileage', vehicle_data[vehicle_type]['default_mileage']),
+        'operating_period': integer('operating_period', 5),
+        'num_vehicles': integer('num_vehicles', 1),
+        'postcode': data.get('postcode') or None,
+    }
+    if scenario['purchase_year'] not in PURCHASE_YEARS:
+        raise ScenarioError(f"purchase_year must be between {PURCHASE_YEARS[0]} and {PURCHASE_YEARS[-1]}")
+    if scenario['operating_period'] not in OPERATING_PERIODS:
+        raise ScenarioError(f"operating_period must be one of {', '.join(map(str, OPERATING_PERIODS))}")
+    if not MIN_MILEAGE <= scenario['annual_mileage'] <= MAX_MILEAGE:
+        raise ScenarioError(f"annual_mileage must be between {MIN_MILEAGE} and {MAX_MILEAGE}")
+    if not 1 <= scenario['num_vehicles'] <= MAX_NUM_VEHICLES:
+        raise ScenarioError(f"num_vehicles must be between 1 and {MAX_NUM_VEHICLES}")
+    if scenario['postcode'] is not None and not isinstance(scenario['postcode'], str):
+        raise ScenarioError("postcode must be a string")
+    return scenario
+
+
+def format_result(electric, diesel, savings, co2_saved, electricity_demand):
+    """Shape one scenario's results the way the Streamlit page presents them"""
+    return {
+        'electric': electric,
+        'diesel': diesel,
+        'savings': savings,
+        'savings_percentage': savings / diesel['total'] * 100,
+        'co2_saved_tonnes': co2_saved,
+        'electricity_demand_kwh': electricity_demand,
+    }
+
+
+def cached_scenario(vehicle_type, purchase_year, annual_mileage, operating_period, num_vehicles=1, catalogue=None):
+    """Results for a scenario from the process-wide result cache; shared, so treat as read-only"""
+    from calculator_batch import get_cost_table
+
+    _single_calculations.inc()
+    catalogue = catalogue or get_catalogue()
+    vehicle_key = get_vehicle_profile(vehicle_type, catalogue).key
+    key = (vehicle_key, int(purchase_year), float(annual_mileage), int(operating_period), int(num_vehicles))
+
+    # Only misses are timed; hits are counted by the cache and cost next to nothing
+    def compute():
+        with span('calculate'):
+            return get_cost_table(catalogue).query(vehicle_key, purchase_year, annual_mileage, operating_period,
+                                                   num_vehicles)
+
+    return get_scenario_cache().get_or_compute(catalogue.fingerprint, key, compute)
+
+
+def save_calculation_data(vehicle_type, num_vehicles, postcode, purchase_year, annual_mileage, catalogue=None):
+    """Queue calculation data for the CSV log (silent - no user notification)"""
+    from calculation_log import get_calculation_writer
+
+    try:
+        calculation_record = {
+            'timestamp': datetime.now().isoformat(),
+            'vehicle_type': vehicle_type,
+            'num_vehicles': num_vehicles,
+            'postcode': postcode.upper(),
+            'purchase_year': purchase_year,
+            'annual_mileage': annual_mileage,
+            'estimated_electricity_demand': calculate_electricity_demand(vehicle_type, annual_mileage, num_vehicles,
+                                                                         catalogue)
+        }
+    except Exception:
+        logger.exception("Could not build calculation record")  # Logged, never shown to users
+        return
+
+    # Written in the background; failures are counted by the writer
+    get_calculation_writer().submit(calculation_record)
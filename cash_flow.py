@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Year-by-year cash-flow model for electric vs diesel ownership
+Year 0 carries the purchase (electric net of grant); years 1..N carry the
+energy, maintenance and insurance costs from the calculator's cost functions.
+With constant inputs and no discounting the streams sum to the calculator's
+lump-sum totals.
+
+Flows are dated as they are discounted, at the end of each period: the
+purchase is paid at time 0 and labelled purchase_year, and operating year
+t's costs are paid at its end, t years later, and labelled purchase_year + t.
+So a vehicle bought in 2025 has its first operating year labelled 2026, and
+break-even years use the same labels.
+
+Each year's costs depend only on that year's inputs, so changing one year
+recomputes that year's flows and the cumulative sums from that year onward;
+extending the horizon only computes the new years.
+"""
+
+from calculator_core import (
+    OPERATING_PERIODS,
+    PURCHASE_YEARS,
+    adjusted_purchase_prices,
+    calculate_diesel_costs,
+    calculate_electric_costs,
+    get_catalogue,
+    get_vehicle_profile,
+)
+
+
+class CashFlowSchedule:
+    """Annual electric and diesel cash flows for one scenario, with NPV and break-even"""
+
+    def __init__(self, vehicle_type, purchase_year, years, annual_mileage=None, num_vehicles=1,
+                 discount_rate=0.0):
+        catalogue = get_catalogue()
+        self.vehicle_type = vehicle_type
+        self.profile = get_vehicle_profile(vehicle_type, catalogue)
+        self.purchase_year = purchase_year
+        self.num_vehicles = num_vehicles
+        self.discount_rate = discount_rate
+        self.default_inputs = {
+            'annual_mileage': annual_mileage or catalogue.vehicle_data[vehicle_type]['default_mileage'],
+            'energy_price': self.profile.energy_rate,  # £/kWh
+            'fuel_price': self.profile.fuel_price,  # £/litre diesel
+        }
+
+        # Index 0 is the purchase; index t is operating year t
+        electric_price, diesel_price = adjusted_purchase_prices(self.profile, purchase_year)
+        self.inputs = [None]
+        self.electric = [calculate_electric_costs(self.profile, electric_price, 0, 0)['purchase'] * num_vehicles]
+        self.diesel = [calculate_diesel_costs(self.profile, diesel_price, 0, 0)['purchase'] * num_vehicles]
+
+        # Running sums of savings (diesel minus electric), valid below self._valid
+        self._cumulative = []
+        self._discounted = []
+        self._valid = 0
+        self.extend(years)
+
+    @property
+    def years(self):
+        return len(self.electric) - 1
+
+    def _annual_flows(self, inputs):
+        profile = self.profile
+        mileage = inputs['annual_mileage']
+        electric = calculate_electric_costs(profile, 0, mileage, 1)
+        diesel = calculate_diesel_costs(profile, 0, mileage, 1)
+        # Energy costs are linear in the tariff, so rescale from the profile's point rates
+        electric_total = (electric['energy'] * (inputs['energy_price'] / profile.energy_rate)
+                          + electric['maintenance'] + electric['insurance'])
+        diesel_total = (diesel['energy'] * (inputs['fuel_price'] / profile.fuel_price)
+                        + diesel['maintenance'] + diesel['insurance'])
+        return electric_total * self.num_vehicles, diesel_total * self.num_vehicles
+
+    def extend(self, years):
+        """Extend the horizon to years, computing flows for the new years only"""
+        while self.years < years:
+            inputs = dict(self.inputs[-1] or self.default_inputs)
+            electric, diesel = self._annual_flows(inputs)
+            self.inputs.append(inputs)
+            self.electric.append(electric)
+            self.diesel.append(diesel)
+
+    def update_year(self, year, **inputs):
+        """Change annual_mileage, energy_price or fuel_price for one operating year (1-based)"""
+        if not 1 <= year <= self.years:
+            raise IndexError(f"year must be between 1 and {self.years}")
+        unknown = set(inputs) - set(self.default_inputs)
+        if unknown:
+            raise ValueError(f"Unknown cash-flow inputs: {', '.join(sorted(unknown))}")
+        self.inputs[year].update(inputs)
+        self.electric[year], self.diesel[year] = self._annual_flows(self.inputs[year])
+        self._valid = min(self._valid, year)
+
+    def set_discount_rate(self, discount_rate):
+        if discount_rate != self.discount_rate:
+            self.discount_rate = discount_rate
+            self._valid = 0
+
+    def _refresh(self):
+        """Recompute running sums from the first stale year to the end of the horizon"""
+        n = len(self.electric)
+        del self._cumulative[self._valid:]
+        del self._discounted[self._valid:]
+        cumulative = self._cumulative[-1] if self._cumulative else 0.0
+        discounted = self._discounted[-1] if self._discounted else 0.0
+        for t in range(self._valid, n):
+            savings = self.diesel[t] - self.electric[t]
+            cumulative += savings
+            discounted += savings / (1 + self.discount_rate) ** t
+            self._cumulative.append(cumulative)
+            self._discounted.append(discounted)
+        self._valid = n
+
+    def cumulative_savings(self, discounted=False):
+        """Running savings at the end of each year, starting with the purchase year"""
+        self._refresh()
+        return list(self._discounted if discounted else self._cumulative)
+
+    def npv(self, horizon=None):
+        """Net present value of savings over the first horizon operating years"""
+        self._refresh()
+        horizon = self.years if horizon is None else horizon
+        return self._discounted[horizon]
+
+    def break_even_year(self, discounted=True, horizon=None):
+        """First calendar year whose running savings are non-negative, or None"""
+        self._refresh()
+        horizon = self.years if horizon is None else horizon
+        sums = self._discounted if discounted else self._cumulative
+        for t in range(horizon + 1):
+            if sums[t] >= 0:
+                return self.purchase_year + t
+        return None
+
+    def annual_rows(self):
+        """One dict per year for display or export; operating_year 0 is the purchase"""
+        self._refresh()
+        return [
+            {
+                'year': self.purchase_year + t,
+                'operating_year': t,
+                'electric': self.electric[t],
+                'diesel': self.diesel[t],
+                'savings': self.diesel[t] - self.electric[t],
+                'cumulative_savings': self._cumulative[t],
+                'discounted_cumulative_savings': self._discounted[t],
+            }
+            for t in range(len(self.electric))
+        ]
+
+
+def sweep_cash_flows(vehicle_type, annual_mileage=None, num_vehicles=1, discount_rate=0.0,
+                     purchase_years=PURCHASE_YEARS, operating_periods=OPERATING_PERIODS):
+    """NPV and break-even year for every purchase year and operating period
+
+    One schedule per purchase year is built to the longest period; shorter
+    periods are read off its running sums.
+    """
+    results = []
+    longest = max(operating_periods)
+    for purchase_year in purchase_years:
+        schedule = CashFlowSchedule(vehicle_type, purchase_year, longest, annual_mileage, num_vehicles,
+                                    discount_rate)
+        for period in operating_periods:
+            results.append({
+                'purchase_year': purchase_year,
+                'operating_period': period,
+                'npv': schedule.npv(period),
+                'break_even_year': schedule.break_even_year(horizon=period),
+            })
+    return results
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Vehicle and tariff catalogue
+Vehicle prices, efficiencies and grants, and the per-class tariffs,
+maintenance, insurance and CO2 factors, are read from a versioned JSON file
+(vehicle_catalogue.json by default, or the VEHICLE_CATALOGUE environment
+variable), validated and compiled into profile records and column arrays.
+
+get_catalogue() checks the file's mtime and size at most every
+CATALOGUE_CHECK_INTERVAL seconds. A changed file is hashed, and if its
+content differs it is loaded and compiled in full before a single reference
+swap makes it current. Callers take one catalogue per request and use it
+throughout, so a request never mixes two versions. A file that fails
+validation (a missing or non-finite number, or a fraction such as
+price_decline outside 0 to 1) is logged and the current catalogue stays in
+use.
+
+Loading needs only the standard library; the NumPy column arrays used by the
+batch engine are built on first use.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_FILE = os.environ.get(
+    'VEHICLE_CATALOGUE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vehicle_catalogue.json'))
+CATALOGUE_FORMAT = 1
+CATALOGUE_CHECK_INTERVAL = float(os.environ.get('CATALOGUE_CHECK_INTERVAL', 2.0))
+
+EFFICIENCY_UNITS = ('kWh/mile', 'miles/kWh')
+CLASS_FIELDS = ('energy_rate', 'fuel_price', 'maintenance_rate', 'maintenance_multiplier', 'annual_insurance',
+                'insurance_multiplier', 'price_decline', 'co2_per_mile')
+# Fields that are fractions (rates or shares), so must lie between 0 and 1
+FRACTION_FIELDS = ('diesel_price_inflation', 'maintenance_multiplier', 'price_decline')
+VEHICLE_FIELDS = ('electric_price', 'diesel_price', 'grant', 'electric_efficiency', 'diesel_efficiency',
+                  'default_mileage')
+
+
+class CatalogueError(ValueError):
+    """Raised for a catalogue file that cannot be used"""
+
+
+class VehicleProfile:
+    """Precomputed cost coefficients for one vehicle type"""
+
+    __slots__ = (
+        'key', 'index', 'electric_price', 'diesel_price', 'grant', 'kwh_per_mile',
+        'diesel_efficiency', 'energy_rate', 'fuel_price', 'maintenance_rate',
+        'maintenance_multiplier', 'annual_insurance', 'insurance_multiplier',
+        'price_decline', 'co2_per_mile', 'diesel_price_inflation',
+    )
+
+    def __init__(self, key, index, vehicle, vehicle_class, diesel_price_inflation):
+        self.key = key
+        self.index = index
+        self.electric_price = vehicle['electric_price']
+        self.diesel_price = vehicle['diesel_price']
+        self.grant = vehicle['grant']
+        self.diesel_efficiency = vehicle['diesel_efficiency']
+
+        # Normalize electric efficiency to kWh/mile
+        unit = vehicle_class['efficiency_unit']
+        if unit == 'kWh/mile':
+            self.kwh_per_mile = vehicle['electric_efficiency']
+        elif unit == 'miles/kWh':
+            self.kwh_per_mile = 1 / vehicle['electric_efficiency']
+        else:
+            raise ValueError(f"Unknown efficiency unit for {key}: {unit}")
+
+        self.energy_rate = vehicle_class['energy_rate']
+        self.fuel_price = vehicle_class['fuel_price']
+        self.maintenance_rate = vehicle_class['maintenance_rate']
+        self.maintenance_multiplier = vehicle_class['maintenance_multiplier']
+        self.annual_insurance = vehicle_class['annual_insurance']
+        self.insurance_multiplier = vehicle_class['insurance_multiplier']
+        self.price_decline = vehicle_class['price_decline']
+        self.co2_per_mile = vehicle_class['co2_per_mile']
+        self.diesel_price_inflation = diesel_price_inflation
+
+
+def compile_vehicle_profiles(vehicle_data, vehicle_classes, diesel_price_inflation):
+    """Compile vehicle data into profile records keyed by vehicle"""
+    profiles = {}
+    for index, (key, vehicle) in enumerate(vehicle_data.items()):
+        vehicle_class = vehicle_classes[vehicle['vehicle_class']]
+        profiles[key] = VehicleProfile(key, index, vehicle, vehicle_class, diesel_price_inflation)
+    return profiles
+
+
+def compile_profile_columns(profiles):
+    """Column arrays of profile fields, indexed by VehicleProfile.index, for batch lookups"""
+    import numpy as np
+
+    return {
+        field: np.array([getattr(profile, field) for profile in profiles.values()])
+        for field in VehicleProfile.__slots__ if field not in ('key', 'index')
+    }
+
+
+def _check_number(value, where, positive=False, fraction=False):
+    # JSON allows NaN and Infinity, which would poison every result computed from them
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise CatalogueError(f"{where} must be a finite number")
+    if value < 0 or (positive and value == 0):
+        raise CatalogueError(f"{where} must be {'positive' if positive else 'zero or more'}")
+    if fraction and value > 1:
+        raise CatalogueError(f"{where} must be between 0 and 1")
+
+
+def validate_catalogue(data):
+    """Raise CatalogueError unless data is a well-formed catalogue document"""
+    if not isinstance(data, dict):
+        raise CatalogueError("catalogue must be a JSON object")
+    if data.get('format') != CATALOGUE_FORMAT:
+        raise CatalogueError(f"unsupported catalogue format {data.get('format')!r} (expected {CATALOGUE_FORMAT})")
+    if not isinstance(data.get('version'), str) or not data['version']:
+        raise CatalogueError("version must be a non-empty string")
+    _check_number(data.get('diesel_price_inflation'), "diesel_price_inflation", fraction=True)
+
+    classes = data.get('vehicle_classes')
+    if not isinstance(classes, dict) or not classes:
+        raise CatalogueError("vehicle_classes must be a non-empty object")
+    for name, vehicle_class in classes.items():
+        if not isinstance(vehicle_class, dict):
+            raise CatalogueError(f"vehicle class {name} must be an object")
+        if vehicle_class.get('efficiency_unit') not in EFFICIENCY_UNITS:
+            raise CatalogueError(f"vehicle class {name}: efficiency_unit must be one of {', '.join(EFFICIENCY_UNITS)}")
+        for field in CLASS_FIELDS:
+            _check_number(vehicle_class.get(field), f"vehicle class {name}: {field}",
+                          fraction=field in FRACTION_FIELDS)
+        if 'charger_kw' in vehicle_class:
+            _check_number(vehicle_class['charger_kw'], f"vehicle class {name}: charger_kw", positive=True)
+
+    vehicles = data.get('vehicles')
+    if not isinstance(vehicles, dict) or not vehicles:
+        raise CatalogueError("vehicles must be a non-empty object")
+    names = set()
+    for key, vehicle in vehicles.items():
+        if not isinstance(vehicle, dict):
+            raise CatalogueError(f"vehicle {key} must be an object")
+        if not isinstance(vehicle.get('name'), str) or not vehicle['name']:
+            raise CatalogueError(f"vehicle {key}: name must be a non-empty string")
+        if vehicle['name'] in names:
+            raise CatalogueError(f"vehicle {key}: duplicate name {vehicle['name']!r}")
+        names.add(vehicle['name'])
+        if vehicle.get('vehicle_class') not in classes:
+            raise CatalogueError(f"vehicle {key}: unknown vehicle_class {vehicle.get('vehicle_class')!r}")
+        for field in VEHICLE_FIELDS:
+            _check_number(vehicle.get(field), f"vehicle {key}: {field}",
+                          positive=field in ('electric_efficiency', 'diesel_efficiency', 'default_mileage'))
+        for field in ('label', 'test_frequency'):
+            if not isinstance(vehicle.get(field, ''), str):
+                raise CatalogueError(f"vehicle {key}: {field} must be a string")
+        assumptions = vehicle.get('assumptions', [])
+        if not isinstance(assumptions, list) or not all(isinstance(item, str) for item in assumptions):
+            raise CatalogueError(f"vehicle {key}: assumptions must be a list of strings")
+
+
+class Catalogue:
+    """One validated, compiled version of the catalogue; treat as read-only"""
+
+    def __init__(self, data, fingerprint):
+        validate_catalogue(data)
+        self._data = data
+        self.version = data['version']
+        self.fingerprint = fingerprint
+        self.diesel_price_inflation = data['diesel_price_inflation']
+        self.vehicle_classes = data['vehicle_classes']
+        self.vehicle_data = data['vehicles']
+        self.profiles = compile_vehicle_profiles(self.vehicle_data, self.vehicle_classes, self.diesel_price_inflation)
+        self.profiles_by_name = {self.vehicle_data[key]['name']: profile for key, profile in self.profiles.items()}
+        # Vehicle types may be given as keys or as display names
+        self.vehicle_lookup = {**{key: key for key in self.vehicle_data},
+                               **{vehicle['name']: key for key, vehicle in self.vehicle_data.items()}}
+        self._derived = {}
+        self._derived_lock = threading.RLock()  # A derived value may be built from another
+
+    def __reduce__(self):
+        # Pickled as its source document, so worker processes rebuild the same version
+        return type(self), (self._data, self.fingerprint)
+
+    @property
+    def columns(self):
+        return self.derived('columns', lambda: compile_profile_columns(self.profiles))
+
+    @classmethod
+    def from_bytes(cls, content):
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            raise CatalogueError(f"catalogue is not valid JSON: {e}") from None
+        return cls(data, hashlib.sha256(content).hexdigest())
+
+    def derived(self, name, build):
+        """Build once and return a value computed from this catalogue, such as the cost table"""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = build()
+            return self._derived[name]
+
+
+def load_catalogue(path=CATALOGUE_FILE):
+    """Read, validate and compile a catalogue file"""
+    with open(path, 'rb') as file:
+        return Catalogue.from_bytes(file.read())
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+_file_state = None
+_checked_at = 0.0
+
+
+def get_catalogue():
+    """Return the current catalogue, reloading the file if it has changed"""
+    global _catalogue, _file_state, _checked_at
+    if _catalogue is not None and time.monotonic() - _checked_at < CATALOGUE_CHECK_INTERVAL:
+        return _catalogue
+
+    with _catalogue_lock:
+        if _catalogue is not None and time.monotonic() - _checked_at < CATALOGUE_CHECK_INTERVAL:
+            return _catalogue
+        state = None
+        try:
+            stat = os.stat(CATALOGUE_FILE)
+            state = (stat.st_mtime_ns, stat.st_size)
+            if state != _file_state:
+                with open(CATALOGUE_FILE, 'rb') as file:
+                    content = file.read()
+                # Touching the file without changing it keeps the compiled catalogue
+                if _catalogue is None or hashlib.sha256(content).hexdigest() != _catalogue.fingerprint:
+                    catalogue = Catalogue.from_bytes(content)
+                    if _catalogue is not None:
+                        logger.info("Loaded vehicle catalogue version %s", catalogue.version)
+                    _catalogue = catalogue
+                _file_state = state
+        except (OSError, CatalogueError):
+            if _catalogue is None:
+                raise
+            logger.exception("Keeping vehicle catalogue version %s; could not load %s",
+                             _catalogue.version, CATALOGUE_FILE)
+            if state is not None:
+                _file_state = state  # Report a bad file once, not on every check
+        _checked_at = time.monotonic()
+        return _catalogue
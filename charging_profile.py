@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Half-hourly depot charging load profiles
+Turns a fleet (postcode, vehicle type, annual mileage, number of vehicles)
+and a duty cycle into a year of half-hourly charging load per postcode, and
+reports peak kW, load factor and the grid connection each depot needs.
+
+Every operating day looks the same, so each vehicle group is simulated over
+one two-day span of 96 half-hours: charging that starts in the evening runs
+on past midnight into the next day. A year is then the sum of that span laid
+over each operating day, giving 17,520 intervals. Groups are processed in
+bounded chunks and summed per postcode, and peaks come from the (at most
+four) distinct kinds of day, so the full time series is only built when asked
+for.
+
+Charger power comes from the vehicle class's charger_kw in the catalogue,
+else CHARGER_POWER_KW for the built-in classes, else DEFAULT_CHARGER_KW.
+
+Strategies:
+    unmanaged  each vehicle charges at full charger power from when it arrives
+    smart      each vehicle charges at a flat rate from arrival to the end of
+               the window, just fast enough to finish
+"""
+
+import argparse
+import math
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from calculator_batch import profile_indices
+from calculator_core import BASE_YEAR, get_catalogue
+from postcode_index import normalize_postcode
+
+INTERVAL_HOURS = 0.5
+INTERVALS_PER_DAY = 48
+DAYS_PER_YEAR = 365
+INTERVALS_PER_YEAR = INTERVALS_PER_DAY * DAYS_PER_YEAR
+SPAN = 2 * INTERVALS_PER_DAY
+STRATEGIES = ('unmanaged', 'smart')
+
+CHARGER_POWER_KW = {'van': 7.4, 'large_van': 11.0, 'hgv_rigid': 50.0, 'hgv_artic': 100.0}
+DEFAULT_CHARGER_KW = 7.4  # A single-phase AC wallbox, for classes added to the catalogue without a charger_kw
+CHARGING_EFFICIENCY = 0.9  # Grid kWh delivered to the battery
+POWER_FACTOR = 0.95
+CONNECTION_HEADROOM = 0.2
+STANDARD_CONNECTIONS_KVA = (15, 25, 50, 69, 100, 138, 200, 276, 315, 500, 800, 1000, 1500, 2000, 3000, 5000)
+CHUNK_CELLS = 2000000  # Bounds each chunk's vehicle x arrival x interval working array
+
+
+class DutyCycle:
+    """Which days vehicles run and when they are plugged in at the depot
+
+    Hours are local clock times rounded to the half hour. A window whose end
+    is not after its start runs past midnight. Arrivals are spread evenly
+    over arrival_spread hours from the start of the window.
+    """
+
+    def __init__(self, operating_days=(0, 1, 2, 3, 4), window_start=18.0, window_end=6.0, arrival_spread=2.0,
+                 year=BASE_YEAR):
+        if not operating_days or not set(operating_days) <= set(range(7)):
+            raise ValueError("operating_days must be weekday numbers 0 (Monday) to 6 (Sunday)")
+        if not (0 <= window_start < 24 and 0 <= window_end < 24):
+            raise ValueError("Charging window hours must lie between 0 and 24")
+        self.operating_days = tuple(sorted(set(operating_days)))
+        self.start = round(window_start / INTERVAL_HOURS)
+        self.end = round(window_end / INTERVAL_HOURS)
+        if self.end <= self.start:
+            self.end += INTERVALS_PER_DAY
+        self.arrivals = min(max(1, round(arrival_spread / INTERVAL_HOURS)), self.end - self.start)
+        self.year = year
+
+    def calendar(self):
+        """(operating, previous_day_operating) flags for each day of the year"""
+        first = date(self.year, 1, 1)
+        weekdays = np.array([(first + timedelta(days=d)).weekday() for d in range(DAYS_PER_YEAR)])
+        operating = np.isin(weekdays, self.operating_days).astype(float)
+        # The night of 31 December runs into 1 January, as in a steady-state year
+        return operating, np.roll(operating, 1)
+
+
+def _vehicle_day_profiles(daily_kwh, charger_kw, duty_cycle, strategy):
+    """Average charging kW per vehicle over the 96-interval span, and unmet kWh per vehicle-day"""
+    slots = np.arange(SPAN)
+    arrival = duty_cycle.start + np.arange(duty_cycle.arrivals)
+    elapsed = slots[None, :] - arrival[:, None]  # (arrivals, SPAN)
+    plugged_in = (elapsed >= 0) & (slots[None, :] < duty_cycle.end)
+
+    energy = daily_kwh[:, None, None]
+    power = charger_kw[:, None, None]
+    if strategy == 'unmanaged':
+        delivered = np.clip(energy - power * INTERVAL_HOURS * elapsed, 0.0, power * INTERVAL_HOURS)
+    else:
+        hours = (duty_cycle.end - arrival) * INTERVAL_HOURS
+        delivered = np.broadcast_to(np.minimum(power, energy / hours[None, :, None]) * INTERVAL_HOURS,
+                                    (len(daily_kwh), len(arrival), SPAN))
+    delivered = np.where(plugged_in, delivered, 0.0).mean(axis=1)
+    return delivered / INTERVAL_HOURS, daily_kwh - delivered.sum(axis=1)
+
+
+def charger_power(catalogue):
+    """Charger kW for every vehicle class in a catalogue"""
+    return {name: vehicle_class.get('charger_kw', CHARGER_POWER_KW.get(name, DEFAULT_CHARGER_KW))
+            for name, vehicle_class in catalogue.vehicle_classes.items()}
+
+
+def required_connection(peak_kw, power_factor=POWER_FACTOR, headroom=CONNECTION_HEADROOM):
+    """Smallest standard connection (kVA) covering a peak load with headroom"""
+    kva = peak_kw / power_factor * (1 + headroom)
+    for size in STANDARD_CONNECTIONS_KVA:
+        if kva <= size:
+            return size
+    return math.ceil(kva / 1000) * 1000
+
+
+class DepotLoadProfiles:
+    """Charging load per postcode, with yearly series and peak / load-factor summaries"""
+
+    def __init__(self, postcodes, day_profiles, vehicles, unmet_kwh, duty_cycle, strategy):
+        self.postcodes = list(postcodes)
+        self._index = {postcode: i for i, postcode in enumerate(self.postcodes)}
+        self.day_profiles = day_profiles  # (postcodes, SPAN) kW
+        self.vehicles = vehicles
+        self.unmet_kwh = unmet_kwh
+        self.duty_cycle = duty_cycle
+        self.strategy = strategy
+        self._operating, self._previous = duty_cycle.calendar()
+
+    def _profile(self, postcode):
+        if postcode is None:
+            return self.day_profiles.sum(axis=0)
+        return self.day_profiles[self._index[normalize_postcode(postcode)]]
+
+    def series(self, postcode=None):
+        """17,520 half-hourly kW values for one postcode, or for the whole region when postcode is None"""
+        profile = self._profile(postcode)
+        today, overnight = profile[:INTERVALS_PER_DAY], profile[INTERVALS_PER_DAY:]
+        load = self._operating[:, None] * today[None, :] + self._previous[:, None] * overnight[None, :]
+        return load.reshape(INTERVALS_PER_YEAR)
+
+    def _metrics(self, profiles):
+        """Annual kWh, peak kW and peak interval of the day for rows of span profiles"""
+        today, overnight = profiles[:, :INTERVALS_PER_DAY], profiles[:, INTERVALS_PER_DAY:]
+        # Every day is one of at most four kinds, by whether it and the day before are operating days
+        kinds = np.unique(np.stack([self._operating, self._previous], axis=1), axis=0)
+        loads = kinds[:, 0, None, None] * today[None] + kinds[:, 1, None, None] * overnight[None]
+        loads = loads.transpose(1, 0, 2).reshape(len(profiles), -1)
+        annual_kwh = self._operating.sum() * profiles.sum(axis=1) * INTERVAL_HOURS
+        return annual_kwh, loads.max(axis=1), loads.argmax(axis=1) % INTERVALS_PER_DAY
+
+    def _rows(self, names, profiles, vehicles, unmet_kwh):
+        annual_kwh, peak_kw, peak_slot = self._metrics(profiles)
+        hours = INTERVALS_PER_YEAR * INTERVAL_HOURS
+        return [
+            {
+                'postcode': name,
+                'vehicles': int(vehicles[i]),
+                'annual_kwh': float(annual_kwh[i]),
+                'peak_kw': float(peak_kw[i]),
+                'peak_time': f"{peak_slot[i] // 2:02d}:{30 * (peak_slot[i] % 2):02d}",
+                'load_factor': float(annual_kwh[i] / (peak_kw[i] * hours)) if peak_kw[i] > 0 else 0.0,
+                'connection_kva': required_connection(float(peak_kw[i])),
+                'unmet_kwh': float(unmet_kwh[i]),
+            }
+            for i, name in enumerate(names)
+        ]
+
+    def summary(self):
+        """One row per postcode, highest peak first"""
+        rows = self._rows(self.postcodes, self.day_profiles, self.vehicles, self.unmet_kwh)
+        return sorted(rows, key=lambda row: row['peak_kw'], reverse=True)
+
+    def region_summary(self):
+        """The same figures for all postcodes together; the region peak reflects diversity between depots"""
+        return self._rows(['ALL'], self.day_profiles.sum(axis=0, keepdims=True),
+                          [sum(self.vehicles)], [sum(self.unmet_kwh)])[0]
+
+
+def simulate_depot_loads(fleet, duty_cycle=None, strategy='unmanaged', charger_kw=None):
+    """Simulate depot charging for a fleet
+
+    fleet is a DataFrame (or anything pandas.DataFrame accepts) with
+    postcode and vehicle_type columns and optional annual_mileage and
+    num_vehicles. charger_kw ({vehicle class: kW}) overrides the charger
+    power of each class given (see charger_power).
+    Energy drawn from the grid includes charging losses, so it exceeds the
+    calculator's battery-side electricity demand by 1 / CHARGING_EFFICIENCY.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {', '.join(STRATEGIES)}")
+    duty_cycle = duty_cycle or DutyCycle()
+    catalogue = get_catalogue()
+    chargers = {**charger_power(catalogue), **(charger_kw or {})}
+    vehicle_data = catalogue.vehicle_data
+
+    fleet = pd.DataFrame(fleet)
+    # Vehicle types may be given as keys or as display names
+    vehicle_types = fleet['vehicle_type'].astype(str).str.strip().map(catalogue.vehicle_lookup)
+    if vehicle_types.isna().any():
+        unknown = sorted(set(fleet['vehicle_type'][vehicle_types.isna()].astype(str)))
+        raise ValueError(f"Unknown vehicle_type: {', '.join(unknown)}")
+    rows = profile_indices(vehicle_types.to_numpy(dtype=str), catalogue)
+    default_mileage = vehicle_types.map({key: v['default_mileage'] for key, v in vehicle_data.items()})
+    mileages = pd.to_numeric(fleet.get('annual_mileage', default_mileage), errors='coerce').fillna(default_mileage)
+    counts = pd.to_numeric(fleet.get('num_vehicles', 1), errors='coerce')
+    counts = pd.Series(counts, index=fleet.index).fillna(1).to_numpy(dtype=float)
+
+    operating_days = duty_cycle.calendar()[0].sum()
+    kwh_per_mile = catalogue.columns['kwh_per_mile'][rows]
+    charger_by_row = np.array([chargers[vehicle['vehicle_class']] for vehicle in vehicle_data.values()])[rows]
+    daily_kwh = mileages.to_numpy(dtype=float) * kwh_per_mile / CHARGING_EFFICIENCY / operating_days
+
+    postcodes, group = np.unique(fleet['postcode'].map(normalize_postcode).to_numpy(dtype=str),
+                                 return_inverse=True)
+    day_profiles = np.zeros((len(postcodes), SPAN))
+    unmet = np.zeros(len(postcodes))
+    chunk = max(1, CHUNK_CELLS // (duty_cycle.arrivals * SPAN))
+    for first in range(0, len(fleet), chunk):
+        part = slice(first, first + chunk)
+        profiles, unmet_daily = _vehicle_day_profiles(daily_kwh[part], charger_by_row[part], duty_cycle, strategy)
+        np.add.at(day_profiles, group[part], profiles * counts[part, None])
+        unmet += np.bincount(group[part], weights=unmet_daily * counts[part], minlength=len(postcodes))
+
+    return DepotLoadProfiles(postcodes.tolist(), day_profiles,
+                             np.bincount(group, weights=counts, minlength=len(postcodes)),
+                             unmet * operating_days, duty_cycle, strategy)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate half-hourly depot charging load for a fleet CSV")
+    parser.add_argument('fleet', help="CSV with postcode, vehicle_type[, annual_mileage, num_vehicles]")
+    parser.add_argument('--strategy', choices=STRATEGIES, default='unmanaged')
+    parser.add_argument('--window', nargs=2, type=float, default=(18.0, 6.0), metavar=('START', 'END'),
+                        help="Charging window in hours of the day")
+    parser.add_argument('--arrival-spread', type=float, default=2.0)
+    parser.add_argument('--days', default='0,1,2,3,4', help="Operating weekdays, 0 = Monday")
+    parser.add_argument('--series', help="Write the region's half-hourly series to this CSV")
+    args = parser.parse_args(argv)
+
+    duty_cycle = DutyCycle([int(day) for day in args.days.split(',')], *args.window, args.arrival_spread)
+    loads = simulate_depot_loads(pd.read_csv(args.fleet), duty_cycle, args.strategy)
+    pd.DataFrame(loads.summary() + [loads.region_summary()]).to_csv(sys.stdout, index=False)
+    if args.series:
+        start = pd.Timestamp(duty_cycle.year, 1, 1)
+        index = pd.date_range(start, periods=INTERVALS_PER_YEAR, freq='30min')
+        pd.DataFrame({'kw': loads.series()}, index=index).to_csv(args.series, index_label='interval_start')
+
+
+if __name__ == '__main__':
+    main()
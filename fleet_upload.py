@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Bulk evaluation of fleet files
+A fleet CSV has one row per asset (or group of identical assets) with the
+columns below; only vehicle_type is required. Files are read and evaluated
+in fixed-size chunks through the vectorized engine, and per-vehicle results
+are written straight to an output file, so memory stays flat however many
+rows the file has. Rows are validated by the same rules as parse_scenario,
+and a file that cannot be read as a fleet raises ScenarioError.
+
+    asset_id, vehicle_type, annual_mileage, purchase_year, operating_period, num_vehicles
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from calculator_batch import calculate_scenarios_batch
+from calculator_core import (
+    COST_FIELDS,
+    MAX_MILEAGE,
+    MAX_NUM_VEHICLES,
+    MIN_MILEAGE,
+    OPERATING_PERIODS,
+    PURCHASE_YEARS,
+    ScenarioError,
+    get_catalogue,
+)
+from metrics import span
+
+DEFAULT_CHUNK_ROWS = 20000
+INPUT_COLUMNS = ['asset_id', 'vehicle_type', 'annual_mileage', 'purchase_year', 'operating_period', 'num_vehicles']
+RESULT_COLUMNS = (['electric_total', 'diesel_total', 'savings', 'co2_saved', 'electricity_demand']
+                  + [f'electric_{f}' for f in COST_FIELDS[:-1]] + [f'diesel_{f}' for f in COST_FIELDS[:-1]])
+OUTPUT_COLUMNS = INPUT_COLUMNS + RESULT_COLUMNS + ['error']
+TOTAL_COLUMNS = ('num_vehicles', 'electric_total', 'diesel_total', 'savings', 'co2_saved', 'electricity_demand')
+INTEGER_COLUMNS = ('purchase_year', 'annual_mileage', 'operating_period', 'num_vehicles')
+
+
+class FleetSummary:
+    """Running totals over evaluated fleet rows, overall and per vehicle type"""
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid_rows = 0
+        self.totals = dict.fromkeys(TOTAL_COLUMNS, 0)
+        self.by_vehicle_type = {}
+
+    def add(self, results):
+        self.rows += len(results)
+        # Valid rows are whole, in-range fleet sizes even where invalid ones left the column as objects
+        valid = results[results['error'] == ''].astype({'num_vehicles': np.int64})
+        self.invalid_rows += len(results) - len(valid)
+        for column in TOTAL_COLUMNS:
+            self.totals[column] += valid[column].sum().item()
+        for vehicle_type, group in valid.groupby('vehicle_type')[list(TOTAL_COLUMNS)].sum().iterrows():
+            running = self.by_vehicle_type.setdefault(vehicle_type, dict.fromkeys(TOTAL_COLUMNS, 0))
+            for column in TOTAL_COLUMNS:
+                running[column] += group[column].item()
+
+    def vehicle_type_rows(self):
+        return [{'vehicle_type': vehicle_type, **totals} for vehicle_type, totals in self.by_vehicle_type.items()]
+
+
+def evaluate_fleet_chunk(chunk, catalogue=None):
+    """Validate and evaluate one chunk of fleet rows, returning OUTPUT_COLUMNS"""
+    catalogue = catalogue or get_catalogue()
+    chunk = chunk.reindex(columns=INPUT_COLUMNS)
+    results = pd.DataFrame({'asset_id': chunk['asset_id']})
+    # Vehicle types may be given as keys or as display names
+    vehicle_types = chunk['vehicle_type'].astype('string').str.strip().map(catalogue.vehicle_lookup)
+    results['vehicle_type'] = vehicle_types.fillna(chunk['vehicle_type'].astype('string'))
+
+    # Fill calculator defaults for blank cells, then validate every row at once as parse_scenario does
+    default_mileage = vehicle_types.map({key: v['default_mileage'] for key, v in catalogue.vehicle_data.items()})
+    defaults = {'purchase_year': PURCHASE_YEARS[0], 'annual_mileage': default_mileage, 'operating_period': 5,
+                'num_vehicles': 1}
+    not_integer = {}
+    for column in INTEGER_COLUMNS:
+        values = pd.to_numeric(chunk[column], errors='coerce')
+        # Text that is not a number, NaN or infinity written out, and fractions are all rejected
+        not_integer[column] = (chunk[column].notna() & values.isna()) | ~(values.isna() | (values % 1 == 0))
+        results[column] = values.fillna(defaults[column])
+
+    error = pd.Series('', index=chunk.index, dtype=object)
+    checks = [
+        (vehicle_types.isna(), "unknown vehicle_type"),
+        *((not_integer[column], f"{column} must be an integer") for column in INTEGER_COLUMNS),
+        (~results['purchase_year'].isin(PURCHASE_YEARS),
+         f"purchase_year must be between {PURCHASE_YEARS[0]} and {PURCHASE_YEARS[-1]}"),
+        (~results['operating_period'].isin(OPERATING_PERIODS),
+         f"operating_period must be one of {', '.join(map(str, OPERATING_PERIODS))}"),
+        (~results['annual_mileage'].between(MIN_MILEAGE, MAX_MILEAGE),
+         f"annual_mileage must be between {MIN_MILEAGE} and {MAX_MILEAGE}"),
+        (~results['num_vehicles'].between(1, MAX_NUM_VEHICLES),
+         f"num_vehicles must be between 1 and {MAX_NUM_VEHICLES}"),
+    ]
+    for failed, message in reversed(checks):
+        error = error.mask(failed.to_numpy(dtype=bool), message)
+    results['error'] = error
+    for column in INTEGER_COLUMNS:
+        results[column] = _as_integers(results[column], ~not_integer[column])
+    valid = (error == '').to_numpy()
+
+    for column in RESULT_COLUMNS:
+        results[column] = np.nan
+    if valid.any():
+        batch = calculate_scenarios_batch(
+            vehicle_types[valid].to_numpy(dtype=str),
+            results['purchase_year'][valid].to_numpy(dtype=np.int64),
+            results['annual_mileage'][valid].to_numpy(dtype=float),
+            results['operating_period'][valid].to_numpy(dtype=np.int64),
+            results['num_vehicles'][valid].to_numpy(dtype=np.int64),
+            catalogue)
+        for column in RESULT_COLUMNS:
+            results.loc[valid, column] = batch[column]
+    # Pence and kilograms are precise enough, and rounding keeps the CSV small and quick to write
+    results[RESULT_COLUMNS] = results[RESULT_COLUMNS].round(2)
+    return results[OUTPUT_COLUMNS]
+
+
+def _as_integers(values, integral):
+    """Write whole numbers back as ints; rejected fractions, infinities and blanks stay as they are"""
+    integral = integral & values.notna()
+    if integral.all() and (values.abs() < 2 ** 63).all():
+        return values.astype(np.int64)
+    values = values.astype(object)
+    values[integral] = [int(value) for value in values[integral]]
+    return values
+
+
+def evaluate_fleet_file(source, output, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """Evaluate a fleet CSV chunk by chunk, writing per-vehicle results as CSV to output
+
+    source and output are paths or file objects. progress, if given, is
+    called after each chunk with (summary_so_far, fraction_of_input_read).
+    Every chunk is evaluated against the same catalogue version. Returns a
+    FleetSummary of the whole file; raises ScenarioError for a file that is
+    empty, has no vehicle_type column or is not readable CSV.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            return evaluate_fleet_file(file, output, chunk_rows, progress)
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, 'w', newline='', encoding='utf-8') as file:
+            return evaluate_fleet_file(source, file, chunk_rows, progress)
+
+    catalogue = get_catalogue()
+    summary = FleetSummary()
+    size = _source_size(source)
+    header = True
+    for chunk in _read_chunks(source, chunk_rows):
+        with span('fleet.chunk'):
+            results = evaluate_fleet_chunk(chunk, catalogue)
+        results.to_csv(output, index=False, header=header)
+        header = False
+        summary.add(results)
+        if progress is not None:
+            progress(summary, min(1.0, source.tell() / size) if size else None)
+    if not summary.rows:
+        raise ScenarioError("the fleet file has no rows")
+    return summary
+
+
+def _read_chunks(source, chunk_rows):
+    """Yield DataFrame chunks of a fleet CSV, turning unreadable input into ScenarioError"""
+    try:
+        reader = pd.read_csv(source, chunksize=chunk_rows, dtype={'asset_id': 'string', 'vehicle_type': 'string'})
+        for chunk in reader:
+            if 'vehicle_type' not in chunk.columns:
+                raise ScenarioError("the fleet file needs a vehicle_type column")
+            yield chunk
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ScenarioError(f"the fleet file is not a readable CSV: {e}") from None
+
+
+def _source_size(source):
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(position)
+    return size - position
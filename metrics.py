@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+In-process metrics for the calculator
+Timing spans around the hot stages (page run, scenario calculation, log
+append, admin aggregation and export) feed per-stage latency histograms;
+counters track calculations, and collectors registered by the log writer
+and result cache report their own counters when metrics are read. Everything
+is exposed in the Prometheus text format, from the API's /metrics route or
+from a local-only HTTP endpoint started when METRICS_PORT is set.
+
+Metrics are per process. Set METRICS_ENABLED=0 to turn spans and counters
+into no-ops. Set METRICS_PROFILING=1 to allow per-request cProfile runs
+(?profile=1 on the page or the API).
+"""
+
+import bisect
+import contextlib
+import io
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+METRICS_HOST = '127.0.0.1'
+PROFILING_ENABLED = os.environ.get('METRICS_PROFILING') == '1'
+PROFILE_LINES = 30
+METRIC_PREFIX = 'calculator_'
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """A monotonically increasing count"""
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """Latency counts per LATENCY_BUCKETS bucket, plus the sum and count"""
+
+    __slots__ = ('counts', 'sum', 'count', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """Return (counts, sum, count) read consistently"""
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None when empty or beyond the last bound)"""
+        counts, _, total = self.snapshot()
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class MetricsRegistry:
+    """Counters and stage histograms for one process
+
+    Counters and histograms lock individually, so recording takes no
+    registry-wide lock once a metric exists.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> Counter
+        self.stages = {}  # stage -> Histogram
+        self._collectors = []
+
+    def counter(self, name, **labels):
+        """Return the counter for name and labels, creating it at zero"""
+        key = (name, tuple(sorted(labels.items())))
+        counter = self.counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self.counters.setdefault(key, Counter())
+        return counter
+
+    def histogram(self, stage):
+        """Return the latency histogram for a stage, creating it empty"""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, Histogram())
+        return histogram
+
+    def add_collector(self, collect):
+        """Register a callable returning (name, 'counter' or 'gauge', value) tuples, called at read time"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def stage_summary(self):
+        """Rows of (stage, count, mean_seconds, p95_seconds) in stage order"""
+        with self._lock:
+            stages = sorted(self.stages.items())
+        rows = []
+        for stage, histogram in stages:
+            _, total, count = histogram.snapshot()
+            if count:
+                rows.append((stage, count, total / count, histogram.quantile(0.95)))
+        return rows
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            stages = sorted(self.stages.items())
+            collectors = list(self._collectors)
+
+        lines = []
+        typed = set()
+
+        def sample(name, kind, value, labels=()):
+            name = METRIC_PREFIX + name
+            if name not in typed:
+                lines.append(f"# TYPE {name} {kind}")
+                typed.add(name)
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        for (name, labels), counter in counters:
+            sample(name, 'counter', counter.value, labels)
+        for collect in collectors:
+            try:
+                for name, kind, value in collect():
+                    sample(name, kind, value)
+            except Exception:
+                logger.exception("Metrics collector failed")
+
+        name = METRIC_PREFIX + 'stage_seconds'
+        if stages:
+            lines.append(f"# TYPE {name} histogram")
+        for stage, histogram in stages:
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry()
+    return _metrics
+
+
+class _Span:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class _Noop:
+    """Stands in for spans and counters when metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def inc(self, amount=1):
+        pass
+
+
+_NOOP = _Noop()
+
+
+def span(stage):
+    """Context manager timing a block into the stage's latency histogram"""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Span(get_metrics().histogram(stage))
+
+
+def observe(stage, seconds):
+    """Record a latency measured elsewhere; a no-op when metrics are disabled"""
+    if METRICS_ENABLED:
+        get_metrics().histogram(stage).observe(seconds)
+
+
+def counter(name, **labels):
+    """Return a counter to increment with inc(); hot paths should look it up once"""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return get_metrics().counter(name, **labels)
+
+
+@contextlib.contextmanager
+def profiled(enabled=True):
+    """Run the block under cProfile when enabled, yielding the Profile (or None)"""
+    if not enabled:
+        yield None
+        return
+    profile = start_profile()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+
+
+def start_profile():
+    """Start and return a cProfile.Profile, for callers that cannot wrap a block"""
+    # cProfile, pstats and http.server are imported on use; importing them up front slowed every importer
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def profile_report(profile, limit=PROFILE_LINES):
+    """The profile's top functions by cumulative time, as text"""
+    import pstats
+
+    output = io.StringIO()
+    pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on host:port from a daemon thread, once per process; returns the server or None"""
+    global _server
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = get_metrics().render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a log line each
+
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError:
+                logger.exception("Could not start the metrics endpoint on %s:%s", host, port)
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+            logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return _server
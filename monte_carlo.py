@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo sensitivity analysis for electric vs diesel savings
+Draws energy price, diesel price, annual mileage, EV price decline and an
+electric maintenance factor from configurable distributions and runs every
+draw through the vectorized cost engine in one pass.
+
+A distribution is a plain number (held constant) or a dict such as
+{'dist': 'triangular', 'low': 0.22, 'mode': 0.28, 'high': 0.36}. Supported
+kinds: constant (value), uniform (low, high), normal (mean, sd) and
+triangular (low, mode, high).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from calculator_batch import calculate_diesel_costs_batch, calculate_electric_costs_batch
+from calculator_core import BASE_YEAR, adjusted_purchase_prices, get_catalogue, get_vehicle_profile
+
+DEFAULT_DRAWS = 100000
+VARIABLES = ('energy_price', 'diesel_price', 'annual_mileage', 'price_decline', 'maintenance_factor')
+
+
+def default_distributions(vehicle_type, annual_mileage=None, catalogue=None):
+    """Distributions centred on the calculator's point assumptions for a vehicle"""
+    catalogue = catalogue or get_catalogue()
+    profile = get_vehicle_profile(vehicle_type, catalogue)
+    mileage = annual_mileage or catalogue.vehicle_data[vehicle_type]['default_mileage']
+    return {
+        'energy_price': {'dist': 'triangular', 'low': profile.energy_rate * 0.8,
+                         'mode': profile.energy_rate, 'high': profile.energy_rate * 1.3},  # £/kWh
+        'diesel_price': {'dist': 'triangular', 'low': profile.fuel_price * 0.85,
+                         'mode': profile.fuel_price, 'high': profile.fuel_price * 1.25},  # £/litre
+        'annual_mileage': {'dist': 'normal', 'mean': mileage, 'sd': mileage * 0.1},
+        'price_decline': {'dist': 'uniform', 'low': max(0.0, profile.price_decline - 0.04),
+                          'high': profile.price_decline + 0.04},
+        'maintenance_factor': {'dist': 'triangular', 'low': 0.8, 'mode': 1.0, 'high': 1.3},
+    }
+
+
+def sample(spec, rng, size):
+    """Draw size samples from a distribution spec"""
+    if isinstance(spec, (int, float)):
+        return np.full(size, float(spec))
+    kind = spec.get('dist', 'constant')
+    if kind == 'constant':
+        return np.full(size, float(spec['value']))
+    if kind == 'uniform':
+        return rng.uniform(spec['low'], spec['high'], size)
+    if kind == 'normal':
+        return rng.normal(spec['mean'], spec['sd'], size)
+    if kind == 'triangular':
+        if spec['low'] == spec['high']:
+            return np.full(size, float(spec['mode']))
+        return rng.triangular(spec['low'], spec['mode'], spec['high'], size)
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def simulate_savings(vehicle_type, purchase_year, operating_period, num_vehicles=1, annual_mileage=None,
+                     distributions=None, draws=DEFAULT_DRAWS, seed=None):
+    """Simulate fleet savings (diesel total minus electric total) for one scenario
+
+    distributions overrides any of VARIABLES; the rest default to
+    default_distributions(). Returns percentiles, mean, standard deviation
+    and the probability that electric is cheaper.
+    """
+    catalogue = get_catalogue()
+    profile = get_vehicle_profile(vehicle_type, catalogue)
+    specs = default_distributions(vehicle_type, annual_mileage, catalogue)
+    specs.update(distributions or {})
+    unknown = set(specs) - set(VARIABLES)
+    if unknown:
+        raise ValueError(f"Unknown sensitivity variables: {', '.join(sorted(unknown))}")
+
+    rng = np.random.default_rng(seed)
+    samples = {name: sample(specs[name], rng, draws) for name in VARIABLES}
+    mileages = np.maximum(samples['annual_mileage'], 0.0)
+
+    # Price decline changes the EV purchase price; diesel keeps the 2% inflation
+    years_from_now = purchase_year - BASE_YEAR
+    electric_prices = profile.electric_price * (1 - samples['price_decline']) ** years_from_now
+    _, diesel_price = adjusted_purchase_prices(profile, purchase_year)
+
+    electric = calculate_electric_costs_batch(vehicle_type, electric_prices, mileages, operating_period, catalogue)
+    diesel = calculate_diesel_costs_batch(vehicle_type, diesel_price, mileages, operating_period, catalogue)
+
+    # Energy costs are linear in the tariff, so rescale from the profile's point rates
+    electric_total = (electric['purchase'] + electric['energy'] * (samples['energy_price'] / profile.energy_rate)
+                      + electric['maintenance'] * samples['maintenance_factor'] + electric['insurance'])
+    diesel_total = (diesel['purchase'] + diesel['energy'] * (samples['diesel_price'] / profile.fuel_price)
+                    + diesel['maintenance'] + diesel['insurance'])
+    savings = diesel_total * num_vehicles - electric_total * num_vehicles
+
+    p10, p50, p90 = np.percentile(savings, [10, 50, 90]).tolist()
+    return {
+        'vehicle_type': vehicle_type,
+        'purchase_year': purchase_year,
+        'operating_period': operating_period,
+        'num_vehicles': num_vehicles,
+        'draws': draws,
+        'p10': p10,
+        'p50': p50,
+        'p90': p90,
+        'mean': float(savings.mean()),
+        'std': float(savings.std()),
+        'probability_electric_wins': float((savings > 0).mean()),
+    }
+
+
+def _simulate_one(args):
+    scenario, distributions, draws, seed = args
+    return simulate_savings(distributions=distributions, draws=draws, seed=seed, **scenario)
+
+
+def simulate_scenarios(scenarios, distributions=None, draws=DEFAULT_DRAWS, seed=None, workers=None):
+    """Simulate many scenarios across a process pool, returning results in input order
+
+    Each scenario is a dict of simulate_savings arguments. Every scenario gets
+    its own child seed spawned from seed, so results are reproducible
+    regardless of how the work is split across processes.
+    """
+    scenarios = list(scenarios)
+    seeds = np.random.SeedSequence(seed).spawn(len(scenarios))
+    tasks = [(scenario, distributions, draws, child) for scenario, child in zip(scenarios, seeds)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        return [_simulate_one(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_simulate_one, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Postcode-hierarchy index of electricity demand
+Postcodes are normalized and filed under a tree of area ("SW"), district
+("SW1"), sub-district ("SW1A", where different), sector ("SW1A 1") and full
+postcode ("SW1A 1AA"). Every node keeps running totals overall and per
+purchase year, so roll-ups and top-N queries read the tree instead of the log.
+"""
+
+import functools
+import heapq
+import re
+
+LEVELS = ('area', 'district', 'sector', 'postcode')
+UNKNOWN_AREA = '?'
+
+_OUTWARD = re.compile(r'^([A-Z]{1,2})(?:(\d{1,2})([A-Z]?))?$')
+_INWARD = re.compile(r'^\d[A-Z]{2}$')
+
+
+def normalize_postcode(postcode):
+    """Upper-case a postcode and put a single space before the inward code"""
+    parts = str(postcode).upper().split()
+    compact = ''.join(parts)
+    if len(compact) >= 5 and _INWARD.match(compact[-3:]):
+        return f"{compact[:-3]} {compact[-3:]}"
+    # Partial inward codes (sectors such as "SW1A 1") need their space to be told apart from districts
+    if len(parts) == 2 and len(parts[1]) < 3:
+        return f"{parts[0]} {parts[1]}"
+    return compact
+
+
+def postcode_path(postcode):
+    """Return the chain of codes from area down to the given (possibly partial) postcode"""
+    normalized = normalize_postcode(postcode)
+    outward, _, inward = normalized.partition(' ')
+    match = _OUTWARD.match(outward)
+    if not match:
+        return [UNKNOWN_AREA, normalized] if normalized else [UNKNOWN_AREA]
+
+    area, digits, suffix = match.groups()
+    if not digits:
+        return [area]
+    path = [area, area + digits]
+    if suffix:
+        path.append(outward)
+    if inward:
+        path.append(f"{outward} {inward[0]}")
+        if len(inward) == 3:
+            path.append(normalized)
+    return path
+
+
+def postcode_matcher(prefixes):
+    """Return a predicate telling whether a postcode falls under any of the given prefixes ('SW1' excludes 'SW10')"""
+    paths = [tuple(postcode_path(prefix)) for prefix in prefixes]
+
+    @functools.lru_cache(maxsize=65536)
+    def matches(postcode):
+        path = tuple(postcode_path(postcode))
+        return any(path[:len(prefix)] == prefix for prefix in paths)
+
+    return matches
+
+
+class _Node:
+    __slots__ = ('total', 'years', 'children')
+
+    def __init__(self):
+        self.total = [0, 0, 0]  # num_vehicles, estimated_electricity_demand, calculations
+        self.years = {}
+        self.children = {}
+
+    def add(self, purchase_year, num_vehicles, demand, calculations):
+        for stats in (self.total, self.years.setdefault(purchase_year, [0, 0, 0])):
+            stats[0] += num_vehicles
+            stats[1] += demand
+            stats[2] += calculations
+
+    def stats(self, purchase_year=None):
+        if purchase_year is None:
+            return tuple(self.total)
+        return tuple(self.years.get(purchase_year, (0, 0, 0)))
+
+
+class PostcodeDemandIndex:
+    """Incrementally maintained demand totals for every level of the postcode hierarchy"""
+
+    def __init__(self):
+        self.root = _Node()
+
+    def add(self, postcode, purchase_year, num_vehicles, demand, calculations=1):
+        """Fold one row (or a pre-aggregated group of rows) into every level of its postcode"""
+        node = self.root
+        node.add(purchase_year, num_vehicles, demand, calculations)
+        for code in postcode_path(postcode):
+            child = node.children.get(code)
+            if child is None:
+                child = node.children[code] = _Node()
+            child.add(purchase_year, num_vehicles, demand, calculations)
+            node = child
+
+    def _find(self, prefix):
+        node = self.root
+        if prefix:
+            for code in postcode_path(prefix):
+                node = node.children.get(code)
+                if node is None:
+                    return None
+        return node
+
+    def lookup(self, prefix=None, purchase_year=None):
+        """(num_vehicles, demand, calculations) under a postcode prefix such as 'SW', 'SW1' or 'SW1A 1'"""
+        node = self._find(prefix)
+        return node.stats(purchase_year) if node is not None else (0, 0, 0)
+
+    def rollup(self, level, prefix=None, purchase_year=None):
+        """Every code at a level (see LEVELS) under an optional prefix, as (code, vehicles, demand, calculations)"""
+        if level not in LEVELS:
+            raise ValueError(f"level must be one of {', '.join(LEVELS)}")
+        start = self._find(prefix)
+        if start is None:
+            return []
+
+        rows = []
+        stack = [(code, child) for code, child in start.children.items()]
+        while stack:
+            code, node = stack.pop()
+            if self._level_of(code) == level:
+                stats = node.stats(purchase_year)
+                if stats[2]:
+                    rows.append((code, *stats))
+            else:
+                stack.extend(node.children.items())
+        return rows
+
+    def top(self, n, level='district', prefix=None, purchase_year=None):
+        """The n codes at a level with the highest demand, highest first"""
+        return heapq.nlargest(n, self.rollup(level, prefix, purchase_year), key=lambda row: row[2])
+
+    @staticmethod
+    def _level_of(code):
+        if code == UNKNOWN_AREA:
+            return 'area'
+        if ' ' in code:
+            return 'postcode' if len(code.partition(' ')[2]) == 3 else 'sector'
+        match = _OUTWARD.match(code)
+        if match is None:
+            return 'postcode'  # Unparseable entries filed under the unknown area
+        area, digits, suffix = match.groups()
+        if not digits:
+            return 'area'
+        # Sub-districts such as SW1A sit between district and sector and are not a reporting level
+        return 'subdistrict' if suffix else 'district'
+
+    def to_json(self):
+        """The tree flattened in preorder: [codes, child counts, per-node [year, vehicles, demand, calculations]*]
+
+        Totals are left out (they are the sum over years), so the state stays
+        small and restores without building a dict per node.
+        """
+        codes, child_counts, years = [], [], []
+        stack = [('', self.root)]
+        while stack:
+            code, node = stack.pop()
+            codes.append(code)
+            child_counts.append(len(node.children))
+            years.append([value for year, stats in node.years.items() for value in (year, *stats)])
+            stack.extend(reversed(list(node.children.items())))
+        return [codes, child_counts, years]
+
+    @classmethod
+    def from_json(cls, data):
+        index = cls()
+        parents = []  # [node, children still to come] for each open node
+        for code, child_count, years in zip(*data):
+            node = _Node()
+            total = node.total
+            for i in range(0, len(years), 4):
+                stats = node.years[years[i]] = years[i + 1:i + 4]
+                total[0] += stats[0]
+                total[1] += stats[1]
+                total[2] += stats[2]
+            if parents:
+                parent = parents[-1]
+                parent[0].children[code] = node
+                parent[1] -= 1
+                if not parent[1]:
+                    parents.pop()
+            else:
+                index.root = node
+            if child_count:
+                parents.append([node, child_count])
+        return index
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Process-wide LRU cache of calculator results
+Entries are keyed by the normalized scenario and belong to the fingerprint
+of the vehicle and tariff data they were computed from; a lookup with a new
+fingerprint drops every entry first. The cache lives in its own module so
+every Streamlit session in the process shares it, even though the page
+script itself is re-executed on each rerun.
+
+The size bound defaults to SCENARIO_CACHE_SIZE from the environment.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import get_metrics
+
+DEFAULT_MAXSIZE = int(os.environ.get('SCENARIO_CACHE_SIZE', 4096))
+
+
+class ScenarioCache:
+    """Thread-safe LRU mapping of scenario keys to results, with hit/miss counters
+
+    Cached results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        if maxsize < 0:
+            raise ValueError("maxsize must not be negative")
+        self.maxsize = maxsize
+        self.fingerprint = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self.fingerprint:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self.fingerprint = fingerprint
+
+    def get_or_compute(self, fingerprint, key, compute):
+        """Return the cached result for key, calling compute() on a miss"""
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            try:
+                result = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        # Computed outside the lock; a concurrent miss on the same key just computes it twice
+        result = compute()
+        with self._lock:
+            if fingerprint == self.fingerprint and self.maxsize:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def resize(self, maxsize):
+        """Change the size bound, evicting least recently used entries if needed"""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_scenario_cache():
+    """Return the process-wide scenario cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ScenarioCache()
+                get_metrics().add_collector(lambda: _cache_metrics(_cache))
+    return _cache
+
+
+def _cache_metrics(cache):
+    stats = cache.stats()
+    return [
+        ('scenario_cache_hits_total', 'counter', stats['hits']),
+        ('scenario_cache_misses_total', 'counter', stats['misses']),
+        ('scenario_cache_evictions_total', 'counter', stats['evictions']),
+        ('scenario_cache_entries', 'gauge', stats['size']),
+    ]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Mergeable sketches of calculation usage
+A HyperLogLog counts distinct postcodes in a few kilobytes with a standard
+error of about 1.6%, and a Misra-Gries summary keeps the most frequent
+postcodes and vehicle types with a bounded undercount. Both merge losslessly
+with sketches of the same kind, so sketches kept per day or per storage file
+combine into any date range without re-reading the rows behind them.
+"""
+
+import base64
+import functools
+import hashlib
+import heapq
+import math
+import zlib
+
+HLL_PRECISION = 12  # 4096 registers
+HEAVY_HITTER_CAPACITY = 128
+
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(65)]
+
+
+@functools.lru_cache(maxsize=65536)
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Approximate distinct count of strings"""
+
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    @property
+    def relative_error(self):
+        """Standard error of count() as a fraction of the true count"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value):
+        hashed = _hash64(value)
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, other):
+        """Merge another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    @classmethod
+    def merged(cls, sketches, precision=HLL_PRECISION):
+        """A new sketch of the union of several, merged register-wise in one pass"""
+        if sketches:
+            precision = sketches[0].precision
+        registers = [sketch.registers for sketch in sketches]
+        if any(sketch.precision != precision for sketch in sketches):
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        if len(registers) < 2:
+            return cls(precision, registers[0] if registers else None)
+        return cls(precision, map(max, *registers))
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(map(_INVERSE_POWERS.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        # Small cardinalities are more accurate by linear counting of empty registers
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_json(self):
+        return [self.precision, base64.b64encode(zlib.compress(bytes(self.registers))).decode('ascii')]
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data[0], zlib.decompress(base64.b64decode(data[1])))
+
+
+class HeavyHitters:
+    """Misra-Gries frequent-items summary with weighted counts
+
+    Holds at most capacity items after each compaction. A reported count
+    falls short of the true count by at most error, which stays below
+    total / (capacity + 1); any item whose true count exceeds that is
+    guaranteed to be held.
+    """
+
+    __slots__ = ('capacity', 'counts', 'error', 'total')
+
+    def __init__(self, capacity=HEAVY_HITTER_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.error = 0
+        self.total = 0
+
+    def add(self, item, count=1):
+        self.total += count
+        self.counts[item] = self.counts.get(item, 0) + count
+        # Compact in batches so adds stay O(1) amortized
+        if len(self.counts) > 2 * self.capacity:
+            self._compact()
+
+    def _compact(self):
+        if len(self.counts) <= self.capacity:
+            return
+        threshold = heapq.nlargest(self.capacity + 1, self.counts.values())[-1]
+        self.error += threshold
+        self.counts = {item: count - threshold for item, count in self.counts.items() if count > threshold}
+
+    def update(self, other):
+        """Merge another summary into this one"""
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+        self.error += other.error
+        self.total += other.total
+        self._compact()
+
+    def top(self, n):
+        """The n most frequent items as (item, count) pairs, highest first; counts are lower bounds"""
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+    def to_json(self):
+        return [self.capacity, self.error, self.total, self.counts]
+
+    @classmethod
+    def from_json(cls, data):
+        sketch = cls(data[0])
+        sketch.error, sketch.total, sketch.counts = data[1], data[2], data[3]
+        return sketch
+
+
+class UsageSketch:
+    """Distinct postcodes and top postcodes and vehicle types for one slice of the log"""
+
+    __slots__ = ('rows', 'postcodes', 'top_postcodes', 'vehicle_types')
+
+    def __init__(self):
+        self.rows = 0
+        self.postcodes = HyperLogLog()
+        self.top_postcodes = HeavyHitters()
+        self.vehicle_types = HeavyHitters()
+
+    def add(self, postcode, vehicle_type):
+        """Fold in one calculation row"""
+        self.rows += 1
+        if postcode:
+            self.postcodes.add(postcode)
+            self.top_postcodes.add(postcode)
+        if vehicle_type:
+            self.vehicle_types.add(vehicle_type)
+
+    @classmethod
+    def from_counts(cls, rows, postcode_counts, vehicle_type_counts):
+        """Build from {postcode: calculations} and {vehicle_type: calculations} for rows rows"""
+        sketch = cls()
+        sketch.rows = rows
+        for postcode, count in postcode_counts.items():
+            if postcode:
+                sketch.postcodes.add(postcode)
+                sketch.top_postcodes.add(postcode, count)
+        for vehicle_type, count in vehicle_type_counts.items():
+            if vehicle_type:
+                sketch.vehicle_types.add(vehicle_type, count)
+        return sketch
+
+    @classmethod
+    def merged(cls, sketches):
+        sketches = list(sketches)
+        sketch = cls()
+        sketch.postcodes = HyperLogLog.merged([s.postcodes for s in sketches])
+        for other in sketches:
+            sketch.rows += other.rows
+            sketch.top_postcodes.update(other.top_postcodes)
+            sketch.vehicle_types.update(other.vehicle_types)
+        return sketch
+
+    def summary(self, top=10):
+        """Usage summary in the shape of exact_usage_summary, with error bounds"""
+        return {
+            'rows': self.rows,
+            'distinct_postcodes': self.postcodes.count(),
+            'distinct_postcodes_error': self.postcodes.relative_error,
+            'top_postcodes': self.top_postcodes.top(top),
+            'top_postcodes_error': self.top_postcodes.error,
+            'top_vehicle_types': self.vehicle_types.top(top),
+            'top_vehicle_types_error': self.vehicle_types.error,
+            'exact': False,
+        }
+
+    def to_json(self):
+        return [self.rows, self.postcodes.to_json(), self.top_postcodes.to_json(), self.vehicle_types.to_json()]
+
+    @classmethod
+    def from_json(cls, data):
+        sketch = cls()
+        sketch.rows = data[0]
+        sketch.postcodes = HyperLogLog.from_json(data[1])
+        sketch.top_postcodes = HeavyHitters.from_json(data[2])
+        sketch.vehicle_types = HeavyHitters.from_json(data[3])
+        return sketch
+
+
+def exact_usage_summary(rows, postcode_counts, vehicle_type_counts, top=10):
+    """Usage summary from exact {postcode: calculations} and {vehicle_type: calculations} counts"""
+    return {
+        'rows': rows,
+        'distinct_postcodes': len(postcode_counts),
+        'distinct_postcodes_error': 0.0,
+        'top_postcodes': heapq.nlargest(top, postcode_counts.items(), key=lambda item: item[1]),
+        'top_postcodes_error': 0,
+        'top_vehicle_types': heapq.nlargest(top, vehicle_type_counts.items(), key=lambda item: item[1]),
+        'top_vehicle_types_error': 0,
+        'exact': True,
+    }
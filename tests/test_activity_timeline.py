@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from activity_timeline import ActivityTimeline
+
+LATEST = datetime(2025, 3, 1, 10, 30)
+
+
+def timeline_of_minutes(minutes, latest=LATEST):
+    timeline = ActivityTimeline()
+    for offset in range(minutes - 1, -1, -1):
+        timeline.add((latest - timedelta(minutes=offset)).isoformat(), 'van_small', 1, 10)
+    return timeline
+
+
+def test_recent_ranges_use_the_finest_resolution_held():
+    timeline = timeline_of_minutes(300)
+    assert timeline.resolution_for(LATEST - timedelta(hours=1)) == 'minute'
+    assert timeline.resolution_for(LATEST - timedelta(hours=24)) == 'hour'
+    assert timeline.resolution_for(LATEST - timedelta(days=7)) == 'hour'
+    assert timeline.resolution_for(LATEST - timedelta(days=30)) == 'day'
+    assert timeline.resolution_for() == 'hour'
+
+
+def test_minute_buckets_are_kept_for_48_hours():
+    timeline = timeline_of_minutes(4 * 24 * 60)
+    first, last = timeline.coverage('minute')
+    assert last == '2025-03-01T10:30'
+    # Pruning runs every quarter of the retention, so up to 12 hours of slack remain
+    assert '2025-02-26T22:30' <= first <= '2025-02-27T10:31'
+    assert timeline.coverage('hour') == ('2025-02-25T10', '2025-03-01T10')
+    assert timeline.resolution_for(LATEST - timedelta(hours=3)) == 'minute'
+    assert timeline.resolution_for(datetime(2025, 2, 26, 12), datetime(2025, 2, 26, 14)) == 'hour'
+
+
+def test_rows_for_pruned_periods_count_only_at_coarser_resolutions():
+    timeline = timeline_of_minutes(4 * 24 * 60)
+    late = '2025-02-26T09:15:00'
+    timeline.add(late, 'van_small', 1, 10)
+    assert timeline.series('minute', late, late) == []
+    assert timeline.series('hour', late, late) == [('2025-02-26T09', 61, 610, 61)]
+
+
+def test_json_round_trip_keeps_the_pruned_watermark():
+    timeline = timeline_of_minutes(4 * 24 * 60)
+    restored = ActivityTimeline.from_json(timeline.to_json())
+    assert restored.pruned_before == timeline.pruned_before
+    assert restored.resolution_for(datetime(2025, 2, 26, 12), datetime(2025, 2, 26, 14)) == 'hour'
+    assert restored.series('day') == timeline.series('day')
@@ -0,0 +1,70 @@
+import pytest
+
+from api import app
+from metrics import get_metrics
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return app.test_client()
+
+
+def post(client, path, text):
+    return client.post(path, data=text, content_type='application/json')
+
+
+def test_calculate(client):
+    response = post(client, '/calculate', '{"vehicle_type": "van_small", "annual_mileage": 20000}')
+    assert response.status_code == 200
+    assert response.get_json()['electric']['total'] > 0
+
+
+@pytest.mark.parametrize('mileage', ['NaN', 'Infinity', '-Infinity', '1e999'])
+def test_calculate_rejects_non_finite_mileage(client, mileage):
+    response = post(client, '/calculate', f'{{"vehicle_type": "van_small", "annual_mileage": {mileage}}}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "annual_mileage must be an integer"}
+
+
+@pytest.mark.parametrize('mileage', ['NaN', 'Infinity'])
+def test_batch_rejects_non_finite_mileage(client, mileage):
+    response = post(client, '/calculate/batch',
+                    f'{{"scenarios": [{{"vehicle_type": "van_small"}}, '
+                    f'{{"vehicle_type": "van_small", "annual_mileage": {mileage}}}]}}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "scenarios[1]: annual_mileage must be an integer"}
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/calculate', '{"vehicle_type": []}'),
+    ('/calculate', '{"vehicle_type": {}}'),
+    ('/calculate/batch', '{"scenarios": [{"vehicle_type": []}]}'),
+])
+def test_non_string_vehicle_type_is_rejected(client, path, body):
+    response = post(client, path, body)
+    assert response.status_code == 400
+    assert "vehicle_type must be one of" in response.get_json()['error']
+
+
+@pytest.mark.parametrize('path, body, error', [
+    ('/calculate', '{"vehicle_type": "van_small", "num_vehicles": 1e29}',
+     "num_vehicles must be between 1 and 100000"),
+    ('/calculate/batch', '{"scenarios": [{"vehicle_type": "van_small", "num_vehicles": 1e29}]}',
+     "scenarios[0]: num_vehicles must be between 1 and 100000"),
+])
+def test_oversized_fleet_is_rejected(client, path, body, error):
+    response = post(client, path, body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+
+def test_unmatched_requests_are_timed_together(client):
+    def counts():
+        return {stage: count for stage, count, _, _ in get_metrics().stage_summary()}
+
+    before = counts().get('api.unmatched', 0)
+    assert client.get('/no-such-path').status_code == 404
+    assert client.delete('/health').status_code == 405
+    assert counts()['api.unmatched'] == before + 2
+    assert 'api.None' not in counts()
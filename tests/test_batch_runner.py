@@ -0,0 +1,64 @@
+import io
+import json
+
+import pytest
+
+from batch_runner import evaluate_chunk, read_chunks, run_batch
+
+
+def run(text, input_format):
+    output = io.StringIO()
+    stats = run_batch(io.StringIO(text), output, input_format, workers=1)
+    return [json.loads(line) for line in output.getvalue().splitlines()], stats
+
+
+def test_csv_rows_are_evaluated_with_defaults():
+    results, stats = run("id,vehicle_type,annual_mileage\na,van_small,20000\nb,van_small,\n", 'csv')
+    assert [r['id'] for r in results] == ['a', 'b']
+    assert all('error' not in r and r['electric']['total'] > 0 for r in results)
+    assert stats.invalid_rows == 0
+
+
+@pytest.mark.parametrize('mileage', ['nan', 'NaN', 'inf', '-inf', 'Infinity', '1e999'])
+def test_csv_non_finite_mileage_is_an_invalid_row(mileage):
+    results, stats = run(f"vehicle_type,annual_mileage\nvan_small,{mileage}\nvan_small,20000\n", 'csv')
+    assert results[0] == {'row': 1, 'error': "annual_mileage must be an integer"}
+    assert 'error' not in results[1]
+    assert stats.invalid_rows == 1
+
+
+@pytest.mark.parametrize('field, value', [
+    ('annual_mileage', 'NaN'), ('annual_mileage', 'Infinity'), ('annual_mileage', '-Infinity'),
+    ('annual_mileage', '1e999'), ('num_vehicles', 'NaN'), ('purchase_year', '1e999'),
+])
+def test_ndjson_non_finite_values_are_invalid_rows(field, value):
+    line = f'{{"id": 7, "vehicle_type": "van_small", "{field}": {value}}}\n'
+    [(first_row, records)] = read_chunks(io.StringIO(line), 'ndjson')
+    text, invalid_rows, _ = evaluate_chunk(records, first_row)
+    assert json.loads(text) == {'row': 1, 'id': 7, 'error': f"{field} must be an integer"}
+    assert invalid_rows == 1
+
+
+def test_fractional_and_huge_integers_are_rejected():
+    results, stats = run('{"vehicle_type": "van_small", "num_vehicles": 1.5}\n'
+                         '{"vehicle_type": "van_small", "annual_mileage": 1' + '0' * 400 + '}\n', 'ndjson')
+    assert results[0]['error'] == "num_vehicles must be an integer"
+    assert results[1]['error'] == "annual_mileage must be between 1000 and 200000"
+    assert stats.invalid_rows == 2
+
+
+@pytest.mark.parametrize('vehicle_type', ['[]', '{}', '7', 'null', 'true'])
+def test_ndjson_non_string_vehicle_type_is_an_invalid_row(vehicle_type):
+    results, stats = run(f'{{"vehicle_type": {vehicle_type}}}\n{{"vehicle_type": "van_small"}}\n', 'ndjson')
+    assert results[0]['error'].startswith("vehicle_type must be one of ")
+    assert 'error' not in results[1]
+    assert stats.invalid_rows == 1
+
+
+@pytest.mark.parametrize('num_vehicles', ['1e20', '100001', '0'])
+def test_num_vehicles_out_of_range_is_an_invalid_row(num_vehicles):
+    results, stats = run(f'{{"vehicle_type": "van_small", "num_vehicles": {num_vehicles}}}\n'
+                         '{"vehicle_type": "van_small", "num_vehicles": 100000}\n', 'ndjson')
+    assert results[0]['error'] == "num_vehicles must be between 1 and 100000"
+    assert 'error' not in results[1]
+    assert stats.invalid_rows == 1
@@ -0,0 +1,81 @@
+import csv
+import gzip
+import io
+
+import pytest
+
+import calculation_export
+from calculation_export import CalculationExport
+from calculation_log import FIELDNAMES
+
+ROWS = [
+    ['2025-03-01T09:00:00', 'van_small', '2', 'SW1A 1AA', '2025', '10000', '500'],
+    ['2025-03-01T23:59:59', 'van_large', '1', 'SW10 0AA', '2026', '20000', '900'],
+    ['2025-03-02T10:00:00', 'van_small', '3', 'M1 1AE', '2025', '15000', '700'],
+    ['2025-03-03T10:00:00', 'hgv_rigid_small', '1', 'SW1P 3BU', '2027', '40000', '4000'],
+]
+
+
+@pytest.fixture(params=['csv', 'parquet'])
+def backend(request, tmp_path, monkeypatch):
+    """The same small log, as the CSV file or in a partitioned store"""
+    monkeypatch.chdir(tmp_path)
+    if request.param == 'csv':
+        (tmp_path / 'data').mkdir()
+        with open(tmp_path / 'data' / 'calculations.csv', 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows([FIELDNAMES] + ROWS)
+    else:
+        pytest.importorskip('pyarrow')
+        from calculation_store import PartitionedCalculationStore
+
+        store = PartitionedCalculationStore(str(tmp_path / 'store'))
+        store.append([dict(zip(FIELDNAMES, row)) for row in ROWS])
+        monkeypatch.setattr(calculation_export, 'CALCULATIONS_BACKEND', 'parquet')
+        monkeypatch.setattr(calculation_export, 'get_calculation_store', lambda: store)
+    return request.param
+
+
+def exported(export):
+    output = io.BytesIO()
+    rows = export.write_to(output)
+    data = output.getvalue()
+    if export.compression == 'gzip':
+        data = gzip.decompress(data)
+    header, *lines = csv.reader(io.StringIO(data.decode('utf-8')))
+    assert header == FIELDNAMES
+    assert rows == len(lines)
+    return lines
+
+
+def test_everything_is_exported_without_filters(backend):
+    assert exported(CalculationExport()) == ROWS
+
+
+def test_a_date_range_includes_whole_end_days(backend):
+    assert exported(CalculationExport('2025-03-01', '2025-03-01')) == ROWS[:2]
+    assert exported(CalculationExport(start='2025-03-02')) == ROWS[2:]
+    assert exported(CalculationExport('2025-03-01T12:00:00', '2025-03-02T12:00:00')) == ROWS[1:3]
+
+
+def test_postcode_prefixes_respect_district_boundaries(backend):
+    assert exported(CalculationExport(postcodes=['SW1'])) == [ROWS[0], ROWS[3]]
+    assert exported(CalculationExport(postcodes=['sw10', 'M1 1AE'])) == ROWS[1:3]
+
+
+def test_vehicle_type_filter(backend):
+    assert exported(CalculationExport(vehicle_types=['van_small'])) == [ROWS[0], ROWS[2]]
+    assert exported(CalculationExport(vehicle_types=['van_large', 'hgv_rigid_small'])) == [ROWS[1], ROWS[3]]
+    export = CalculationExport(start='2025-03-02', postcodes=['SW'], vehicle_types=['hgv_rigid_small'])
+    assert exported(export) == [ROWS[3]]
+
+
+def test_gzip_output_matches_the_plain_export(backend):
+    export = CalculationExport(compression='gzip', chunk_rows=1)
+    assert export.file_extension == '.csv.gz'
+    assert exported(export) == ROWS
+    assert exported(CalculationExport(postcodes=['SW'], compression='gzip')) == [ROWS[0], ROWS[1], ROWS[3]]
+
+
+def test_unknown_compression_is_rejected():
+    with pytest.raises(ValueError):
+        CalculationExport(compression='bzip2')
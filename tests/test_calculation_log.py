@@ -0,0 +1,113 @@
+import csv
+import threading
+
+from calculation_log import FIELDNAMES, CalculationLogWriter, CsvCalculationSink
+
+
+class RecordingSink:
+    """Remembers each batch; fails with the queued exceptions first"""
+
+    def __init__(self, failures=(), gate=None):
+        self.batches = []
+        self.failures = list(failures)
+        self.gate = gate
+        self.entered = threading.Event()
+
+    def append(self, rows):
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait()
+        if self.failures:
+            raise self.failures.pop(0)
+        self.batches.append(list(rows))
+
+
+def record(number):
+    return dict.fromkeys(FIELDNAMES, number)
+
+
+def test_rows_are_written_in_batches():
+    sink = RecordingSink()
+    writer = CalculationLogWriter(sink, batch_size=3, flush_interval=60)
+    for number in range(7):
+        assert writer.submit(record(number))
+    assert writer.flush(timeout=5)
+    assert [len(batch) for batch in sink.batches] == [3, 3, 1]
+    stats = writer.stats()
+    assert (stats['submitted'], stats['written'], stats['batches'], stats['queued']) == (7, 7, 3, 0)
+    writer.close()
+
+
+def test_close_flushes_queued_rows_and_later_rows_are_dropped(tmp_path):
+    path = tmp_path / 'calculations.csv'
+    writer = CalculationLogWriter(CsvCalculationSink(str(path)), batch_size=100, flush_interval=60)
+    writer.submit(record(1))
+    writer.submit(record(2))
+    writer.close()
+    with open(path, newline='', encoding='utf-8') as file:
+        assert [row['timestamp'] for row in csv.DictReader(file)] == ['1', '2']
+
+    assert not writer.submit(record(3))
+    assert writer.stats()['dropped'] == 1
+
+
+def test_a_full_queue_drops_rows_without_blocking():
+    gate = threading.Event()
+    sink = RecordingSink(gate=gate)
+    writer = CalculationLogWriter(sink, max_queue=2, batch_size=1, flush_interval=60)
+    writer.submit(record(0))
+    # Wait until the writer thread holds the first row and is stuck in the sink
+    assert sink.entered.wait(5)
+    assert writer.submit(record(1)) and writer.submit(record(2))
+    assert not writer.submit(record(3))
+    gate.set()
+    assert writer.flush(timeout=5)
+    stats = writer.stats()
+    assert (stats['submitted'], stats['dropped'], stats['written']) == (3, 1, 3)
+    writer.close()
+
+
+def test_failed_writes_are_retried_with_the_next_batch():
+    sink = RecordingSink(failures=[OSError("disk full")])
+    writer = CalculationLogWriter(sink, batch_size=10, flush_interval=60)
+    writer.submit(record(1))
+    writer.flush(timeout=5)
+    stats = writer.stats()
+    assert (stats['failed_writes'], stats['written'], stats['queued']) == (1, 0, 1)
+
+    writer.submit(record(2))
+    writer.flush(timeout=5)
+    assert sink.batches == [[record(1), record(2)]]
+    assert writer.stats()['written'] == 2
+    writer.close()
+
+
+def test_a_poisoned_batch_is_dropped_instead_of_retried():
+    sink = RecordingSink(failures=[ValueError("bad row")])
+    writer = CalculationLogWriter(sink, batch_size=10, flush_interval=60)
+    writer.submit(record(1))
+    writer.flush(timeout=5)
+    stats = writer.stats()
+    assert (stats['rejected'], stats['failed_writes'], stats['queued']) == (1, 0, 0)
+
+    writer.submit(record(2))
+    writer.flush(timeout=5)
+    assert sink.batches == [[record(2)]]
+    assert writer.stats()['written'] == 1
+    writer.close()
+
+
+def test_rows_a_sink_skips_are_counted_as_rejected():
+    class SkippingSink(RecordingSink):
+        def append(self, rows):
+            super().append([row for row in rows if row['timestamp'] != 'bad'])
+            return sum(row['timestamp'] == 'bad' for row in rows)
+
+    sink = SkippingSink()
+    writer = CalculationLogWriter(sink, batch_size=10, flush_interval=60)
+    for number in (1, 'bad', 2):
+        writer.submit(record(number))
+    writer.flush(timeout=5)
+    stats = writer.stats()
+    assert (stats['written'], stats['rejected']) == (2, 1)
+    writer.close()
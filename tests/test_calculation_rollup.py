@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+import calculation_rollup
+from calculation_rollup import CalculationRollup
+
+HEADER = "timestamp,vehicle_type,num_vehicles,postcode,purchase_year,annual_mileage,estimated_electricity_demand\n"
+
+
+def row(day, postcode='SW1A 1AA', vehicles=2):
+    return f"2025-03-{day:02d}T10:00:00,van_small,{vehicles},{postcode},2025,10000,500\n"
+
+
+@pytest.fixture
+def paths(tmp_path):
+    log_path = tmp_path / 'calculations.csv'
+    log_path.write_text(HEADER + row(1) + row(1, 'M1 1AE') + row(2))
+    return str(log_path), str(tmp_path / 'rollup.json')
+
+
+def append(log_path, text):
+    with open(log_path, 'a', encoding='utf-8') as file:
+        file.write(text)
+
+
+def test_day_sketches_are_saved_in_their_own_files(paths):
+    log_path, state_path = paths
+    rollup = CalculationRollup(log_path, state_path)
+    assert rollup.refresh() == 3
+    assert sorted(os.listdir(f"{state_path}.sketches")) == ['2025-03-01.json', '2025-03-02.json']
+    with open(state_path, encoding='utf-8') as file:
+        assert 'sketches' not in json.load(file)
+
+    restored = CalculationRollup(log_path, state_path)
+    assert restored.calculations == 3
+    assert restored.usage_summary('2025-03-01', '2025-03-01') == rollup.usage_summary('2025-03-01', '2025-03-01')
+    assert restored.usage_summary()['distinct_postcodes'] == 2
+    assert restored.postcode_level_summary('postcode') == rollup.postcode_level_summary('postcode')
+    assert restored.year_summary() == rollup.year_summary()
+
+
+def test_refreshes_between_saves_do_not_rewrite_the_state(paths):
+    log_path, state_path = paths
+    rollup = CalculationRollup(log_path, state_path)
+    rollup.refresh()
+    saved = os.stat(state_path).st_mtime_ns
+
+    append(log_path, row(3, 'LS1 4AP'))
+    assert rollup.refresh() == 1
+    assert rollup.calculations == 4
+    assert os.stat(state_path).st_mtime_ns == saved
+    assert not os.path.exists(os.path.join(f"{state_path}.sketches", '2025-03-03.json'))
+
+    # A restart resumes from the saved offset and reads the unsaved rows again
+    restored = CalculationRollup(log_path, state_path)
+    assert restored.calculations == 3
+    assert restored.refresh() == 1
+    assert restored.usage_summary()['distinct_postcodes'] == 3
+
+
+def test_sketches_from_an_interrupted_save_cause_a_rebuild(paths):
+    log_path, state_path = paths
+    CalculationRollup(log_path, state_path).refresh()
+    sketch_path = os.path.join(f"{state_path}.sketches", '2025-03-02.json')
+    with open(sketch_path, encoding='utf-8') as file:
+        generation, sketch = json.load(file)
+    with open(sketch_path, 'w', encoding='utf-8') as file:
+        json.dump([generation + 1, sketch], file)
+
+    rollup = CalculationRollup(log_path, state_path)
+    assert rollup.calculations == 0
+    assert rollup.refresh() == 3
+    assert rollup.usage_summary()['rows'] == 3
+    assert CalculationRollup(log_path, state_path).calculations == 3
+
+
+def test_refresh_reads_in_blocks_and_stops_at_the_last_complete_line(paths, monkeypatch):
+    log_path, state_path = paths
+    monkeypatch.setattr(calculation_rollup, 'READ_BLOCK_BYTES', 16)
+    append(log_path, row(3, 'LS1 4AP')[:20])
+    rollup = CalculationRollup(log_path, state_path)
+    assert rollup.refresh() == 3
+    assert rollup.offset == os.path.getsize(log_path) - 20
+
+    append(log_path, row(3, 'LS1 4AP')[20:])
+    assert rollup.refresh() == 1
+    assert rollup.offset == os.path.getsize(log_path)
+    assert {row[0]: row[1:] for row in rollup.postcode_level_summary('area')} == {
+        'SW': (4, 1000, 2), 'M': (2, 500, 1), 'LS': (2, 500, 1)}
+
+
+def test_starting_over_removes_only_sketch_files(paths):
+    log_path, state_path = paths
+    CalculationRollup(log_path, state_path).refresh()
+    sketch_dir = f"{state_path}.sketches"
+    stray = os.path.join(sketch_dir, '2025-03-01.json.123.tmp')
+    open(stray, 'w').close()
+    open(os.path.join(sketch_dir, '2025-02-01.json'), 'w').close()
+
+    # A replaced log starts the rollup over
+    os.remove(log_path)
+    with open(log_path, 'w', encoding='utf-8') as file:
+        file.write(HEADER + row(3, 'LS1 4AP'))
+    rollup = CalculationRollup(log_path, state_path)
+    assert rollup.refresh() == 1
+    assert sorted(os.listdir(sketch_dir)) == ['2025-03-01.json.123.tmp', '2025-03-03.json']
+    assert CalculationRollup(log_path, state_path).usage_summary()['rows'] == 1
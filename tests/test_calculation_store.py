@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from calculation_store import COMPACT_FILE_THRESHOLD, PartitionedCalculationStore, migrate_csv  # noqa: E402
+
+HEADER = "timestamp,vehicle_type,num_vehicles,postcode,purchase_year,annual_mileage,estimated_electricity_demand\n"
+
+
+def record(minute, postcode='SW1A 1AA', vehicle_type='van_small', vehicles=2, day=1):
+    return {'timestamp': f"2025-03-{day:02d}T10:{minute:02d}:00", 'vehicle_type': vehicle_type,
+            'num_vehicles': vehicles, 'postcode': postcode, 'purchase_year': 2025 + minute % 2,
+            'annual_mileage': 10000, 'estimated_electricity_demand': 500}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PartitionedCalculationStore(str(tmp_path / 'store'))
+
+
+def test_summary_matches_the_rows(store):
+    store.append([record(0), record(1, 'M1 1AE'), record(2, vehicle_type='van_large', day=2)])
+    store.append([record(3, 'M1 1AE', vehicles=5)])
+    summary = store.summary()
+    assert (summary.calculations, summary.vehicles, summary.electricity_demand) == (4, 11, 2000)
+    assert summary.postcodes == {'SW1A 1AA': [4, 1000, 2], 'M1 1AE': [7, 1000, 2]}
+    assert summary.vehicle_types == {'van_small': [9, 1500, 3], 'van_large': [2, 500, 1]}
+    assert summary.purchase_years == {2025: [4, 1000, 2], 2026: [7, 1000, 2]}
+    assert summary.postcode_level_summary('area') == [('M', 7, 1000, 2), ('SW', 4, 1000, 2)]
+    assert summary.activity_series('minute', '2025-03-01') == [
+        ('2025-03-01T10:00', 2, 500, 1), ('2025-03-01T10:01', 2, 500, 1), ('2025-03-01T10:03', 5, 500, 1),
+        ('2025-03-02T10:02', 2, 500, 1)]
+
+
+def test_summary_reads_only_files_added_since_the_last(store, monkeypatch):
+    store.append([record(0)])
+    store.summary()
+    read = []
+    original = PartitionedCalculationStore._file_summary
+    monkeypatch.setattr(PartitionedCalculationStore, '_file_summary',
+                        staticmethod(lambda path: read.append(path) or original(path)))
+
+    assert store.summary().calculations == 1
+    assert read == []
+    store.append([record(1)])
+    assert store.summary().calculations == 2
+    assert len(read) == 1
+
+
+def test_summary_survives_compaction_and_missing_sidecars(store):
+    for minute in range(3):
+        store.append([record(minute)])
+    assert store.summary().calculations == 3
+    assert store.compact() == 2
+    [directory] = [directory for _, directory in store.partitions()]
+    [path] = store.part_files(directory)
+    os.remove(f"{path}.summary.json")
+    assert PartitionedCalculationStore(store.root).summary().vehicles == 6
+    assert store.summary().vehicle_types == {'van_small': [6, 1500, 3]}
+
+
+def test_summary_skips_a_compacted_file_it_has_already_folded(store, monkeypatch):
+    for minute in range(3):
+        store.append([record(minute)])
+    store.summary()
+    read = []
+    original = PartitionedCalculationStore._file_summary
+    monkeypatch.setattr(PartitionedCalculationStore, '_file_summary',
+                        staticmethod(lambda path: read.append(path) or original(path)))
+
+    store.compact()
+    summary = store.summary()
+    assert read == []
+    assert (summary.calculations, summary.vehicles) == (3, 6)
+
+
+def test_interrupted_compaction_never_counts_rows_twice(store, monkeypatch):
+    for minute in range(3):
+        store.append([record(minute)])
+    # Crash after the merged file is renamed into place but before the small files are removed
+    monkeypatch.setattr(PartitionedCalculationStore, '_remove_superseded', lambda self, directory: None)
+    assert store.compact() == 2
+    [(_, directory)] = store.partitions()
+    assert len([name for name in os.listdir(directory) if name.endswith('.parquet')]) == 4
+    assert store.scan().num_rows == 3
+    assert PartitionedCalculationStore(store.root).summary().calculations == 3
+
+    monkeypatch.undo()
+    assert store.compact() == 0
+    assert len([name for name in os.listdir(directory) if name.endswith('.parquet')]) == 1
+    assert store.summary().calculations == 3
+
+
+def test_append_skips_malformed_rows(store):
+    bad = [dict(record(1), num_vehicles='two'), dict(record(2), timestamp=None),
+           dict(record(3), vehicle_type=7), dict(record(4), num_vehicles=2 ** 40)]
+    assert store.append([record(0)] + bad + [record(5)]) == 4
+    assert store.summary().calculations == 2
+
+
+def test_append_compacts_a_partition_with_many_files(store):
+    for minute in range(COMPACT_FILE_THRESHOLD):
+        store.append([record(minute)])
+    [(_, directory)] = store.partitions()
+    assert len(store.part_files(directory)) == 1
+    assert store.summary().calculations == COMPACT_FILE_THRESHOLD
+
+
+def test_migrate_skips_malformed_rows(store, tmp_path):
+    csv_path = tmp_path / 'calculations.csv'
+    csv_path.write_text(HEADER
+                        + "2025-03-01T10:00:00,van_small,2,SW1A 1AA,2025,10000,500\n"
+                        + "2025-03-01T10:01:00,van_small,two,SW1A 1AA,2025,10000,500\n"
+                        + "not a date,van_small,2,SW1A 1AA,2025,10000,500\n"
+                        + "2025-03-01T10:02:00,van_small,1\n"
+                        + "2025-03-02T10:00:00,van_large,3,M1 1AE,2026,20000,900\n")
+    assert migrate_csv(str(csv_path), store) == (2, 3)
+    summary = store.summary()
+    assert (summary.calculations, summary.vehicles) == (2, 5)
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from conftest import ROOT
+
+APP = os.path.join(ROOT, 'calculator_app.py')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # The page logs and reads data/ relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def test_fleet_upload_offers_results_download(app):
+    fleet = b"asset_id,vehicle_type,annual_mileage\nA1,van_small,15000\nA2,van_small,\nA3,no_such_vehicle,\n"
+    app.file_uploader(key='fleet_file').set_value(('fleet.csv', fleet, 'text/csv')).run()
+    app.button(key='evaluate_fleet').click().run()
+
+    assert not app.exception
+    assert not app.error
+    [download] = app.get('download_button')
+    assert download.proto.label.startswith("📥 Download Fleet Results")
+    assert [w.value for w in app.warning] == [
+        "1 rows could not be evaluated; see the error column in the results"]
+
+
+def test_admin_export_offers_download(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'calculations.csv').write_text(
+        "timestamp,vehicle_type,num_vehicles,postcode,purchase_year,annual_mileage,estimated_electricity_demand\n"
+        "2025-01-10T10:00:00,van_small,2,SW1A 1AA,2025,10000,500\n"
+        "2025-02-11T10:00:01,van_medium,1,M1 1AE,2026,20000,900\n")
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.query_params['admin'] = 'true'
+    at.run()
+    at.text_input(key='admin_pw').input('admin123').run()
+    at.button[0].click().run()
+    at.checkbox(key='export_gzip').uncheck()
+    at.button(key='prepare_export').click().run()
+
+    assert not at.exception
+    assert not at.error
+    assert "2 rows ready" in [c.value for c in at.caption]
+    labels = [button.proto.label for button in at.get('download_button')]
+    assert "📥 Download Data (CSV)" in labels
+
+
+def test_empty_fleet_upload_shows_an_error(app):
+    app.file_uploader(key='fleet_file').set_value(('fleet.csv', b'', 'text/csv')).run()
+    app.button(key='evaluate_fleet').click().run()
+
+    assert not app.exception
+    assert [e.value for e in app.error] == [
+        "Could not evaluate the fleet: the fleet file is not a readable CSV: No columns to parse from file"]
+    assert not app.get('download_button')
@@ -0,0 +1,56 @@
+import numpy as np
+
+import calculator_batch
+from calculator_core import (
+    COST_FIELDS,
+    MAX_MILEAGE,
+    MIN_MILEAGE,
+    OPERATING_PERIODS,
+    PURCHASE_YEARS,
+    calculate_scenario,
+    get_catalogue,
+)
+
+
+def test_batch_matches_the_scalar_calculation():
+    types = np.array(['van_small', 'hgv_rigid_small', 'van_small'])
+    results = calculator_batch.calculate_scenarios_batch(types, [2025, 2028, 2032], [12000, 45000, 80000],
+                                                         [3, 7, 10], [1, 2, 5])
+    for i, args in enumerate(zip(types.tolist(), [2025, 2028, 2032], [12000, 45000, 80000], [3, 7, 10], [1, 2, 5])):
+        expected = calculate_scenario(*args)
+        for field in COST_FIELDS:
+            assert results[f'electric_{field}'][i] == expected['electric'][field]
+            assert results[f'diesel_{field}'][i] == expected['diesel'][field]
+        assert results['savings'][i] == expected['savings']
+
+
+def test_vehicle_types_are_looked_up_once_per_batch(monkeypatch):
+    calls = []
+    lookup = calculator_batch.profile_indices
+    monkeypatch.setattr(calculator_batch, 'profile_indices', lambda *args: calls.append(args) or lookup(*args))
+    calculator_batch.calculate_scenarios_batch(['van_small', 'van_large'], 2026, 20000, 5)
+    assert len(calls) == 1
+
+
+def test_cost_table_matches_the_scalar_calculation_everywhere():
+    catalogue = get_catalogue()
+    table = calculator_batch.CostModelTable(catalogue=catalogue)
+
+    def close(actual, expected):
+        return abs(actual - expected) <= 1e-7 * max(1.0, abs(expected))
+
+    mismatches = []
+    for vehicle_type in catalogue.profiles:
+        for purchase_year in PURCHASE_YEARS:
+            for operating_period in OPERATING_PERIODS:
+                for annual_mileage in (MIN_MILEAGE, 27500, MAX_MILEAGE):
+                    for num_vehicles in (1, 7):
+                        scenario = (vehicle_type, purchase_year, annual_mileage, operating_period, num_vehicles)
+                        actual = table.query(*scenario)
+                        expected = calculate_scenario(*scenario, catalogue=catalogue)
+                        pairs = [(actual[side][field], expected[side][field])
+                                 for side in ('electric', 'diesel') for field in COST_FIELDS]
+                        pairs += [(actual[field], expected[field]) for field in ('savings', 'co2_saved')]
+                        if not all(close(*pair) for pair in pairs):
+                            mismatches.append(scenario)
+    assert mismatches == []
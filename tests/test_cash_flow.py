@@ -0,0 +1,30 @@
+import pytest
+
+from calculator_core import calculate_scenario
+from cash_flow import CashFlowSchedule
+
+
+def test_purchase_is_labelled_with_the_purchase_year_and_operating_years_after_it():
+    schedule = CashFlowSchedule('van_small', 2025, 5, annual_mileage=20000)
+    purchase, first = schedule.annual_rows()[:2]
+    assert (purchase['year'], purchase['operating_year']) == (2025, 0)
+    assert (first['year'], first['operating_year']) == (2026, 1)
+    assert schedule.annual_rows()[-1]['year'] == 2030
+    assert first['electric'] < purchase['electric']
+
+
+def test_undiscounted_flows_sum_to_the_calculator_totals():
+    schedule = CashFlowSchedule('van_small', 2027, 7, annual_mileage=20000, num_vehicles=3)
+    results = calculate_scenario('van_small', 2027, 20000, 7, 3)
+    assert sum(schedule.electric) == pytest.approx(results['electric']['total'])
+    assert sum(schedule.diesel) == pytest.approx(results['diesel']['total'])
+    assert schedule.cumulative_savings()[-1] == pytest.approx(results['savings'])
+
+
+def test_break_even_year_uses_the_same_labels():
+    schedule = CashFlowSchedule('hgv_rigid_small', 2025, 10, annual_mileage=40000)
+    year = schedule.break_even_year(discounted=False)
+    assert year == 2027
+    rows = {row['year']: row for row in schedule.annual_rows()}
+    assert rows[year]['cumulative_savings'] >= 0
+    assert rows[year - 1]['cumulative_savings'] < 0
@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+import catalogue
+import scenario_cache
+from calculator_core import cached_scenario
+from catalogue import CATALOGUE_FILE, Catalogue, CatalogueError, get_catalogue
+from scenario_cache import ScenarioCache
+
+with open(CATALOGUE_FILE, encoding='utf-8') as file:
+    SHIPPED = file.read()
+
+
+@pytest.fixture
+def catalogue_file(tmp_path, monkeypatch):
+    """A private catalogue file that get_catalogue checks on every call"""
+    path = tmp_path / 'vehicle_catalogue.json'
+    path.write_text(SHIPPED, encoding='utf-8')
+    monkeypatch.setattr(catalogue, 'CATALOGUE_FILE', str(path))
+    monkeypatch.setattr(catalogue, 'CATALOGUE_CHECK_INTERVAL', 0.0)
+    monkeypatch.setattr(catalogue, '_catalogue', None)
+    monkeypatch.setattr(catalogue, '_file_state', None)
+    monkeypatch.setattr(scenario_cache, '_cache', ScenarioCache())
+    return path
+
+
+def rewrite(path, change):
+    data = json.loads(SHIPPED)
+    change(data)
+    stat = os.stat(path)
+    path.write_text(json.dumps(data), encoding='utf-8')
+    # Make the change visible even where the clock is coarser than the two writes
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+
+def bad_value(field, value):
+    def change(data):
+        data['version'] = 'bad'
+        data['vehicle_classes']['van'][field] = value
+    return change
+
+
+@pytest.mark.parametrize('field, value, message', [
+    ('energy_rate', float('inf'), "energy_rate must be a finite number"),
+    ('energy_rate', float('nan'), "energy_rate must be a finite number"),
+    ('price_decline', 1.5, "price_decline must be between 0 and 1"),
+    ('maintenance_multiplier', -0.1, "maintenance_multiplier must be zero or more"),
+])
+def test_validation_rejects_non_finite_numbers_and_out_of_range_fractions(field, value, message):
+    data = json.loads(SHIPPED)
+    bad_value(field, value)(data)
+    with pytest.raises(CatalogueError, match=message):
+        Catalogue.from_bytes(json.dumps(data).encode())
+
+
+def test_a_changed_file_is_reloaded(catalogue_file):
+    first = get_catalogue()
+    assert get_catalogue() is first
+
+    rewrite(catalogue_file, lambda data: data.update(version='2025.2'))
+    second = get_catalogue()
+    assert second.version == '2025.2'
+    assert second.fingerprint != first.fingerprint
+
+
+def test_a_bad_file_keeps_the_previous_catalogue(catalogue_file):
+    first = get_catalogue()
+    for field, value in (('energy_rate', float('inf')), ('price_decline', 1.5)):
+        rewrite(catalogue_file, bad_value(field, value))
+        assert get_catalogue() is first
+
+    rewrite(catalogue_file, lambda data: data.update(version='2025.2'))
+    assert get_catalogue().version == '2025.2'
+
+
+def test_a_reload_invalidates_cached_results(catalogue_file):
+    before = cached_scenario('van_small', 2025, 15000, 5)
+    assert cached_scenario('van_small', 2025, 15000, 5) is before
+    assert scenario_cache.get_scenario_cache().stats()['hits'] == 1
+
+    rewrite(catalogue_file, lambda data: data['vehicle_classes']['van'].update(energy_rate=0.5))
+    after = cached_scenario('van_small', 2025, 15000, 5)
+    assert after['electric']['total'] > before['electric']['total']
+    assert scenario_cache.get_scenario_cache().stats()['invalidations'] == 1
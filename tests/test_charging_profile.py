@@ -0,0 +1,37 @@
+import copy
+import json
+
+import pytest
+
+import charging_profile
+from catalogue import CATALOGUE_FILE, Catalogue
+from charging_profile import CHARGER_POWER_KW, DEFAULT_CHARGER_KW, simulate_depot_loads
+
+
+@pytest.fixture
+def data():
+    """The shipped catalogue plus a minibus class with no charger power of its own"""
+    with open(CATALOGUE_FILE, encoding='utf-8') as file:
+        data = json.load(file)
+    data['vehicle_classes']['minibus'] = copy.deepcopy(data['vehicle_classes']['van'])
+    data['vehicles']['minibus'] = dict(data['vehicles']['van_small'], name="Minibus", vehicle_class='minibus')
+    return data
+
+
+def peak_kw(monkeypatch, data, vehicle_type):
+    catalogue = Catalogue(data, 'test')
+    monkeypatch.setattr(charging_profile, 'get_catalogue', lambda: catalogue)
+    # Enough miles that every vehicle charges flat out for the whole window
+    loads = simulate_depot_loads({'postcode': ['SW1A 1AA'], 'vehicle_type': [vehicle_type],
+                                  'annual_mileage': [1000000]})
+    return loads.region_summary()['peak_kw']
+
+
+def test_a_catalogue_class_without_charger_power_uses_the_default(monkeypatch, data):
+    assert peak_kw(monkeypatch, data, 'minibus') == pytest.approx(DEFAULT_CHARGER_KW)
+    assert peak_kw(monkeypatch, data, 'van_small') == pytest.approx(CHARGER_POWER_KW['van'])
+
+
+def test_a_catalogue_class_can_set_its_charger_power(monkeypatch, data):
+    data['vehicle_classes']['minibus']['charger_kw'] = 22.0
+    assert peak_kw(monkeypatch, data, 'minibus') == pytest.approx(22.0)
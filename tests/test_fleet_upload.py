@@ -0,0 +1,82 @@
+import io
+
+import pandas as pd
+import pytest
+
+from calculator_core import ScenarioError, calculate_scenario
+from fleet_upload import evaluate_fleet_chunk, evaluate_fleet_file
+
+
+def errors(csv_text):
+    chunk = pd.read_csv(io.StringIO(csv_text), dtype={'asset_id': 'string', 'vehicle_type': 'string'})
+    return evaluate_fleet_chunk(chunk)['error'].tolist()
+
+
+def test_rows_are_validated_like_api_scenarios():
+    assert errors("vehicle_type,annual_mileage,num_vehicles,purchase_year,operating_period\n"
+                  "van_small,20000,2,2026,7\n"
+                  "van_small,,,,\n"
+                  "no_such_vehicle,20000,1,2026,7\n"
+                  "van_small,999,1,2026,7\n"
+                  "van_small,200001,1,2026,7\n"
+                  "van_small,20000,1.5,2026,7\n"
+                  "van_small,20000.5,1,2026,7\n"
+                  "van_small,inf,1,2026,7\n"
+                  "van_small,lots,1,2026,7\n"
+                  "van_small,20000,0,2026,7\n"
+                  "van_small,20000,1e20,2026,7\n"
+                  "van_small,20000,1,2024,7\n"
+                  "van_small,20000,1,2026,4\n") == [
+        '',
+        '',
+        "unknown vehicle_type",
+        "annual_mileage must be between 1000 and 200000",
+        "annual_mileage must be between 1000 and 200000",
+        "num_vehicles must be an integer",
+        "annual_mileage must be an integer",
+        "annual_mileage must be an integer",
+        "annual_mileage must be an integer",
+        "num_vehicles must be between 1 and 100000",
+        "num_vehicles must be between 1 and 100000",
+        "purchase_year must be between 2025 and 2032",
+        "operating_period must be one of 3, 5, 7, 10",
+    ]
+
+
+def test_oversized_fleet_rows_are_invalid_not_overflowed():
+    output = io.StringIO()
+    summary = evaluate_fleet_file(io.BytesIO(b"vehicle_type,num_vehicles\nvan_small,1e20\nvan_small,2\n"), output)
+    assert (summary.rows, summary.invalid_rows, summary.totals['num_vehicles']) == (2, 1, 2)
+    assert summary.totals['savings'] == pytest.approx(evaluate_single(2)['savings'])
+
+
+def test_integer_columns_are_written_as_integers():
+    output = io.StringIO()
+    evaluate_fleet_file(io.BytesIO(b"vehicle_type,purchase_year,num_vehicles\nvan_small,2026,2\nvan_small,,1.5\n"
+                                   b"no_such_vehicle,,\n"), output)
+    lines = output.getvalue().splitlines()
+    assert lines[1].startswith(",van_small,15000,2026,5,2,")
+    assert lines[2].startswith(",van_small,15000,2025,5,1.5,")
+    assert lines[3].startswith(",no_such_vehicle,,2025,5,1,")
+
+
+def evaluate_single(num_vehicles):
+    return calculate_scenario('van_small', 2025, 15000, 5, num_vehicles)
+
+
+def test_fleet_file_totals_valid_rows():
+    output = io.StringIO()
+    summary = evaluate_fleet_file(io.BytesIO(b"vehicle_type,num_vehicles\nvan_small,2\nvan_small,1.5\n"), output)
+    assert (summary.rows, summary.invalid_rows, summary.totals['num_vehicles']) == (2, 1, 2)
+    assert len(pd.read_csv(io.StringIO(output.getvalue()))) == 2
+
+
+@pytest.mark.parametrize('content, message', [
+    (b"", "not a readable CSV"),
+    (b"vehicle_type,num_vehicles\n", "has no rows"),
+    (b"asset_id,num_vehicles\nA1,2\n", "needs a vehicle_type column"),
+    (b"vehicle_type\n\xff\xfe\x00\n", "not a readable CSV"),
+])
+def test_unreadable_fleet_files_raise_scenario_error(content, message):
+    with pytest.raises(ScenarioError, match=message):
+        evaluate_fleet_file(io.BytesIO(content), io.StringIO())
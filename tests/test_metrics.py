@@ -0,0 +1,39 @@
+import socket
+import subprocess
+import sys
+import urllib.request
+
+import metrics
+from conftest import ROOT
+
+
+def test_importing_the_core_skips_profiler_and_server_modules():
+    code = ("import sys, calculator_core; "
+            "print(sorted({'cProfile', 'pstats', 'http.server'} & set(sys.modules)))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
+
+
+def test_profile_report_lists_the_profiled_calls():
+    with metrics.profiled() as profile:
+        sorted(range(1000), key=str)
+    assert 'sorted' in metrics.profile_report(profile)
+
+
+def test_metrics_server_serves_the_registry(monkeypatch):
+    monkeypatch.setattr(metrics, '_server', None)
+    metrics.counter('test_requests_total').inc()
+    server = metrics.start_metrics_server(port=_free_port())
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'calculator_test_requests_total 1' in body
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
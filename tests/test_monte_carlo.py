@@ -0,0 +1,43 @@
+import pytest
+
+from calculator_core import calculate_scenario, get_catalogue, get_vehicle_profile
+from monte_carlo import simulate_savings, simulate_scenarios
+
+
+def point_distributions(vehicle_type, annual_mileage):
+    """Every variable held at the calculator's own assumption"""
+    profile = get_vehicle_profile(vehicle_type, get_catalogue())
+    return {'energy_price': profile.energy_rate, 'diesel_price': profile.fuel_price,
+            'annual_mileage': annual_mileage, 'price_decline': profile.price_decline, 'maintenance_factor': 1.0}
+
+
+def test_a_fixed_seed_reproduces_the_results():
+    first = simulate_savings('van_small', 2027, 5, num_vehicles=3, draws=2000, seed=42)
+    assert simulate_savings('van_small', 2027, 5, num_vehicles=3, draws=2000, seed=42) == first
+    assert simulate_savings('van_small', 2027, 5, num_vehicles=3, draws=2000, seed=43) != first
+    assert first['p10'] < first['p50'] < first['p90']
+
+
+def test_scenario_results_do_not_depend_on_the_number_of_workers():
+    scenarios = [{'vehicle_type': 'van_small', 'purchase_year': 2026, 'operating_period': 5},
+                 {'vehicle_type': 'hgv_rigid_small', 'purchase_year': 2028, 'operating_period': 7}]
+    serial = simulate_scenarios(scenarios, draws=1000, seed=7, workers=1)
+    assert simulate_scenarios(scenarios, draws=1000, seed=7, workers=2) == serial
+    assert serial[0] != serial[1]
+
+
+@pytest.mark.parametrize('vehicle_type, purchase_year, annual_mileage, operating_period, num_vehicles', [
+    ('van_small', 2025, 15000, 5, 1),
+    ('van_large', 2028, 30000, 7, 4),
+    ('hgv_rigid_small', 2031, 40000, 10, 2),
+])
+def test_a_zero_variance_run_matches_the_calculator(vehicle_type, purchase_year, annual_mileage,
+                                                     operating_period, num_vehicles):
+    result = simulate_savings(vehicle_type, purchase_year, operating_period, num_vehicles,
+                              distributions=point_distributions(vehicle_type, annual_mileage), draws=50, seed=1)
+    expected = calculate_scenario(vehicle_type, purchase_year, annual_mileage, operating_period,
+                                  num_vehicles)['savings']
+    for statistic in ('p10', 'p50', 'p90', 'mean'):
+        assert result[statistic] == pytest.approx(expected, rel=1e-9)
+    assert result['std'] == pytest.approx(0, abs=1e-6 * abs(expected))
+    assert result['probability_electric_wins'] == float(expected > 0)
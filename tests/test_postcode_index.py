@@ -0,0 +1,77 @@
+import pytest
+
+from postcode_index import UNKNOWN_AREA, PostcodeDemandIndex, normalize_postcode, postcode_matcher, postcode_path
+
+
+@pytest.fixture
+def index():
+    index = PostcodeDemandIndex()
+    for postcode, year, vehicles, demand in (
+        ('SW1A 1AA', 2025, 2, 100),
+        ('sw1a1aa', 2026, 1, 50),
+        ('SW1A 2AB', 2025, 3, 300),
+        ('SW1P 3BU', 2025, 1, 40),
+        ('SW10 0AA', 2026, 4, 200),
+        ('M1 1AE', 2025, 5, 500),
+        ('not a postcode', 2025, 1, 1),
+    ):
+        index.add(postcode, year, vehicles, demand)
+    return index
+
+
+@pytest.mark.parametrize('raw, normalized', [
+    ('sw1a1aa', 'SW1A 1AA'),
+    ('  SW1A   1AA ', 'SW1A 1AA'),
+    ('m11ae', 'M1 1AE'),
+    ('sw1a 1', 'SW1A 1'),
+    ('sw1', 'SW1'),
+])
+def test_postcodes_are_normalized(raw, normalized):
+    assert normalize_postcode(raw) == normalized
+
+
+def test_paths_run_from_area_to_postcode():
+    assert postcode_path('sw1a1aa') == ['SW', 'SW1', 'SW1A', 'SW1A 1', 'SW1A 1AA']
+    assert postcode_path('M1 1AE') == ['M', 'M1', 'M1 1', 'M1 1AE']
+    assert postcode_path('not a postcode') == [UNKNOWN_AREA, 'NOTAPOSTCODE']
+
+
+def test_prefix_totals_include_everything_under_them(index):
+    assert index.lookup() == (17, 1191, 7)
+    assert index.lookup('SW') == (11, 690, 5)
+    assert index.lookup('SW1') == (7, 490, 4)  # Not SW10
+    assert index.lookup('sw1a') == (6, 450, 3)
+    assert index.lookup('SW1A 1AA') == (3, 150, 2)
+    assert index.lookup('SW1A 1AA', purchase_year=2026) == (1, 50, 1)
+    assert index.lookup('E1') == (0, 0, 0)
+
+
+def test_rollup_by_level(index):
+    assert sorted(index.rollup('area')) == [('?', 1, 1, 1), ('M', 5, 500, 1), ('SW', 11, 690, 5)]
+    assert sorted(index.rollup('district', 'SW')) == [('SW1', 7, 490, 4), ('SW10', 4, 200, 1)]
+    assert sorted(index.rollup('sector', 'SW1')) == [('SW1A 1', 3, 150, 2), ('SW1A 2', 3, 300, 1),
+                                                     ('SW1P 3', 1, 40, 1)]
+    assert sorted(index.rollup('postcode', 'SW1A', purchase_year=2025)) == [('SW1A 1AA', 2, 100, 1),
+                                                                            ('SW1A 2AB', 3, 300, 1)]
+    with pytest.raises(ValueError):
+        index.rollup('street')
+
+
+def test_top_n_by_demand(index):
+    assert index.top(2, 'district') == [('M1', 5, 500, 1), ('SW1', 7, 490, 4)]
+    assert index.top(1, 'postcode', 'SW1') == [('SW1A 2AB', 3, 300, 1)]
+    assert index.top(5, 'district', purchase_year=2026) == [('SW10', 4, 200, 1), ('SW1', 1, 50, 1)]
+
+
+def test_round_trips_through_json(index):
+    restored = PostcodeDemandIndex.from_json(index.to_json())
+    assert restored.lookup() == index.lookup()
+    for level in ('area', 'district', 'sector', 'postcode'):
+        assert sorted(restored.rollup(level)) == sorted(index.rollup(level))
+    assert restored.lookup('SW1A', purchase_year=2026) == (1, 50, 1)
+
+
+def test_matcher_respects_district_boundaries():
+    matches = postcode_matcher(['SW1', 'm1 1'])
+    assert matches('SW1A 1AA') and matches('sw1p3bu') and matches('M1 1AE')
+    assert not matches('SW10 0AA') and not matches('M1 2AA')
@@ -0,0 +1,61 @@
+import pytest
+
+from scenario_cache import ScenarioCache
+
+
+def fill(cache, keys, fingerprint='v1'):
+    return [cache.get_or_compute(fingerprint, key, lambda key=key: f"result {key}") for key in keys]
+
+
+def test_hits_return_the_cached_result_without_computing():
+    cache = ScenarioCache(maxsize=4)
+    calls = []
+    compute = lambda: calls.append(1) or {'savings': 1}  # noqa: E731
+    first = cache.get_or_compute('v1', 'a', compute)
+    assert cache.get_or_compute('v1', 'a', compute) is first
+    assert len(calls) == 1
+    assert cache.stats() == {'size': 1, 'maxsize': 4, 'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+                             'evictions': 0, 'invalidations': 0}
+
+
+def test_the_least_recently_used_entry_is_evicted_first():
+    cache = ScenarioCache(maxsize=3)
+    fill(cache, 'abc')
+    fill(cache, 'a')  # a is now the most recently used, so b goes first
+    fill(cache, 'd')
+    assert list(cache._entries) == ['c', 'a', 'd']
+    fill(cache, 'e')
+    assert list(cache._entries) == ['a', 'd', 'e']
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses'], stats['evictions']) == (3, 1, 5, 2)
+
+
+def test_resize_evicts_down_to_the_new_bound():
+    cache = ScenarioCache(maxsize=4)
+    fill(cache, 'abcd')
+    cache.resize(2)
+    assert list(cache._entries) == ['c', 'd']
+    assert cache.stats()['evictions'] == 2
+
+
+def test_a_zero_size_cache_stores_nothing():
+    cache = ScenarioCache(maxsize=0)
+    fill(cache, 'aa')
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['misses'] == 2
+    with pytest.raises(ValueError):
+        ScenarioCache(maxsize=-1)
+
+
+def test_a_new_fingerprint_drops_every_entry():
+    cache = ScenarioCache(maxsize=4)
+    fill(cache, 'ab', 'v1')
+    assert fill(cache, 'a', 'v2') == ['result a']
+    assert list(cache._entries) == ['a']
+    assert cache.stats()['invalidations'] == 1
+    assert cache.stats()['hits'] == 0
+
+    # Results computed for a fingerprint that has since been replaced are not stored
+    cache.get_or_compute('v1', 'x', lambda: fill(cache, 'b', 'v3') and 'stale')
+    assert cache.fingerprint == 'v3'
+    assert list(cache._entries) == ['b']
@@ -0,0 +1,117 @@
+import itertools
+import random
+
+import pytest
+
+from sketches import HeavyHitters, HyperLogLog, UsageSketch
+
+
+def hll_of(values):
+    sketch = HyperLogLog()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def heavy_hitters_of(items, capacity=16):
+    sketch = HeavyHitters(capacity)
+    for item in items:
+        sketch.add(item)
+    return sketch
+
+
+def skewed_stream(length, seed=7):
+    """A Zipf-like stream of postcodes: a few very common, a long tail of rare ones"""
+    rng = random.Random(seed)
+    return [f"P{int(rng.paretovariate(1.1))}" for _ in range(length)]
+
+
+def merged_heavy_hitters(parts, capacity=16):
+    merged = HeavyHitters(capacity)
+    for part in parts:
+        merged.update(part)
+    return merged
+
+
+def assert_within_misra_gries_bounds(sketch, stream):
+    truth = {item: stream.count(item) for item in set(stream)}
+    assert sketch.total == len(stream)
+    assert sketch.error <= len(stream) / (sketch.capacity + 1)
+    for item, count in truth.items():
+        held = sketch.counts.get(item, 0)
+        assert count - sketch.error <= held <= count
+        if count > len(stream) / (sketch.capacity + 1):
+            assert item in sketch.counts
+
+
+@pytest.mark.parametrize('distinct', [100, 5000, 50000])
+def test_hyperloglog_count_is_within_three_standard_errors(distinct):
+    # Every value appears twice; duplicates must not count
+    values = [f"SW{i} {i % 10}AA" for i in range(distinct)] * 2
+    sketch = hll_of(values)
+    assert abs(sketch.count() - distinct) <= 3 * sketch.relative_error * distinct
+
+
+def test_hyperloglog_merge_is_associative_and_commutative():
+    a, b, c = (hll_of(f"{part}-{i}" for i in range(3000)) for part in 'abc')
+    reference = HyperLogLog.merged([a, b, c]).registers
+    for order in itertools.permutations([a, b, c]):
+        assert HyperLogLog.merged(list(order)).registers == reference
+    left = HyperLogLog.merged([HyperLogLog.merged([a, b]), c])
+    right = HyperLogLog.merged([a, HyperLogLog.merged([b, c])])
+    assert left.registers == right.registers == reference
+    updated = HyperLogLog.merged([c])
+    updated.update(b)
+    updated.update(a)
+    assert updated.registers == reference
+    # The union of the parts is the sketch of the whole stream
+    assert reference == hll_of(f"{part}-{i}" for part in 'abc' for i in range(3000)).registers
+
+
+def test_hyperloglog_rejects_merging_different_precisions():
+    with pytest.raises(ValueError):
+        HyperLogLog.merged([HyperLogLog(10), HyperLogLog(12)])
+
+
+def test_heavy_hitters_stay_within_the_misra_gries_bounds():
+    stream = skewed_stream(20000)
+    sketch = heavy_hitters_of(stream)
+    assert_within_misra_gries_bounds(sketch, stream)
+    assert sketch.top(1)[0][0] == 'P1'
+
+
+def test_heavy_hitter_merges_stay_within_the_bounds_in_any_order():
+    stream = skewed_stream(30000)
+    parts = [stream[:10000], stream[10000:20000], stream[20000:]]
+    sketches = [heavy_hitters_of(part) for part in parts]
+    for order in itertools.permutations(range(3)):
+        merged = merged_heavy_hitters([sketches[i] for i in order])
+        assert_within_misra_gries_bounds(merged, stream)
+    grouped = merged_heavy_hitters([merged_heavy_hitters(sketches[:2]), sketches[2]])
+    assert_within_misra_gries_bounds(grouped, stream)
+
+
+def test_heavy_hitter_merges_are_exact_below_capacity():
+    parts = [['van_small'] * 5 + ['hgv_artic'], ['van_small', 'van_large'] * 3, ['hgv_artic'] * 4]
+    sketches = [heavy_hitters_of(part) for part in parts]
+    reference = merged_heavy_hitters(sketches).counts
+    assert reference == {'van_small': 8, 'hgv_artic': 5, 'van_large': 3}
+    for order in itertools.permutations(sketches):
+        assert merged_heavy_hitters(order).counts == reference
+    assert merged_heavy_hitters([merged_heavy_hitters(sketches[1:]), sketches[0]]).counts == reference
+
+
+def test_usage_sketches_merge_and_round_trip():
+    rows = [(postcode, 'van_small' if i % 3 else 'hgv_rigid_small')
+            for i, postcode in enumerate(skewed_stream(3000))]
+    parts = [UsageSketch(), UsageSketch()]
+    for i, (postcode, vehicle_type) in enumerate(rows):
+        parts[i % 2].add(postcode, vehicle_type)
+    forward = UsageSketch.merged(parts).summary()
+    backward = UsageSketch.merged(reversed(parts)).summary()
+    assert forward == backward
+    assert forward['rows'] == 3000
+    assert forward['top_vehicle_types'] == [('van_small', 2000), ('hgv_rigid_small', 1000)]
+
+    restored = UsageSketch.from_json(UsageSketch.merged(parts).to_json())
+    assert restored.summary() == forward
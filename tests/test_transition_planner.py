@@ -0,0 +1,56 @@
+import itertools
+import random
+
+import pytest
+
+from transition_planner import _choose_purchases, plan_transition
+
+
+def brute_force(groups, capacity):
+    """Best total value over every combination of counts within capacity"""
+    best = 0.0
+    for counts in itertools.product(*(range(len(values) + 1) for _, values in groups)):
+        if sum(unit_cost * k for (unit_cost, _), k in zip(groups, counts)) <= capacity:
+            best = max(best, sum(sum(values[:k]) for (_, values), k in zip(groups, counts)))
+    return best
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_knapsack_matches_brute_force(seed):
+    rng = random.Random(seed)
+    groups = [(rng.randint(1, 9), tuple(sorted((rng.uniform(0, 50) for _ in range(rng.randint(1, 4))),
+                                               reverse=True)))
+              for _ in range(rng.randint(1, 4))]
+    capacity = rng.randint(0, 30)
+    counts = _choose_purchases(groups, capacity)
+    assert sum(unit_cost * k for (unit_cost, _), k in zip(groups, counts)) <= capacity
+    value = sum(sum(values[:k]) for (_, values), k in zip(groups, counts))
+    assert value == pytest.approx(brute_force(groups, capacity))
+
+
+FLEET = [
+    {'vehicle_type': 'van_small', 'count': 3},
+    {'vehicle_type': 'van_large', 'count': 2, 'annual_mileage': 30000},
+    {'vehicle_type': 'hgv_rigid_small', 'annual_mileage': 40000},
+]
+
+
+@pytest.mark.parametrize('annual_budget', [0, 40000, 90000, 250000, 10 ** 7])
+def test_the_budget_is_never_exceeded_before_the_target_year(annual_budget):
+    plan = plan_transition(FLEET, annual_budget, target_year=2029)
+    *before_target, target = plan['years']
+    for year in before_target:
+        assert year['capex'] <= annual_budget
+        assert not year['over_budget']
+    assert plan['feasible'] == (target['capex'] <= annual_budget)
+
+    # Every vehicle is replaced exactly once, by the target year
+    assert sum(sum(year['purchases'].values()) for year in plan['years']) == 6
+    assert all(2025 <= vehicle['replacement_year'] <= 2029 for vehicle in plan['vehicles'])
+    assert plan['total_cost'] >= plan['unconstrained_cost'] - 1e-6
+
+
+def test_an_unlimited_budget_reaches_the_unconstrained_cost():
+    plan = plan_transition(FLEET, 10 ** 9, target_year=2029)
+    assert plan['feasible']
+    assert plan['total_cost'] == pytest.approx(plan['unconstrained_cost'])
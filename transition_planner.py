@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Fleet transition planner
+Chooses the year in which each diesel vehicle in a fleet is replaced by an
+electric one, subject to an annual capex budget and a target electrification
+year.
+
+Costs run from the start year to the end of the planning horizon: a vehicle
+replaced in year y runs as diesel (running costs only) until y, is bought as
+an electric vehicle at that year's price (net of grant), then runs as
+electric until the horizon ends.
+
+Planning goes year by year. Each year's purchases come from an exact
+budget-constrained dynamic programme over the vehicle classes, with
+memoized (class, remaining budget) subproblems. A replacement's value is
+the cost it saves against that vehicle's best later year. Within a class
+every vehicle costs the same to buy, so the highest-value vehicles are
+always taken first. When the budgets left before the target year cannot
+cover the remaining fleet, purchases are pulled forward to fill the budget.
+In the target year every remaining vehicle must be replaced, whatever the
+budget, and the plan is reported as infeasible if that breaks the budget.
+"""
+
+import functools
+import math
+from itertools import accumulate
+
+import numpy as np
+
+from calculator_batch import (
+    adjusted_purchase_prices_batch,
+    calculate_diesel_costs_batch,
+    calculate_electric_costs_batch,
+)
+from calculator_core import BASE_YEAR, PURCHASE_YEARS, get_catalogue
+
+DEFAULT_BUDGET_UNIT = 1000  # £ resolution of the budget in the knapsack
+DEFAULT_OPERATING_PERIOD = 5  # Years of electric running counted after the target year
+FEASIBILITY_WEIGHT = 1e6  # Value per budget unit spent when the plan is behind on the target
+
+
+def expand_fleet(fleet, catalogue=None):
+    """Turn fleet entries (with optional count) into one dict per vehicle"""
+    vehicle_data = (catalogue or get_catalogue()).vehicle_data
+    vehicles = []
+    for entry in fleet:
+        vehicle_type = entry['vehicle_type']
+        if vehicle_type not in vehicle_data:
+            raise ValueError(f"Unknown vehicle_type: {vehicle_type}")
+        mileage = entry.get('annual_mileage') or vehicle_data[vehicle_type]['default_mileage']
+        for i in range(int(entry.get('count', 1))):
+            asset_id = entry.get('asset_id')
+            vehicles.append({
+                'asset_id': f"{asset_id}-{i + 1}" if asset_id and entry.get('count', 1) > 1 else asset_id,
+                'vehicle_type': vehicle_type,
+                'annual_mileage': mileage,
+            })
+    return vehicles
+
+
+def replacement_costs(vehicles, years, start_year, horizon_end, catalogue=None):
+    """Return (cost, capex) arrays of shape (vehicles, years) for replacing each vehicle in each year"""
+    types = np.array([v['vehicle_type'] for v in vehicles])[:, None]
+    mileages = np.array([v['annual_mileage'] for v in vehicles], dtype=float)[:, None]
+    years = np.asarray(years)[None, :]
+
+    catalogue = catalogue or get_catalogue()
+    electric_prices, _ = adjusted_purchase_prices_batch(types, years, catalogue)
+    electric = calculate_electric_costs_batch(types, electric_prices, mileages, horizon_end - years, catalogue)
+    diesel_running = calculate_diesel_costs_batch(types, 0, mileages, years - start_year, catalogue)['total']
+    return diesel_running + electric['total'], np.broadcast_to(electric['purchase'], electric['total'].shape)
+
+
+def _choose_purchases(groups, capacity):
+    """Bounded knapsack over vehicle classes
+
+    groups is a list of (unit_cost, values sorted highest first); returns how
+    many of each group to buy to maximise total value within capacity.
+    """
+    prefixes = [list(accumulate(values, initial=0.0)) for _, values in groups]
+
+    @functools.lru_cache(maxsize=None)
+    def best(g, remaining):
+        if g == len(groups):
+            return 0.0, ()
+        unit_cost = groups[g][0]
+        prefix = prefixes[g]
+        most = len(prefix) - 1 if unit_cost == 0 else min(len(prefix) - 1, remaining // unit_cost)
+        best_value, best_counts = -math.inf, ()
+        for k in range(most + 1):
+            value, counts = best(g + 1, remaining - k * unit_cost)
+            value += prefix[k]
+            if value > best_value:
+                best_value, best_counts = value, (k,) + counts
+        return best_value, best_counts
+
+    return best(0, capacity)[1]
+
+
+def plan_transition(fleet, annual_budget, target_year=PURCHASE_YEARS[-1], start_year=BASE_YEAR,
+                    horizon_end=None, budget_unit=DEFAULT_BUDGET_UNIT):
+    """Plan replacement years for a fleet under an annual capex budget
+
+    fleet is a list of dicts with vehicle_type and optional annual_mileage,
+    count and asset_id. Returns the per-year purchases and capex, each
+    vehicle's replacement year, the plan's total cost over the horizon and
+    the unconstrained (no budget) cost as a lower bound.
+    """
+    if target_year not in PURCHASE_YEARS or start_year not in PURCHASE_YEARS or start_year > target_year:
+        raise ValueError(f"Years must lie within {PURCHASE_YEARS[0]}-{PURCHASE_YEARS[-1]}")
+    horizon_end = horizon_end or target_year + DEFAULT_OPERATING_PERIOD
+    catalogue = get_catalogue()
+    vehicles = expand_fleet(fleet, catalogue)
+    years = list(range(start_year, target_year + 1))
+    if not vehicles:
+        return {'feasible': True, 'total_cost': 0.0, 'unconstrained_cost': 0.0, 'years': [], 'vehicles': []}
+
+    cost, capex = replacement_costs(vehicles, years, start_year, horizon_end, catalogue)
+    # Cheapest year from each year onwards, used to value buying now versus waiting
+    best_later = np.minimum.accumulate(cost[:, ::-1], axis=1)[:, ::-1]
+
+    remaining = set(range(len(vehicles)))
+    replacement = [None] * len(vehicles)
+    schedule = []
+    for j, year in enumerate(years):
+        if j == len(years) - 1:
+            chosen = sorted(remaining)  # Target year: everything left must go
+        else:
+            # If later budgets cannot cover what is left, bring purchases forward even at a loss
+            later_capacity = annual_budget * (len(years) - 1 - j)
+            behind = sum(capex[i, -1] for i in remaining) > later_capacity
+
+            groups, members = [], []
+            for vehicle_type in catalogue.vehicle_data:
+                candidates = [i for i in remaining if vehicles[i]['vehicle_type'] == vehicle_type]
+                values = sorted(((best_later[i, j + 1] - cost[i, j], i) for i in candidates), reverse=True)
+                if not behind:
+                    values = [v for v in values if v[0] > 0]
+                if values:
+                    unit_cost = math.ceil(capex[values[0][1], j] / budget_unit)
+                    bonus = FEASIBILITY_WEIGHT * unit_cost if behind else 0.0
+                    groups.append((unit_cost, tuple(v + bonus for v, _ in values)))
+                    members.append([i for _, i in values])
+            counts = _choose_purchases(groups, int(annual_budget // budget_unit)) if groups else ()
+            chosen = [i for group, k in zip(members, counts) for i in group[:k]]
+
+        year_capex = float(sum(capex[i, j] for i in chosen))
+        purchases = {}
+        for i in chosen:
+            replacement[i] = year
+            remaining.discard(i)
+            purchases[vehicles[i]['vehicle_type']] = purchases.get(vehicles[i]['vehicle_type'], 0) + 1
+        schedule.append({
+            'year': year,
+            'purchases': purchases,
+            'capex': year_capex,
+            'over_budget': year_capex > annual_budget,
+        })
+
+    year_index = {year: j for j, year in enumerate(years)}
+    total_cost = float(sum(cost[i, year_index[year]] for i, year in enumerate(replacement)))
+    return {
+        'feasible': not any(entry['over_budget'] for entry in schedule),
+        'total_cost': total_cost,
+        'unconstrained_cost': float(cost.min(axis=1).sum()),
+        'years': schedule,
+        'vehicles': [dict(vehicle, replacement_year=year) for vehicle, year in zip(vehicles, replacement)],
+    }